@@ -38,7 +38,7 @@ async def takeover_conversation(request: ControlRequest):
             "mode_switched_at": datetime.now(timezone.utc).isoformat()
         }
         
-        response = async_customer_repo.update_customer(
+        response = await async_customer_repo.update_customer(
             chat_id=request.chat_id,
             payload=update_payload
         )
@@ -72,7 +72,7 @@ async def release_conversation(request: ControlRequest):
             "control_mode": "BOT",
             "mode_switched_at": None
         }
-        response = async_customer_repo.update_customer(
+        response = await async_customer_repo.update_customer(
             chat_id=request.chat_id,
             payload=update_payload
         )
@@ -1,9 +1,10 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends
+from langgraph.graph import StateGraph
 from pydantic import BaseModel
 from fastapi.responses import StreamingResponse
 
 from services.utils import get_or_create_customer
-from core.graph.build_graph import create_main_graph
+from core.graph.graph_dependencies import get_graph
 from services.v2.process_chat import (
     handle_delete_me, 
     handle_normal_chat, 
@@ -16,14 +17,13 @@ from log.logger_config import setup_logging
 logger = setup_logging(__name__)
 
 router = APIRouter()
-graph = create_main_graph()
 
 class ChatRequest(BaseModel):
     chat_id: str
     user_input: str
 
 @router.post("/chat")
-async def chat(request: ChatRequest):
+async def chat(request: ChatRequest, graph: StateGraph = Depends(get_graph)):
     """
     Xử lý yêu cầu chat dạng streaming (v2) có kiểm soát luồng nghiệp vụ.
 
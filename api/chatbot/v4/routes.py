@@ -2,10 +2,11 @@ import traceback
 from typing import Literal
 
 from pydantic import BaseModel
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
+from langgraph.graph import StateGraph
 
 from services.utils import get_or_create_customer
-from core.graph.build_graph import create_main_graph
+from core.graph.graph_dependencies import get_graph
 from services.v4.process_chat import (
     handle_delete_me, 
     handle_normal_chat, 
@@ -18,7 +19,6 @@ from log.logger_config import setup_logging
 logger = setup_logging(__name__)
 
 router = APIRouter()
-graph = create_main_graph()
 
 class ChatRequest(BaseModel):
     chat_id: str
@@ -29,7 +29,10 @@ class ChatResponse(BaseModel):
     reply: str
 
 @router.post("/chat/invoke", response_model=ChatResponse)
-async def chat(request: ChatRequest) -> ChatResponse | HTTPException:
+async def chat(
+    request: ChatRequest,
+    graph: StateGraph = Depends(get_graph)
+) -> ChatResponse | HTTPException:
     """
     Xử lý yêu cầu chat dạng streaming (v2) có kiểm soát luồng nghiệp vụ.
 
@@ -1,14 +1,30 @@
 import os
+import asyncio
 import traceback
+from typing import Literal
 from dotenv import load_dotenv
+from contextlib import asynccontextmanager
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
+from langgraph.graph import StateGraph
 
 from schemas.resquest import WebhookChatRequest, NormalChatRequest
 from schemas.response import ChatResponse
 from services.utils import now_vietnam_time
-from core.graph.build_graph import create_main_graph
-from services.v5.process_chat import handle_webhook_request, handle_invoke_request
+from core.graph.graph_dependencies import get_graph, wait_for_graph
+from services.v5.process_chat import (
+    handle_webhook_request, 
+    handle_invoke_request,
+    handle_stream_request,
+    sweep_webhook_jobs,
+    drain_chat_turns,
+    close_job_queue,
+    start_callback_client,
+    close_callback_client,
+    start_telemetry_sink,
+    close_telemetry_sink,
+    get_service_metrics
+)
 
 from log.logger_config import setup_logging
 
@@ -17,11 +33,32 @@ logger = setup_logging(__name__)
 
 N_DAYS = int(os.getenv("N_DAYS"))
 
-router = APIRouter()
-graph = create_main_graph()
+@asynccontextmanager
+async def lifespan(app):
+    await start_callback_client()
+    await start_telemetry_sink()
+    sweep_task = asyncio.create_task(_sweep_when_graph_ready(app))
+    yield
+    sweep_task.cancel()
+    # Chờ các lượt chat đang chạy xong rồi mới đóng queue, callback client và telemetry
+    await drain_chat_turns()
+    close_job_queue()
+    await close_callback_client()
+    await close_telemetry_sink()
+
+async def _sweep_when_graph_ready(app):
+    # Xử lý lại các tin nhắn webhook đã nhận nhưng chưa trả lời trước lần restart, và của
+    # worker khác đã chết trong lúc app chạy
+    await sweep_webhook_jobs(graph=await wait_for_graph(app))
+
+# Chạy sau lifespan của app (main.py) nên graph đã bắt đầu được dựng
+router = APIRouter(lifespan=lifespan)
 
 @router.post("/chat/invoke", response_model=ChatResponse)
-async def chat(request: NormalChatRequest) -> ChatResponse | HTTPException:
+async def chat(
+    request: NormalChatRequest,
+    graph: StateGraph = Depends(get_graph)
+) -> ChatResponse | HTTPException:
     chat_id = request.chat_id
     user_input = request.user_input
     
@@ -49,7 +86,7 @@ async def chat(request: NormalChatRequest) -> ChatResponse | HTTPException:
         )
         
 @router.post("/chat/webhook", response_model=ChatResponse)
-async def chat(request: WebhookChatRequest):
+async def chat(request: WebhookChatRequest, graph: StateGraph = Depends(get_graph)):
     chat_id = request.chat_id
     user_input = request.user_input
     message_spans = request.message_spans
@@ -76,4 +113,49 @@ async def chat(request: WebhookChatRequest):
         raise HTTPException(
             status_code=500, 
             detail=f"Internal Server Error: {str(e)}"
-        )
\ No newline at end of file
+        )
+        
+@router.post("/chat/stream")
+async def chat_stream(
+    request: NormalChatRequest,
+    format: Literal["sse", "text"] = "sse",
+    graph: StateGraph = Depends(get_graph)
+):
+    """
+    Trả lời theo từng token của agent chuyên trách.
+
+    Args:
+        request (NormalChatRequest): Dữ liệu gồm `chat_id`, `user_input`.
+        format (str): "sse" -> text/event-stream, "text" -> chunked text/plain.
+    """
+    chat_id = request.chat_id
+    user_input = request.user_input
+    
+    timestamp_start = now_vietnam_time()
+    logger.info(f"Received request at {timestamp_start.isoformat()}")
+    
+    try:    
+        return await handle_stream_request(
+            chat_id=chat_id,
+            user_input=user_input,
+            graph=graph,
+            timestamp_start=timestamp_start,
+            media_type="text/event-stream" if format == "sse" else "text/plain"
+        )
+            
+    except Exception as e:
+        error_details = traceback.format_exc()
+        logger.error(f"Exception: {e}")
+        logger.error(f"Chi tiết lỗi: \n{error_details}")
+        
+        raise HTTPException(
+            status_code=500, 
+            detail=f"Internal Server Error: {str(e)}"
+        )
+
+@router.get("/chat/metrics")
+async def metrics() -> dict:
+    """
+    Số liệu vận hành của pipeline v5 (hộp thư theo chat_id, ...).
+    """
+    return await get_service_metrics()
@@ -0,0 +1,117 @@
+"""
+Benchmark: throughput của graph khi chạy `invoke` (chặn event loop) so với `ainvoke`.
+
+LLM thật được thay bằng một chat model giả có độ trễ cố định để kết quả chỉ phụ thuộc
+vào cách graph được thực thi, không phụ thuộc vào OpenAI. Mỗi lượt chat gồm 1 lần gọi
+supervisor + 1 lần gọi service_agent.
+
+Chạy từ thư mục gốc của repo:
+    python -m core.graph.bench_async_graph --latency-ms 200 --levels 1 2 4 8 16 32
+"""
+import time
+import uuid
+import asyncio
+import argparse
+
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.messages import AIMessage
+from langchain_core.language_models.chat_models import BaseChatModel
+
+import database.connection as connection
+
+
+class LatencyChatModel(BaseChatModel):
+    """Chat model giả: ngủ `latency_s` rồi trả lời, hỗ trợ `with_structured_output(Route)`."""
+    latency_s: float = 0.2
+
+    @property
+    def _llm_type(self) -> str:
+        return "latency-fake"
+
+    def bind_tools(self, tools, **kwargs):
+        return self.bind(tools=tools, **kwargs)
+
+    def _reply(self, **kwargs) -> AIMessage:
+        # with_structured_output gọi bind_tools(..., tool_choice="any")
+        if kwargs.get("tool_choice"):
+            return AIMessage(
+                content="",
+                tool_calls=[{
+                    "name": "Route",
+                    "args": {"next": "service_agent"},
+                    "id": str(uuid.uuid4())
+                }]
+            )
+        return AIMessage(content="Dạ em xin gửi khách thông tin dịch vụ ạ.")
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        time.sleep(self.latency_s)
+        return ChatResult(generations=[ChatGeneration(message=self._reply(**kwargs))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        await asyncio.sleep(self.latency_s)
+        return ChatResult(generations=[ChatGeneration(message=self._reply(**kwargs))])
+
+
+def _build_graph(latency_s: float):
+    fake_llm = LatencyChatModel(latency_s=latency_s)
+    connection.orchestrator_llm_provider.override(fake_llm)
+    connection.specialist_llm_provider.override(fake_llm)
+
+    from core.graph.build_graph import create_main_graph
+
+    return create_main_graph()
+
+
+def _make_state() -> dict:
+    from core.graph.state import init_state
+
+    state = init_state()
+    state.update({
+        "user_input": "Cho em hỏi về dịch vụ gội đầu",
+        "chat_id": "bench",
+        "customer_id": 1,
+        "name": "Bench",
+        "phone": "0900000000",
+        "new_customer": False,
+    })
+    return state
+
+
+async def _run_turn(graph, mode: str):
+    config = {"configurable": {"thread_id": str(uuid.uuid4())}}
+    if mode == "sync":
+        # Hành vi cũ: gọi graph.invoke ngay trong coroutine
+        return graph.invoke(_make_state(), config=config)
+    return await graph.ainvoke(_make_state(), config=config)
+
+
+async def _run_level(graph, mode: str, in_flight: int) -> float:
+    start = time.perf_counter()
+    await asyncio.gather(*[_run_turn(graph, mode) for _ in range(in_flight)])
+    return time.perf_counter() - start
+
+
+async def main(latency_ms: int, levels: list[int]):
+    graph = _build_graph(latency_s=latency_ms / 1000)
+
+    # Warm up: biên dịch prompt, tạo sub-graph ReAct
+    await _run_level(graph, "async", 1)
+
+    print(f"LLM latency: {latency_ms} ms/call, 2 calls/turn")
+    print(f"{'in-flight':>9} | {'sync turns/s':>12} | {'async turns/s':>13} | {'speedup':>7}")
+    for in_flight in levels:
+        sync_s = await _run_level(graph, "sync", in_flight)
+        async_s = await _run_level(graph, "async", in_flight)
+        sync_tps = in_flight / sync_s
+        async_tps = in_flight / async_s
+        print(f"{in_flight:>9} | {sync_tps:>12.2f} | {async_tps:>13.2f} | {async_tps / sync_tps:>6.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency-ms", type=int, default=200)
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    args = parser.parse_args()
+
+    asyncio.run(main(latency_ms=args.latency_ms, levels=args.levels))
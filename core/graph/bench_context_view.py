@@ -0,0 +1,132 @@
+"""
+Benchmark: số token message mỗi agent chuyên trách gửi cho LLM, khi dùng toàn bộ
+`messages` so với khi qua `context_view.scoped_prompt` (lọc lượt theo agent + rút gọn
+kết quả tool cũ).
+
+Cuộc hội thoại giả lập gồm các lượt xen kẽ giữa các agent; lượt hiện tại của mỗi agent
+là một vòng ReAct nhiều bước gọi tool với kết quả dài như tool thật (danh sách dịch vụ,
+khung giờ trống theo phòng, chi tiết lịch hẹn).
+
+Chạy từ thư mục gốc của repo:
+    python -m core.graph.bench_context_view --history-turns 12 --tool-steps 4
+"""
+import json
+import uuid
+import argparse
+from itertools import cycle
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langchain_core.messages.utils import count_tokens_approximately
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+
+from core.graph.context_view import (
+    BOOKING_AGENT,
+    FALLBACK_AGENT,
+    MODIFY_BOOKING_AGENT,
+    SERVICE_AGENT,
+    context_view_stats,
+    scoped_prompt,
+)
+
+# Giống cấu hình trong từng agent
+AGENTS = {
+    SERVICE_AGENT: {SERVICE_AGENT},
+    BOOKING_AGENT: {BOOKING_AGENT, SERVICE_AGENT},
+    MODIFY_BOOKING_AGENT: {MODIFY_BOOKING_AGENT, BOOKING_AGENT},
+    FALLBACK_AGENT: None,
+}
+
+TOOL_RESULTS = {
+    "get_services_tool": json.dumps([
+        {
+            "id": index,
+            "service_type": "Chăm sóc da mặt",
+            "service_name": f"Liệu trình chăm sóc da chuyên sâu {index}",
+            "description": "Làm sạch sâu, tẩy tế bào chết, đắp mặt nạ dưỡng ẩm và massage thư giãn.",
+            "duration_minutes": 60,
+            "price": 450000,
+        }
+        for index in range(8)
+    ], ensure_ascii=False),
+    "check_available_booking_tool": "\n".join(
+        f"Phòng {room}: " + ", ".join(f"{hour:02d}:00-{hour:02d}:45" for hour in range(9, 21))
+        for room in range(1, 7)
+    ),
+    "get_appointments_tool": json.dumps([
+        {
+            "appointment_id": 100 + index,
+            "booking_date": "2025-10-0{}".format(index + 1),
+            "start_time": "10:00",
+            "end_time": "11:00",
+            "services": [{"service_name": "Liệu trình chăm sóc da chuyên sâu 1", "price": 450000}],
+            "staff": "Lan",
+            "room": "Phòng 2",
+            "status": "booked",
+        }
+        for index in range(4)
+    ], ensure_ascii=False),
+}
+
+
+def _history(turns: int) -> list:
+    messages = []
+    for index, agent in zip(range(turns), cycle(AGENTS)):
+        messages += [
+            HumanMessage(content=f"Câu hỏi số {index} của khách về dịch vụ và lịch hẹn ạ?"),
+            AIMessage(
+                content=(
+                    "Dạ em xin gửi khách thông tin chi tiết: liệu trình gồm làm sạch, tẩy tế bào chết, "
+                    "đắp mặt nạ và massage, thời gian 60 phút, giá 450.000đ. " * 3
+                ),
+                name=agent
+            ),
+        ]
+    return messages
+
+
+def _react_loop(tool_steps: int) -> list[list]:
+    """Danh sách `messages` mà LLM nhận ở từng bước của vòng ReAct của lượt hiện tại."""
+    messages = [HumanMessage(content="Cho em đặt lịch ngày mai lúc 10h với liệu trình số 1 ạ")]
+    steps = [list(messages)]
+    for _, tool_name in zip(range(tool_steps), cycle(TOOL_RESULTS)):
+        call_id = f"call_{uuid.uuid4().hex[:20]}"
+        messages += [
+            AIMessage(content="", tool_calls=[{"name": tool_name, "args": {}, "id": call_id}]),
+            ToolMessage(content=TOOL_RESULTS[tool_name], name=tool_name, tool_call_id=call_id),
+        ]
+        steps.append(list(messages))
+    return steps
+
+
+def main(history_turns: int, tool_steps: int):
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", "prompt"),
+        MessagesPlaceholder(variable_name="messages")
+    ])
+    history = _history(history_turns)
+    steps = _react_loop(tool_steps)
+
+    for agent, relevant_agents in AGENTS.items():
+        view_prompt = scoped_prompt(prompt, agent=agent, relevant_agents=relevant_agents)
+        for current_turn in steps:
+            view_prompt.invoke({"messages": history + current_turn})
+
+    print(
+        f"history: {history_turns} turns ({count_tokens_approximately(history)} tokens), "
+        f"{len(steps)} LLM calls per agent in the current turn"
+    )
+    print(f"{'agent':<22} | {'tokens full':>11} | {'tokens view':>11} | {'saved':>6} | {'stubbed':>7}")
+    for agent, stats in context_view_stats.stats().items():
+        print(
+            f"{agent:<22} | {stats['tokens_full']:>11} | {stats['tokens_view']:>11} | "
+            f"{stats['saved_ratio']:>6.0%} | {stats['stubbed_tool_messages']:>7}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--history-turns", type=int, default=12)
+    parser.add_argument("--tool-steps", type=int, default=4)
+    args = parser.parse_args()
+
+    main(history_turns=args.history_turns, tool_steps=args.tool_steps)
@@ -0,0 +1,68 @@
+"""
+Đo thời gian khởi động và bộ nhớ (RSS) của app: import `main` + chạy phần startup
+của lifespan, đúng như uvicorn làm trước khi nhận request đầu tiên (vd. /health),
+rồi chờ tới khi graph dùng chung được dựng xong.
+
+Chạy từ thư mục gốc của repo (mỗi lần chạy là một process mới):
+    python -m core.graph.bench_startup
+"""
+import time
+import asyncio
+import resource
+
+
+def _rss_mb() -> float:
+    # Linux: /proc cho RSS hiện tại, nơi khác dùng peak RSS của getrusage
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _count_graph_builds() -> list[float]:
+    """Bọc `create_main_graph` để đếm số graph được dựng và thời gian dựng mỗi graph."""
+    import core.graph.build_graph as build_graph
+
+    durations: list[float] = []
+    create_main_graph = build_graph.create_main_graph
+
+    def timed_create_main_graph():
+        started = time.perf_counter()
+        graph = create_main_graph()
+        durations.append(time.perf_counter() - started)
+        return graph
+
+    build_graph.create_main_graph = timed_create_main_graph
+    return durations
+
+
+async def main():
+    rss_start = _rss_mb()
+    start = time.perf_counter()
+
+    graph_builds = _count_graph_builds()
+    from main import app
+    imported_at = time.perf_counter()
+
+    from core.graph.graph_dependencies import wait_for_graph
+
+    async with app.router.lifespan_context(app):
+        ready_at = time.perf_counter()
+        await wait_for_graph(app)
+        graph_ready_at = time.perf_counter()
+        rss_ready = _rss_mb()
+
+    print(f"import main     : {(imported_at - start) * 1000:8.0f} ms")
+    print(f"lifespan startup: {(ready_at - imported_at) * 1000:8.0f} ms")
+    print(f"serving /health : {(ready_at - start) * 1000:8.0f} ms")
+    print(f"graph ready     : {(graph_ready_at - start) * 1000:8.0f} ms")
+    print(f"graphs built    : {len(graph_builds):8d} ({sum(graph_builds) * 1000:.0f} ms)")
+    print(f"RSS             : {rss_start:8.1f} MB -> {rss_ready:.1f} MB (+{rss_ready - rss_start:.1f} MB)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,163 @@
+"""
+Benchmark: pickle + base64 (định dạng cũ) so với `state_codec` (msgpack, có/không zstd)
+cho cuộc hội thoại 10/50/200 message. Đo thời gian encode, decode và số byte lưu vào
+cột `sessions.state_base64`.
+
+Message được dựng giống lượt chat thật: AIMessage có tool call, ToolMessage trả JSON
+dịch vụ, kèm response_metadata/usage_metadata như ChatOpenAI trả về.
+
+Chạy từ thư mục gốc của repo:
+    python -m core.graph.bench_state_codec --sizes 10 50 200 --repeat 200
+"""
+import json
+import time
+import pickle
+import base64
+import argparse
+from typing import Callable
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from core.graph.state import init_state
+from core.graph.state_codec import LazyState, decode_state, encode_state_bytes, decode_state_bytes
+
+
+def _service(service_id: int) -> dict:
+    return {
+        "service_id": service_id,
+        "service_type": "Chăm sóc da mặt",
+        "service_name": f"Liệu trình chăm sóc da chuyên sâu {service_id}",
+        "duration_minutes": 60,
+        "price": 450000,
+        "discount_value": 0.1,
+        "price_after_discount": 405000.0,
+    }
+
+def _ai_metadata(index: int) -> dict:
+    return {
+        "response_metadata": {
+            "token_usage": {"completion_tokens": 85, "prompt_tokens": 2400, "total_tokens": 2485},
+            "model_name": "gpt-4.1-mini-2025-04-14",
+            "system_fingerprint": "fp_6f2eabb9a5",
+            "id": f"chatcmpl-{index:024d}",
+            "finish_reason": "stop",
+            "logprobs": None,
+        },
+        "usage_metadata": {"input_tokens": 2400, "output_tokens": 85, "total_tokens": 2485},
+    }
+
+def build_state(n_messages: int) -> dict:
+    """State với `n_messages` message: lặp lại human -> ai(tool call) -> tool -> ai."""
+    messages = []
+    index = 0
+    while len(messages) < n_messages:
+        call_id = f"call_{index:020d}"
+        turn = [
+            HumanMessage(content=f"Cho em hỏi spa có dịch vụ chăm sóc da nào không ạ? ({index})"),
+            AIMessage(
+                content="",
+                tool_calls=[{"name": "get_services_tool", "args": {"service_type": "da mặt"}, "id": call_id}],
+                **_ai_metadata(index)
+            ),
+            ToolMessage(
+                content=json.dumps([_service(i) for i in range(3)], ensure_ascii=False),
+                name="get_services_tool",
+                tool_call_id=call_id
+            ),
+            AIMessage(
+                content=(
+                    "Dạ spa hiện có 3 liệu trình chăm sóc da mặt, giá từ 405.000đ sau ưu đãi. "
+                    "Khách muốn em đặt lịch cho liệu trình nào ạ?"
+                ),
+                **_ai_metadata(index)
+            ),
+        ]
+        for message in turn[:n_messages - len(messages)]:
+            message.id = f"run-{index}-{len(messages)}"
+            messages.append(message)
+        index += 1
+
+    state = init_state()
+    state.update(
+        messages=messages,
+        user_input="Cho em đặt lịch ngày mai lúc 10h",
+        chat_id="123456789",
+        next="booking_agent",
+        customer_id=42,
+        name="Nguyễn Văn A",
+        phone="0900000000",
+        session_id=7,
+        seen_services={i: _service(i) for i in range(5)},
+        services={1: _service(1)},
+        book_info={
+            101: {
+                "appointment_id": 101,
+                "booking_date": "2025-09-20",
+                "start_time": "10:00",
+                "end_time": "11:00",
+                "total_time": 60,
+                "note": "",
+                "status": "booked",
+                "total_price": 450000,
+                "total_discount": 45000.0,
+                "price_after_discount": 405000,
+                "create_date": "2025-09-19",
+                "services": {1: _service(1)},
+                "customer": {"customer_id": 42, "name": "Nguyễn Văn A", "phone": "0900000000", "email": None},
+                "staff": {"staff_id": 3, "name": "Lan"},
+                "room": {"room_id": 2, "room_name": "Phòng 2"},
+            }
+        },
+    )
+    return state
+
+
+def _pickle_encode(state: dict) -> bytes:
+    return pickle.dumps(state)
+
+def _timeit(func: Callable[[], object], repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def main(sizes: list[int], repeat: int):
+    print(
+        f"{'messages':>8} | {'format':<14} | {'encode ms':>9} | {'decode ms':>9} | "
+        f"{'bytes':>7} | {'base64 chars':>12}"
+    )
+    for size in sizes:
+        state = build_state(size)
+        formats = {
+            "pickle": (_pickle_encode, pickle.loads),
+            "codec": (lambda s: encode_state_bytes(s, compression="none"), decode_state_bytes),
+            "codec+zstd": (lambda s: encode_state_bytes(s, compression="zstd"), decode_state_bytes),
+        }
+        for name, (encode, decode) in formats.items():
+            data = encode(state)
+            assert len(decode(data)["messages"]) == size
+
+            encode_ms = _timeit(lambda: encode(state), repeat)
+            decode_ms = _timeit(lambda: decode(data), repeat)
+            text_size = len(base64.b64encode(data))
+            print(
+                f"{size:>8} | {name:<14} | {encode_ms:>9.3f} | {decode_ms:>9.3f} | "
+                f"{len(data):>7} | {text_size:>12}"
+            )
+
+        # find_customer chỉ bọc chuỗi lại, chưa giải mã
+        text = base64.b64encode(encode_state_bytes(state)).decode("utf-8")
+        lazy_ms = _timeit(lambda: bool(LazyState(text)), repeat)
+        full_ms = _timeit(lambda: decode_state(text), repeat)
+        print(f"{size:>8} | {'lazy (unused)':<14} | {'':>9} | {lazy_ms:>9.4f} | (full decode {full_ms:.3f} ms)")
+        print("-" * 72)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 50, 200])
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    main(sizes=args.sizes, repeat=args.repeat)
@@ -0,0 +1,87 @@
+"""
+Benchmark: số token lịch sử đưa vào prompt mỗi lượt trong một session dài, khi không
+tóm tắt so với khi có node `summarize` (SUMMARY_TOKEN_BUDGET, SUMMARY_KEEP_TURNS).
+
+LLM tóm tắt được thay bằng model giả trả về bản tóm tắt độ dài cố định, nên kết quả
+chỉ phụ thuộc vào ngân sách token và số lượt giữ lại.
+
+Chạy từ thư mục gốc của repo:
+    python -m core.graph.bench_summarizer --turns 60 --budget 2000 --keep-turns 4
+"""
+import argparse
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.messages.utils import count_tokens_approximately
+from langgraph.graph.message import add_messages
+
+import database.connection as connection
+from core.graph.state import init_state
+from core.graph.bench_async_graph import LatencyChatModel
+
+
+class SummaryChatModel(LatencyChatModel):
+    """Model giả: luôn trả về bản tóm tắt ~120 token."""
+    def _reply(self, **kwargs) -> AIMessage:
+        return AIMessage(content="- Khách hỏi về các liệu trình chăm sóc da và giá ưu đãi. " * 8)
+
+
+def _turn(index: int) -> list:
+    return [
+        HumanMessage(content=f"Cho em hỏi thêm về liệu trình số {index}, giá và thời gian làm ạ?"),
+        AIMessage(content=(
+            f"Dạ liệu trình số {index} kéo dài 60 phút, giá 450.000đ, sau ưu đãi 10% còn 405.000đ. "
+            "Liệu trình gồm làm sạch, tẩy tế bào chết, đắp mặt nạ và massage thư giãn. "
+            "Khách muốn em giữ lịch cho khung giờ nào ạ?"
+        )),
+    ]
+
+
+def main(turns: int, budget: int, keep_turns: int, every: int):
+    connection.orchestrator_llm_provider.override(SummaryChatModel(latency_s=0))
+    from core.graph.summarizer import Summarizer, summary_stats
+
+    summarizer = Summarizer(token_budget=budget, keep_turns=keep_turns)
+    full_history: list = []
+    state = init_state()
+    no_summary_total = with_summary_total = 0
+
+    print(f"budget: {budget} tokens, keep last {keep_turns} turns")
+    print(f"{'turn':>5} | {'no summary':>10} | {'summarized':>10}")
+    for index in range(1, turns + 1):
+        # Prompt của lượt này: lịch sử trước đó (sau node summarize)
+        update = summarizer.summarize_node(state)
+        if update:
+            state["messages"] = add_messages(state["messages"], update["messages"])
+
+        no_summary_tokens = count_tokens_approximately(full_history)
+        with_summary_tokens = count_tokens_approximately(state["messages"])
+        no_summary_total += no_summary_tokens
+        with_summary_total += with_summary_tokens
+        if index % every == 0 or index == turns:
+            print(f"{index:>5} | {no_summary_tokens:>10} | {with_summary_tokens:>10}")
+
+        turn = _turn(index)
+        full_history += turn
+        state["messages"] = add_messages(state["messages"], turn)
+
+    stats = summary_stats.stats()
+    print(
+        f"\nsummarized {stats['summarized_turns']}/{stats['turns']} turns, "
+        f"avg prompt history {stats['avg_tokens_before']} -> {stats['avg_tokens_after']} tokens "
+        f"(max {stats['max_tokens_before']} -> {stats['max_tokens_after']})"
+    )
+    print(
+        f"total history tokens over the session: {no_summary_total} -> {with_summary_total} "
+        f"({100 * (1 - with_summary_total / no_summary_total):.0f}% less)"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=60)
+    parser.add_argument("--budget", type=int, default=2000)
+    parser.add_argument("--keep-turns", type=int, default=4)
+    parser.add_argument("--every", type=int, default=5)
+    args = parser.parse_args()
+
+    main(turns=args.turns, budget=args.budget, keep_turns=args.keep_turns, every=args.every)
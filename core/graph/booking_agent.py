@@ -5,7 +5,8 @@ from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 
 from core.tools import booking_toolbox
 from core.graph.state import AgentState
-from database.connection import specialist_llm
+from core.graph.context_view import scoped_prompt, BOOKING_AGENT, SERVICE_AGENT
+from database.connection import specialist_llm_provider
 
 from log.logger_config import setup_logging
 
@@ -35,12 +36,38 @@ class BookingAgent:
         ])
         
         self.agent = create_react_agent(
-            model=specialist_llm,
+            model=specialist_llm_provider.get(),
             tools=booking_toolbox,
-            prompt=self.prompt,
+            prompt=scoped_prompt(
+                self.prompt,
+                agent=BOOKING_AGENT,
+                relevant_agents={BOOKING_AGENT, SERVICE_AGENT}
+            ),
             state_schema=AgentState
         )
     
+    def _build_command(self, result: dict) -> Command:
+        content = result["messages"][-1].content
+        
+        update = {
+            "messages": [AIMessage(content=content, name=BOOKING_AGENT)],
+            "next": "__end__"
+        }
+        
+        for key in [
+            "customer_id", "name", "phone", "email", "booking_date", "note",
+            "start_time", "end_time", "room_id", "room_name", "staff_id", "staff_name",
+            "book_info", "seen_services", "services", "total_price", "total_time",
+            "total_discount", "price_after_discount", "explain"
+        ]:
+            if result.get(key, None) is not None:
+                update[key] = result[key]
+        
+        return Command(
+            update=update,
+            goto="__end__"
+        )
+    
     def booking_agent_node(self, state: AgentState) -> Command:
         """
         Xử lý các yêu cầu liên quan đến đơn hàng (lên đơn, cập nhật, hủy, ...) bằng `order_toolbox`.
@@ -51,26 +78,25 @@ class BookingAgent:
         """
         try:
             result = self.agent.invoke(state)
-            content = result["messages"][-1].content
             
-            update = {
-                "messages": [AIMessage(content=content, name="booking_agent_node")],
-                "next": "__end__"
-            }
+            return self._build_command(result=result)
             
-            for key in [
-                "customer_id", "name", "phone", "email", "booking_date", "note",
-                "start_time", "end_time", "room_id", "room_name", "staff_id", "staff_name",
-                "book_info", "seen_services", "services", "total_price", "total_time",
-                "total_discount", "price_after_discount", "explain"
-            ]:
-                if result.get(key, None) is not None:
-                    update[key] = result[key]
+        except Exception as e:
+            logger.error(f"Lỗi: {e}")
+            raise
+    
+    async def abooking_agent_node(self, state: AgentState) -> Command:
+        """
+        Phiên bản async của `booking_agent_node`, dùng khi graph chạy bằng `ainvoke`.
+
+        Args:
+            state (AgentState): Trạng thái hội thoại hiện tại.
+
+        """
+        try:
+            result = await self.agent.ainvoke(state)
             
-            return Command(
-                update=update,
-                goto="__end__"
-            )
+            return self._build_command(result=result)
             
         except Exception as e:
             logger.error(f"Lỗi: {e}")
@@ -3,11 +3,13 @@ import os
 from dotenv import load_dotenv
 
 from langgraph.graph import StateGraph, END
-from langgraph.checkpoint.memory import MemorySaver
+from langchain_core.runnables import RunnableLambda
 
 from core.graph import fallback_agent
 from core.graph.state import AgentState
+from core.graph.checkpointer import create_checkpointer
 from core.graph.supervisor import Supervisor
+from core.graph.summarizer import Summarizer
 from core.graph.booking_agent import BookingAgent
 from core.graph.services_agent import ServiceAgent
 from core.graph.fallback_agent import FallbackAgent
@@ -31,40 +33,73 @@ def create_main_graph() -> StateGraph:
     booking_agent = BookingAgent()
     modify_booking_agent = ModifyBookingAgent()
     supervisor_chain = Supervisor()
+    summarizer = Summarizer()
     fallback_agent = FallbackAgent()
 
     # Xây dựng graph
+    # Mỗi node có cả bản sync (graph.invoke) lẫn async (graph.ainvoke)
     workflow = StateGraph(AgentState)
+    workflow.add_node(
+        "summarize",
+        RunnableLambda(
+            summarizer.summarize_node,
+            afunc=summarizer.asummarize_node,
+            name="summarize"
+        )
+    )
     workflow.add_node(
         "supervisor", 
-        supervisor_chain.supervisor_node,
+        RunnableLambda(
+            supervisor_chain.supervisor_node,
+            afunc=supervisor_chain.asupervisor_node,
+            name="supervisor"
+        ),
         # retry=retry_policy
     )
     workflow.add_node(
         "service_agent", 
-        service_agent.services_agent_node,
+        RunnableLambda(
+            service_agent.services_agent_node,
+            afunc=service_agent.aservices_agent_node,
+            name="service_agent"
+        ),
         # retry=retry_policy
     )
     workflow.add_node(
         "booking_agent", 
-        booking_agent.booking_agent_node,
+        RunnableLambda(
+            booking_agent.booking_agent_node,
+            afunc=booking_agent.abooking_agent_node,
+            name="booking_agent"
+        ),
         # retry=retry_policy
     )
     workflow.add_node(
         "modify_booking_agent", 
-        modify_booking_agent.modify_booking_agent_node,
+        RunnableLambda(
+            modify_booking_agent.modify_booking_agent_node,
+            afunc=modify_booking_agent.amodify_booking_agent_node,
+            name="modify_booking_agent"
+        ),
         # retry=retry_policy
     )
     workflow.add_node(
         "fallback_agent", 
-        fallback_agent.fallback_agent_node,
+        RunnableLambda(
+            fallback_agent.fallback_agent_node,
+            afunc=fallback_agent.afallback_agent_node,
+            name="fallback_agent"
+        ),
         # retry=retry_policy
     )
 
-    workflow.set_entry_point("supervisor")
+    # Tóm tắt lịch sử (nếu quá dài) trước khi supervisor và agent dựng prompt
+    workflow.set_entry_point("summarize")
+    workflow.add_edge("summarize", "supervisor")
     
-    memory = MemorySaver()
-    graph = workflow.compile(checkpointer=memory)
+    # Backend chọn theo CHECKPOINTER_BACKEND (memory / sqlite / postgres)
+    checkpointer = create_checkpointer()
+    graph = workflow.compile(checkpointer=checkpointer)
     
     # Khởi tạo cleanup manager
     # cleanup_manager = StateCleanupManager(
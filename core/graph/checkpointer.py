@@ -0,0 +1,429 @@
+import os
+import asyncio
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Any, AsyncIterator, Iterator, Sequence
+
+from dotenv import load_dotenv
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+
+from log.logger_config import setup_logging
+
+load_dotenv()
+logger = setup_logging(__name__)
+
+CHECKPOINTER_BACKEND = os.getenv("CHECKPOINTER_BACKEND", "memory")
+CHECKPOINTER_SQLITE_PATH = os.getenv("CHECKPOINTER_SQLITE_PATH", "checkpoints.db")
+CHECKPOINTER_POSTGRES_DSN = os.getenv("CHECKPOINTER_POSTGRES_DSN")
+CHECKPOINTER_POSTGRES_POOL_SIZE = int(os.getenv("CHECKPOINTER_POSTGRES_POOL_SIZE", "10"))
+
+
+class LatestCheckpointSaver(BaseCheckpointSaver[int], ABC):
+    """
+    Checkpointer lưu trên DB, chỉ giữ checkpoint mới nhất cho mỗi (thread_id, checkpoint_ns)
+    cùng các pending write của checkpoint đó. Nhiều worker dùng chung một DB thì cùng
+    đọc/ghi được một cuộc hội thoại.
+
+    Khi checkpoint gốc (checkpoint_ns = "") được ghi, checkpoint của các sub-graph
+    (agent ReAct chạy bên trong node) trong thread đó bị xoá vì node đã chạy xong.
+
+    Lớp con chỉ cần cung cấp `_cursor()` và cú pháp tham số của driver.
+    """
+    placeholder = "?"
+    blob_type = "BLOB"
+
+    def setup(self):
+        with self._cursor() as cur:
+            cur.execute(f"""
+                CREATE TABLE IF NOT EXISTS checkpoints (
+                    thread_id TEXT NOT NULL,
+                    checkpoint_ns TEXT NOT NULL DEFAULT '',
+                    checkpoint_id TEXT NOT NULL,
+                    parent_checkpoint_id TEXT,
+                    type TEXT,
+                    checkpoint {self.blob_type},
+                    metadata_type TEXT,
+                    metadata {self.blob_type},
+                    PRIMARY KEY (thread_id, checkpoint_ns)
+                )
+            """)
+            cur.execute(f"""
+                CREATE TABLE IF NOT EXISTS checkpoint_writes (
+                    thread_id TEXT NOT NULL,
+                    checkpoint_ns TEXT NOT NULL DEFAULT '',
+                    checkpoint_id TEXT NOT NULL,
+                    task_id TEXT NOT NULL,
+                    idx INTEGER NOT NULL,
+                    channel TEXT NOT NULL,
+                    type TEXT,
+                    value {self.blob_type},
+                    task_path TEXT NOT NULL DEFAULT '',
+                    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+                )
+            """)
+
+    @abstractmethod
+    @contextmanager
+    def _cursor(self) -> Iterator[Any]:
+        """Cursor của một transaction: commit khi thoát bình thường, rollback khi lỗi."""
+
+    def _sql(self, query: str) -> str:
+        return query.replace("?", self.placeholder)
+
+    # -----------------------------------------------------------------------------
+    # Sync API
+    # -----------------------------------------------------------------------------
+
+    def get_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = get_checkpoint_id(config)
+
+        query = (
+            "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, "
+            "type, checkpoint, metadata_type, metadata FROM checkpoints "
+            "WHERE thread_id = ? AND checkpoint_ns = ?"
+        )
+        params: tuple = (thread_id, checkpoint_ns)
+        if checkpoint_id:
+            query += " AND checkpoint_id = ?"
+            params += (checkpoint_id,)
+
+        with self._cursor() as cur:
+            cur.execute(self._sql(query), params)
+            row = cur.fetchone()
+            if row is None:
+                return None
+            return self._to_tuple(cur, row)
+
+    def list(
+        self,
+        config: RunnableConfig | None,
+        *,
+        filter: dict[str, Any] | None = None,
+        before: RunnableConfig | None = None,
+        limit: int | None = None,
+    ) -> Iterator[CheckpointTuple]:
+        query = (
+            "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, "
+            "type, checkpoint, metadata_type, metadata FROM checkpoints"
+        )
+        conditions, params = [], []
+        if config:
+            conditions.append("thread_id = ?")
+            params.append(config["configurable"]["thread_id"])
+            if (checkpoint_ns := config["configurable"].get("checkpoint_ns")) is not None:
+                conditions.append("checkpoint_ns = ?")
+                params.append(checkpoint_ns)
+            if checkpoint_id := get_checkpoint_id(config):
+                conditions.append("checkpoint_id = ?")
+                params.append(checkpoint_id)
+        if before and (before_checkpoint_id := get_checkpoint_id(before)):
+            conditions.append("checkpoint_id < ?")
+            params.append(before_checkpoint_id)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY checkpoint_id DESC"
+
+        with self._cursor() as cur:
+            cur.execute(self._sql(query), tuple(params))
+            rows = cur.fetchall()
+            tuples = [self._to_tuple(cur, row) for row in rows]
+
+        for checkpoint_tuple in tuples:
+            if filter and not all(
+                checkpoint_tuple.metadata.get(key) == value for key, value in filter.items()
+            ):
+                continue
+            if limit is not None:
+                if limit <= 0:
+                    break
+                limit -= 1
+            yield checkpoint_tuple
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        type_, serialized_checkpoint = self.serde.dumps_typed(checkpoint)
+        metadata_type, serialized_metadata = self.serde.dumps_typed(
+            get_checkpoint_metadata(config, metadata)
+        )
+
+        with self._cursor() as cur:
+            cur.execute(
+                self._sql(
+                    "INSERT INTO checkpoints (thread_id, checkpoint_ns, checkpoint_id, "
+                    "parent_checkpoint_id, type, checkpoint, metadata_type, metadata) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (thread_id, checkpoint_ns) DO UPDATE SET "
+                    "checkpoint_id = excluded.checkpoint_id, "
+                    "parent_checkpoint_id = excluded.parent_checkpoint_id, "
+                    "type = excluded.type, checkpoint = excluded.checkpoint, "
+                    "metadata_type = excluded.metadata_type, metadata = excluded.metadata"
+                ),
+                (
+                    thread_id,
+                    checkpoint_ns,
+                    checkpoint["id"],
+                    config["configurable"].get("checkpoint_id"),
+                    type_,
+                    serialized_checkpoint,
+                    metadata_type,
+                    serialized_metadata,
+                )
+            )
+            # Pending write của checkpoint cũ không còn cần nữa
+            cur.execute(
+                self._sql(
+                    "DELETE FROM checkpoint_writes "
+                    "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id <> ?"
+                ),
+                (thread_id, checkpoint_ns, checkpoint["id"])
+            )
+            if checkpoint_ns == "":
+                for table in ("checkpoints", "checkpoint_writes"):
+                    cur.execute(
+                        self._sql(f"DELETE FROM {table} WHERE thread_id = ? AND checkpoint_ns <> ''"),
+                        (thread_id,)
+                    )
+
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+
+        # Write đặc biệt (lỗi, interrupt, ...) có idx âm và được ghi đè, write thường thì giữ bản đầu
+        on_conflict = (
+            "DO UPDATE SET channel = excluded.channel, type = excluded.type, "
+            "value = excluded.value, task_path = excluded.task_path"
+            if all(channel in WRITES_IDX_MAP for channel, _ in writes)
+            else "DO NOTHING"
+        )
+        rows = []
+        for idx, (channel, value) in enumerate(writes):
+            type_, serialized_value = self.serde.dumps_typed(value)
+            rows.append((
+                thread_id,
+                checkpoint_ns,
+                checkpoint_id,
+                task_id,
+                WRITES_IDX_MAP.get(channel, idx),
+                channel,
+                type_,
+                serialized_value,
+                task_path,
+            ))
+
+        with self._cursor() as cur:
+            cur.executemany(
+                self._sql(
+                    "INSERT INTO checkpoint_writes (thread_id, checkpoint_ns, checkpoint_id, "
+                    "task_id, idx, channel, type, value, task_path) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                    f"ON CONFLICT (thread_id, checkpoint_ns, checkpoint_id, task_id, idx) {on_conflict}"
+                ),
+                rows
+            )
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._cursor() as cur:
+            for table in ("checkpoints", "checkpoint_writes"):
+                cur.execute(self._sql(f"DELETE FROM {table} WHERE thread_id = ?"), (thread_id,))
+
+    # -----------------------------------------------------------------------------
+    # Async API: driver là sync nên chạy trong thread pool để không chặn event loop
+    # -----------------------------------------------------------------------------
+
+    async def aget_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(
+        self,
+        config: RunnableConfig | None,
+        *,
+        filter: dict[str, Any] | None = None,
+        before: RunnableConfig | None = None,
+        limit: int | None = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        tuples = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for checkpoint_tuple in tuples:
+            yield checkpoint_tuple
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+    # -----------------------------------------------------------------------------
+
+    def _to_tuple(self, cur: Any, row: tuple) -> CheckpointTuple:
+        (
+            thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id,
+            type_, checkpoint, metadata_type, metadata
+        ) = row
+
+        cur.execute(
+            self._sql(
+                "SELECT task_id, channel, type, value FROM checkpoint_writes "
+                "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? "
+                "ORDER BY task_id, idx"
+            ),
+            (thread_id, checkpoint_ns, checkpoint_id)
+        )
+        pending_writes = [
+            (task_id, channel, self.serde.loads_typed((value_type, bytes(value))))
+            for task_id, channel, value_type, value in cur.fetchall()
+        ]
+
+        return CheckpointTuple(
+            config={
+                "configurable": {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": checkpoint_ns,
+                    "checkpoint_id": checkpoint_id,
+                }
+            },
+            checkpoint=self.serde.loads_typed((type_, bytes(checkpoint))),
+            metadata=self.serde.loads_typed((metadata_type, bytes(metadata))),
+            parent_config=(
+                {
+                    "configurable": {
+                        "thread_id": thread_id,
+                        "checkpoint_ns": checkpoint_ns,
+                        "checkpoint_id": parent_checkpoint_id,
+                    }
+                }
+                if parent_checkpoint_id
+                else None
+            ),
+            pending_writes=pending_writes,
+        )
+
+
+class SqliteCheckpointSaver(LatestCheckpointSaver):
+    """Backend SQLite (WAL) cho một node: các worker uvicorn trên cùng máy dùng chung file."""
+    def __init__(self, path: str, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._lock = threading.Lock()
+        self.setup()
+
+    @contextmanager
+    def _cursor(self) -> Iterator[sqlite3.Cursor]:
+        with self._lock:
+            cur = self._conn.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                yield cur
+                cur.execute("COMMIT")
+            except BaseException:
+                cur.execute("ROLLBACK")
+                raise
+            finally:
+                cur.close()
+
+
+class PostgresCheckpointSaver(LatestCheckpointSaver):
+    """Backend Postgres (hoặc DB tương thích) cho nhiều node, dùng pool kết nối psycopg2."""
+    placeholder = "%s"
+    blob_type = "BYTEA"
+
+    def __init__(self, dsn: str, pool_size: int = 10, **kwargs):
+        from psycopg2.pool import ThreadedConnectionPool
+
+        super().__init__(**kwargs)
+        self._pool = ThreadedConnectionPool(minconn=1, maxconn=pool_size, dsn=dsn)
+        self.setup()
+
+    @contextmanager
+    def _cursor(self) -> Iterator[Any]:
+        conn = self._pool.getconn()
+        try:
+            with conn:
+                with conn.cursor() as cur:
+                    yield cur
+        finally:
+            self._pool.putconn(conn)
+
+
+def create_checkpointer(backend: str = CHECKPOINTER_BACKEND) -> BaseCheckpointSaver:
+    """
+    Tạo checkpointer theo CHECKPOINTER_BACKEND:
+        - "memory": MemorySaver trong process, state được lưu qua sessions.state_base64.
+        - "sqlite": một node, file CHECKPOINTER_SQLITE_PATH.
+        - "postgres": nhiều node, kết nối CHECKPOINTER_POSTGRES_DSN.
+    """
+    if backend == "sqlite":
+        logger.info(f"Using SQLite checkpointer at {CHECKPOINTER_SQLITE_PATH}")
+        return SqliteCheckpointSaver(path=CHECKPOINTER_SQLITE_PATH)
+
+    if backend == "postgres":
+        if not CHECKPOINTER_POSTGRES_DSN:
+            raise ValueError("CHECKPOINTER_POSTGRES_DSN must be set in the .env file.")
+        logger.info("Using Postgres checkpointer")
+        return PostgresCheckpointSaver(
+            dsn=CHECKPOINTER_POSTGRES_DSN,
+            pool_size=CHECKPOINTER_POSTGRES_POOL_SIZE
+        )
+
+    return MemorySaver()
+
+
+def is_persistent(checkpointer: BaseCheckpointSaver | None) -> bool:
+    """True nếu checkpoint được lưu bền (không cần đồng bộ state qua state_base64)."""
+    return isinstance(checkpointer, LatestCheckpointSaver)
@@ -0,0 +1,148 @@
+import os
+import threading
+from dotenv import load_dotenv
+
+from langchain_core.runnables import Runnable, RunnableLambda
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.messages.utils import count_tokens_approximately
+from langchain_core.messages import AIMessage, AnyMessage, HumanMessage, ToolMessage
+
+from core.graph.state import AgentState
+
+load_dotenv()
+
+# ToolMessage được rút gọn khi đã có từng này lần gọi LLM sau nó
+CONTEXT_TOOL_STUB_AFTER = int(os.getenv("CONTEXT_TOOL_STUB_AFTER", "2"))
+# Số lượt gần nhất mọi agent đều thấy đầy đủ, các lượt cũ hơn chỉ giữ lượt của agent liên quan
+CONTEXT_SHARED_TURNS = int(os.getenv("CONTEXT_SHARED_TURNS", "2"))
+
+# Tên (AIMessage.name) của câu trả lời do từng agent chuyên trách tạo ra
+SERVICE_AGENT = "services_agent_node"
+BOOKING_AGENT = "booking_agent_node"
+MODIFY_BOOKING_AGENT = "modify_order_agent"
+FALLBACK_AGENT = "complaint_agent_node"
+
+
+class ContextViewStats:
+    """Số token message mỗi agent gửi cho LLM: toàn bộ lịch sử so với sau khi lọc."""
+    def __init__(self):
+        self._agents: dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def add(self, agent: str, tokens_full: int, tokens_view: int, stubbed: int):
+        with self._lock:
+            agent_stats = self._agents.setdefault(
+                agent, {"calls": 0, "tokens_full": 0, "tokens_view": 0, "stubbed_tool_messages": 0}
+            )
+            agent_stats["calls"] += 1
+            agent_stats["tokens_full"] += tokens_full
+            agent_stats["tokens_view"] += tokens_view
+            agent_stats["stubbed_tool_messages"] += stubbed
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                agent: {
+                    **agent_stats,
+                    "tokens_saved": agent_stats["tokens_full"] - agent_stats["tokens_view"],
+                    "saved_ratio": (
+                        round(1 - agent_stats["tokens_view"] / agent_stats["tokens_full"], 3)
+                        if agent_stats["tokens_full"] else None
+                    ),
+                }
+                for agent, agent_stats in self._agents.items()
+            }
+
+
+context_view_stats = ContextViewStats()
+
+
+def _stub(message: ToolMessage) -> ToolMessage:
+    content = message.content if isinstance(message.content, str) else str(message.content)
+    return message.model_copy(update={
+        "content": f"[Đã rút gọn kết quả cũ của tool {message.name}: {len(content)} ký tự]"
+    })
+
+def stub_tool_messages(messages: list[AnyMessage], stub_after: int) -> tuple[list, int]:
+    """
+    Thay nội dung ToolMessage bằng stub ngắn khi sau nó đã có `stub_after` AIMessage,
+    giữ nguyên tool_call_id để lịch sử gọi tool vẫn hợp lệ với OpenAI.
+    """
+    result = []
+    stubbed = 0
+    ai_after = 0
+    for message in reversed(messages):
+        if isinstance(message, AIMessage):
+            ai_after += 1
+        elif isinstance(message, ToolMessage) and ai_after >= stub_after:
+            message = _stub(message)
+            stubbed += 1
+        result.append(message)
+
+    result.reverse()
+    return result, stubbed
+
+def scope_turns(
+    messages: list[AnyMessage],
+    relevant_agents: set[str] | None,
+    shared_turns: int
+) -> list[AnyMessage]:
+    """
+    Giữ đầy đủ `shared_turns` lượt gần nhất (và lượt hiện tại), còn các lượt cũ hơn chỉ
+    giữ những lượt do agent trong `relevant_agents` trả lời. Message trước HumanMessage
+    đầu tiên (bản tóm tắt) luôn được giữ.
+    """
+    if relevant_agents is None:
+        return messages
+
+    turns: list[list[AnyMessage]] = [[]]
+    for message in messages:
+        if isinstance(message, HumanMessage) and turns[-1]:
+            turns.append([])
+        turns[-1].append(message)
+
+    preamble = []
+    if turns[0] and not isinstance(turns[0][0], HumanMessage):
+        preamble = turns.pop(0)
+    keep_from = max(0, len(turns) - shared_turns - 1)
+
+    view = list(preamble)
+    for index, turn in enumerate(turns):
+        names = [message.name for message in turn if isinstance(message, AIMessage) and message.name]
+        # Lượt chưa rõ agent (lỗi, state cũ) vẫn giữ lại
+        if index >= keep_from or not names or names[-1] in relevant_agents:
+            view.extend(turn)
+
+    return view
+
+
+def scoped_prompt(
+    prompt: ChatPromptTemplate,
+    agent: str,
+    relevant_agents: set[str] | None,
+    stub_after: int = CONTEXT_TOOL_STUB_AFTER,
+    shared_turns: int = CONTEXT_SHARED_TURNS
+) -> Runnable:
+    """
+    Bọc prompt của `create_react_agent`: trước mỗi lần gọi LLM, lọc `messages` theo
+    agent và rút gọn kết quả tool cũ. State gốc (và checkpoint) không bị thay đổi.
+
+    Args:
+        prompt (ChatPromptTemplate): Prompt gốc của agent.
+        agent (str): Tên agent (AIMessage.name), dùng làm key thống kê.
+        relevant_agents (set[str] | None): Các agent có lượt trả lời cần giữ, None = giữ tất cả.
+    """
+    def build_view(state: AgentState) -> dict:
+        messages = state["messages"]
+        view = scope_turns(messages, relevant_agents=relevant_agents, shared_turns=shared_turns)
+        view, stubbed = stub_tool_messages(view, stub_after=stub_after)
+
+        context_view_stats.add(
+            agent=agent,
+            tokens_full=count_tokens_approximately(messages),
+            tokens_view=count_tokens_approximately(view),
+            stubbed=stubbed
+        )
+        return {**state, "messages": view}
+
+    return RunnableLambda(build_view, name=f"{agent}_context_view") | prompt
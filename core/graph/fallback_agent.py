@@ -1,12 +1,13 @@
 import traceback
 from langgraph.types import Command
 from core.graph.state import AgentState
+from core.graph.context_view import scoped_prompt, FALLBACK_AGENT
 from langchain_core.messages import AIMessage
 from langgraph.prebuilt import create_react_agent
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 
 from core.tools import fallback_toolbox
-from database.connection import specialist_llm 
+from database.connection import specialist_llm_provider
 
 from log.logger_config import setup_logging
 
@@ -31,12 +32,32 @@ class FallbackAgent:
         ])
         
         self.agent = create_react_agent(
-            model=specialist_llm,
+            model=specialist_llm_provider.get(),
             tools=fallback_toolbox,
-            prompt=self.prompt,
+            # Khiếu nại cần toàn bộ ngữ cảnh nên không lọc lượt, chỉ rút gọn kết quả tool cũ
+            prompt=scoped_prompt(self.prompt, agent=FALLBACK_AGENT, relevant_agents=None),
             state_schema=AgentState
         )
 
+    def _build_command(self, result: dict) -> Command:
+        content = result["messages"][-1].content
+        
+        update = {
+            "messages": [AIMessage(content=content, name=FALLBACK_AGENT)],
+            "next": "__end__"
+        }
+        
+        for key in [
+            "customer_id", "name", "phone", "email", "book_info"
+        ]:
+            if result.get(key, None) is not None:
+                update[key] = result[key]
+                        
+        return Command(
+            update=update,
+            goto="__end__"
+        )
+
     def fallback_agent_node(self, state: AgentState) -> Command:
         """
         Xử lý các yêu cầu mà chatbot không thể xử lý được.
@@ -49,23 +70,29 @@ class FallbackAgent:
         """
         try:
             result = self.agent.invoke(state)
-            content = result["messages"][-1].content
             
-            update = {
-                "messages": [AIMessage(content=content, name="complaint_agent_node")],
-                "next": "__end__"
-            }
+            return self._build_command(result=result)
+            
+        except Exception as e:
+            error_details = traceback.format_exc()
+            logger.error(f"Exception: {e}")
+            logger.error(f"Chi tiết lỗi: \n{error_details}")
+            raise
+
+    async def afallback_agent_node(self, state: AgentState) -> Command:
+        """
+        Phiên bản async của `fallback_agent_node`, dùng khi graph chạy bằng `ainvoke`.
+
+        Args:
+            state (AgentState): Trạng thái hội thoại hiện tại.
+
+        Returns:
+            Command: Lệnh cập nhật `messages`, `seen_products` (nếu có) và kết thúc luồng.
+        """
+        try:
+            result = await self.agent.ainvoke(state)
             
-            for key in [
-                "customer_id", "name", "phone", "email", "book_info"
-            ]:
-                if result.get(key, None) is not None:
-                    update[key] = result[key]
-                            
-            return Command(
-                update=update,
-                goto="__end__"
-            )
+            return self._build_command(result=result)
             
         except Exception as e:
             error_details = traceback.format_exc()
@@ -1,5 +1,18 @@
-from fastapi import Request
+import asyncio
+from fastapi import FastAPI, Request
 from langgraph.graph import StateGraph
 
-def get_graph(request: Request) -> StateGraph:
-    return request.app.state.graph
\ No newline at end of file
+from core.graph.build_graph import create_main_graph
+
+def start_graph_build(app: FastAPI):
+    """
+    Dựng graph dùng chung trong thread nền (gọi từ lifespan) để app nhận request
+    ngay, vd. /health, trong khi LLM client và các agent đang được khởi tạo.
+    """
+    app.state.graph_task = asyncio.create_task(asyncio.to_thread(create_main_graph))
+
+async def wait_for_graph(app: FastAPI) -> StateGraph:
+    return await app.state.graph_task
+
+async def get_graph(request: Request) -> StateGraph:
+    return await wait_for_graph(request.app)
\ No newline at end of file
@@ -4,8 +4,9 @@ from langgraph.prebuilt import create_react_agent
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 
 from core.graph.state import AgentState
+from core.graph.context_view import scoped_prompt, BOOKING_AGENT, MODIFY_BOOKING_AGENT
 from core.tools import modify_booking_toolbox
-from database.connection import specialist_llm
+from database.connection import specialist_llm_provider
 
 from log.logger_config import setup_logging
 
@@ -32,12 +33,36 @@ class ModifyBookingAgent:
         ])
         
         self.agent = create_react_agent(
-            model=specialist_llm,
+            model=specialist_llm_provider.get(),
             tools=modify_booking_toolbox,
-            prompt=self.prompt,
+            prompt=scoped_prompt(
+                self.prompt,
+                agent=MODIFY_BOOKING_AGENT,
+                relevant_agents={MODIFY_BOOKING_AGENT, BOOKING_AGENT}
+            ),
             state_schema=AgentState
         )
     
+    def _build_command(self, result: dict) -> Command:
+        content = result["messages"][-1].content
+        
+        update = {
+            "messages": [AIMessage(content=content, name=MODIFY_BOOKING_AGENT)],
+            "next": "__end__"
+        }
+        
+        for key in [
+            "customer_id", "name", "phone", "email", 
+            "services", "book_info", "seen_services"
+        ]:
+            if result.get(key, None) is not None:
+                update[key] = result[key]
+        
+        return Command(
+            update=update,
+            goto="__end__"
+        )
+    
     def modify_booking_agent_node(self, state: AgentState) -> Command:
         """
         Xử lý các yêu cầu chỉnh sửa đơn hàng: thay đổi người nhận, thay đổi/xóa sản phẩm,
@@ -51,24 +76,27 @@ class ModifyBookingAgent:
         """
         try:
             result = self.agent.invoke(state)
-            content = result["messages"][-1].content
             
-            update = {
-                "messages": [AIMessage(content=content, name="modify_order_agent")],
-                "next": "__end__"
-            }
+            return self._build_command(result=result)
             
-            for key in [
-                "customer_id", "name", "phone", "email", 
-                "services", "book_info", "seen_services"
-            ]:
-                if result.get(key, None) is not None:
-                    update[key] = result[key]
+        except Exception as e:
+            logger.error(f"Lỗi: {e}")
+            raise
+    
+    async def amodify_booking_agent_node(self, state: AgentState) -> Command:
+        """
+        Phiên bản async của `modify_booking_agent_node`, dùng khi graph chạy bằng `ainvoke`.
+
+        Args:
+            state (AgentState): Trạng thái hội thoại hiện tại.
+
+        Returns:
+            Command: Lệnh cập nhật `messages`, `order`, và điều hướng kết thúc luồng.
+        """
+        try:
+            result = await self.agent.ainvoke(state)
             
-            return Command(
-                update=update,
-                goto="__end__"
-            )
+            return self._build_command(result=result)
             
         except Exception as e:
             logger.error(f"Lỗi: {e}")
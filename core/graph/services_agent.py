@@ -1,12 +1,13 @@
 import traceback
 from langgraph.types import Command
 from core.graph.state import AgentState
+from core.graph.context_view import scoped_prompt, SERVICE_AGENT
 from langchain_core.messages import AIMessage
 from langgraph.prebuilt import create_react_agent
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 
 from core.tools import services_toolbox
-from database.connection import specialist_llm 
+from database.connection import specialist_llm_provider
 
 from log.logger_config import setup_logging
 
@@ -29,12 +30,28 @@ class ServiceAgent:
         ])
         
         self.agent = create_react_agent(
-            model=specialist_llm,
+            model=specialist_llm_provider.get(),
             tools=services_toolbox,
-            prompt=self.prompt,
+            prompt=scoped_prompt(self.prompt, agent=SERVICE_AGENT, relevant_agents={SERVICE_AGENT}),
             state_schema=AgentState
         )
 
+    def _build_command(self, result: dict) -> Command:
+        content = result["messages"][-1].content
+        
+        update = {
+            "messages": [AIMessage(content=content, name=SERVICE_AGENT)],
+            "next": "__end__"
+        }
+        
+        if result.get("seen_services", None) is not None:
+                update["seen_services"] = result["seen_services"]
+                        
+        return Command(
+            update=update,
+            goto="__end__"
+        )
+
     def services_agent_node(self, state: AgentState) -> Command:
         """
         Xử lý các yêu cầu liên quan đến sản phẩm bằng công cụ `product_toolbox`.
@@ -47,20 +64,29 @@ class ServiceAgent:
         """
         try:
             result = self.agent.invoke(state)
-            content = result["messages"][-1].content
             
-            update = {
-                "messages": [AIMessage(content=content, name="services_agent_node")],
-                "next": "__end__"
-            }
+            return self._build_command(result=result)
+            
+        except Exception as e:
+            error_details = traceback.format_exc()
+            logger.error(f"Exception: {e}")
+            logger.error(f"Chi tiết lỗi: \n{error_details}")
+            raise
+
+    async def aservices_agent_node(self, state: AgentState) -> Command:
+        """
+        Phiên bản async của `services_agent_node`, dùng khi graph chạy bằng `ainvoke`.
+
+        Args:
+            state (AgentState): Trạng thái hội thoại hiện tại.
+
+        Returns:
+            Command: Lệnh cập nhật `messages`, `seen_products` (nếu có) và kết thúc luồng.
+        """
+        try:
+            result = await self.agent.ainvoke(state)
             
-            if result.get("seen_services", None) is not None:
-                    update["seen_services"] = result["seen_services"]
-                            
-            return Command(
-                update=update,
-                goto="__end__"
-            )
+            return self._build_command(result=result)
             
         except Exception as e:
             error_details = traceback.format_exc()
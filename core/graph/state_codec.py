@@ -0,0 +1,322 @@
+"""
+Codec cho AgentState lưu ở cột `sessions.state_base64`, thay cho pickle + base64.
+
+Định dạng (v1):
+    MAGIC (2 byte "AS") | version (1 byte) | flags (1 byte) | body
+    body = msgpack của dict state, nén zstd nếu flags có FLAG_ZSTD.
+
+- Message được ghi thành tuple gọn (type, content, id, name, tool_calls | tool_call_id),
+  bỏ response_metadata, usage_metadata, ... nên không phụ thuộc vào class của LangChain.
+- Các typed dict (`Services`, `BookInfo`, `PreBookings`) ghi thành field thường; dict có
+  key int được ghi thành list [key, value] vì msgpack không đọc lại được key int.
+- Dữ liệu không có MAGIC là định dạng pickle cũ, vẫn đọc được để các session cũ chuyển dần.
+
+Cột là text nên bytes vẫn được base64 trước khi lưu.
+"""
+import os
+import copy
+import base64
+import pickle
+from typing import Any, Iterator, Mapping
+
+import ormsgpack
+from dotenv import load_dotenv
+from langchain_core.messages import (
+    AIMessage,
+    AnyMessage,
+    HumanMessage,
+    SystemMessage,
+    ToolMessage,
+    message_to_dict,
+    messages_from_dict,
+)
+
+load_dotenv()
+
+STATE_CODEC_COMPRESSION = os.getenv("STATE_CODEC_COMPRESSION", "zstd")
+STATE_CODEC_ZSTD_LEVEL = int(os.getenv("STATE_CODEC_ZSTD_LEVEL", "3"))
+# Payload nhỏ hơn ngưỡng này không nén (header zstd còn lớn hơn phần tiết kiệm được)
+STATE_CODEC_COMPRESS_MIN_BYTES = int(os.getenv("STATE_CODEC_COMPRESS_MIN_BYTES", "256"))
+
+MAGIC = b"AS"
+VERSION = 1
+FLAG_ZSTD = 0x01
+HEADER_SIZE = len(MAGIC) + 2
+
+# Field có dạng dict[int, ...] trong AgentState
+INT_KEY_FIELDS = ("seen_services", "services", "pre_bookings", "book_info")
+# Field trong từng phần tử của pre_bookings / book_info có dạng dict[int, Services]
+NESTED_INT_KEY_FIELDS = ("services",)
+
+
+class StateCodecError(ValueError):
+    pass
+
+
+# -----------------------------------------------------------------------------
+# Messages
+# -----------------------------------------------------------------------------
+
+def _encode_message(message: AnyMessage) -> list:
+    if isinstance(message, HumanMessage):
+        return ["human", message.content, message.id, message.name]
+    if isinstance(message, AIMessage):
+        tool_calls = [[call["id"], call["name"], call["args"]] for call in message.tool_calls]
+        return ["ai", message.content, message.id, message.name, tool_calls]
+    if isinstance(message, ToolMessage):
+        return ["tool", message.content, message.id, message.name, message.tool_call_id]
+    if isinstance(message, SystemMessage):
+        return ["system", message.content, message.id, message.name]
+
+    # Loại message khác: giữ nguyên dạng dict của LangChain
+    return ["dict", message_to_dict(message)]
+
+def _decode_message(item: list) -> AnyMessage:
+    kind = item[0]
+    if kind == "human":
+        return HumanMessage(content=item[1], id=item[2], name=item[3])
+    if kind == "ai":
+        tool_calls = [
+            {"id": call_id, "name": name, "args": args, "type": "tool_call"}
+            for call_id, name, args in item[4]
+        ]
+        return AIMessage(content=item[1], id=item[2], name=item[3], tool_calls=tool_calls)
+    if kind == "tool":
+        return ToolMessage(content=item[1], id=item[2], name=item[3], tool_call_id=item[4])
+    if kind == "system":
+        return SystemMessage(content=item[1], id=item[2], name=item[3])
+    if kind == "dict":
+        return messages_from_dict([item[1]])[0]
+
+    raise StateCodecError(f"Unknown message type: {kind}")
+
+
+# -----------------------------------------------------------------------------
+# Typed dicts
+# -----------------------------------------------------------------------------
+
+def _pack_int_keys(value: dict | None, nested: bool = False) -> list | None:
+    if value is None:
+        return None
+
+    pairs = []
+    for key, item in value.items():
+        if nested and isinstance(item, dict):
+            item = {
+                field: _pack_int_keys(item[field]) if field in NESTED_INT_KEY_FIELDS else item[field]
+                for field in item
+            }
+        pairs.append([key, item])
+    return pairs
+
+def _unpack_int_keys(pairs: list | None, nested: bool = False) -> dict | None:
+    if pairs is None:
+        return None
+
+    value = {}
+    for key, item in pairs:
+        if nested and isinstance(item, dict):
+            for field in NESTED_INT_KEY_FIELDS:
+                if field in item:
+                    item[field] = _unpack_int_keys(item[field])
+        value[key] = item
+    return value
+
+
+# -----------------------------------------------------------------------------
+# Bytes
+# -----------------------------------------------------------------------------
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError:
+        return None
+    return zstandard
+
+def encode_state_bytes(state: Mapping[str, Any], compression: str = STATE_CODEC_COMPRESSION) -> bytes:
+    body = {}
+    for field, value in state.items():
+        if field == "messages":
+            value = [_encode_message(message) for message in value or []]
+        elif field in INT_KEY_FIELDS:
+            value = _pack_int_keys(value, nested=field in ("pre_bookings", "book_info"))
+        body[field] = value
+
+    payload = ormsgpack.packb(body)
+    flags = 0
+    zstd = _zstd() if compression == "zstd" else None
+    if zstd is not None and len(payload) >= STATE_CODEC_COMPRESS_MIN_BYTES:
+        payload = zstd.ZstdCompressor(level=STATE_CODEC_ZSTD_LEVEL).compress(payload)
+        flags |= FLAG_ZSTD
+
+    return MAGIC + bytes((VERSION, flags)) + payload
+
+def _unpack_body(data: bytes) -> dict:
+    version, flags = data[2], data[3]
+    if version != VERSION:
+        raise StateCodecError(f"Unsupported state codec version: {version}")
+
+    payload = data[HEADER_SIZE:]
+    if flags & FLAG_ZSTD:
+        zstd = _zstd()
+        if zstd is None:
+            raise StateCodecError("State is zstd-compressed but zstandard is not installed")
+        payload = zstd.ZstdDecompressor().decompress(payload)
+
+    return ormsgpack.unpackb(payload)
+
+def decode_state_bytes(data: bytes) -> dict:
+    if not data.startswith(MAGIC):
+        # Định dạng cũ: pickle của AgentState
+        return pickle.loads(data)
+
+    body = _unpack_body(data)
+    for field in body:
+        if field == "messages":
+            body[field] = [_decode_message(item) for item in body[field] or []]
+        elif field in INT_KEY_FIELDS:
+            body[field] = _unpack_int_keys(body[field], nested=field in ("pre_bookings", "book_info"))
+
+    return body
+
+
+# -----------------------------------------------------------------------------
+# Delta
+# -----------------------------------------------------------------------------
+
+def diff_state(old: Mapping[str, Any], new: Mapping[str, Any]) -> dict | None:
+    """
+    Phần thay đổi từ `old` sang `new`: message mới (nối vào cuối) và các field
+    có giá trị khác. Trả về None nếu message cũ bị xoá/sửa, khi đó phải ghi lại
+    toàn bộ state.
+    """
+    old_messages = old.get("messages") or []
+    new_messages = new.get("messages") or []
+    if len(new_messages) < len(old_messages):
+        return None
+    for old_message, new_message in zip(old_messages, new_messages):
+        if old_message.id != new_message.id or old_message.content != new_message.content:
+            return None
+
+    delta = {
+        field: value
+        for field, value in new.items()
+        if field != "messages" and (field not in old or old[field] != value)
+    }
+    if len(new_messages) > len(old_messages):
+        delta["messages"] = new_messages[len(old_messages):]
+
+    return delta
+
+def apply_delta(state: dict, delta: Mapping[str, Any]) -> dict:
+    for field, value in delta.items():
+        if field == "messages":
+            seen = {message.id for message in state.get("messages") or []}
+            state["messages"] = list(state.get("messages") or []) + [
+                message for message in value if message.id not in seen
+            ]
+        else:
+            state[field] = value
+    return state
+
+
+# -----------------------------------------------------------------------------
+# Text (cột state_base64)
+# -----------------------------------------------------------------------------
+
+class LazyState(Mapping):
+    """
+    State đọc từ DB nhưng chỉ giải mã khi được dùng tới. `find_customer` được gọi
+    nhiều lần mỗi lượt chat, còn state chỉ cần khi dựng input cho graph (và không
+    cần nếu checkpointer lưu bền đã có state).
+
+    State = snapshot (`sessions.state_base64`, đã gộp tới `snapshot_seq`) + các delta
+    có seq lớn hơn, được áp lần lượt khi giải mã.
+
+    `bool(state)` không giải mã: rỗng khi không có snapshot lẫn delta.
+
+    Bản đã giải mã là mốc để `diff_state` so với state sau lượt chat nên không bao giờ
+    dùng chung object lồng nhau với bên ngoài: `to_dict` trả bản copy sâu (tool sửa tại
+    chỗ như `del state["services"][id]` không sửa mốc), delta/snapshot mới được copy
+    trước khi giữ lại.
+    """
+    __slots__ = ("_data", "_state", "_deltas", "snapshot_seq")
+
+    def __init__(self, data: str | None, snapshot_seq: int = 0, deltas: list[dict] | None = None):
+        self._data = data
+        self._state: dict | None = None
+        self.snapshot_seq = snapshot_seq or 0
+        # Delta đã gộp vào snapshot nhưng chưa kịp xoá thì bỏ qua
+        self._deltas = sorted(
+            (delta for delta in deltas or [] if delta["seq"] > self.snapshot_seq),
+            key=lambda delta: delta["seq"]
+        )
+
+    @property
+    def seq(self) -> int:
+        """Seq của delta cuối cùng (hoặc của snapshot nếu chưa có delta)."""
+        return self._deltas[-1]["seq"] if self._deltas else self.snapshot_seq
+
+    @property
+    def pending_deltas(self) -> int:
+        return len(self._deltas)
+
+    def append_delta(self, seq: int, payload: str, delta: dict):
+        """Thêm delta vừa ghi xuống DB; nếu state đã giải mã thì áp luôn vào bản đang giữ."""
+        self._deltas.append({"seq": seq, "payload": payload})
+        if self._state is not None:
+            apply_delta(self._state, copy.deepcopy(delta))
+
+    def replace_snapshot(self, data: str, seq: int, state: dict):
+        """Snapshot mới vừa ghi xuống DB thay cho snapshot + delta cũ."""
+        self._data = data
+        self.snapshot_seq = seq
+        self._deltas = []
+        self._state = copy.deepcopy(dict(state))
+
+    def estimated_bytes(self) -> int:
+        """Ước lượng bộ nhớ: dữ liệu đã mã hoá, cộng nội dung message nếu đã giải mã."""
+        size = len(self._data or "") + sum(len(delta["payload"]) for delta in self._deltas)
+        if self._state is not None:
+            size += sum(len(str(message.content)) for message in self._state.get("messages") or [])
+        return size
+
+    def to_dict(self) -> dict:
+        """Giải mã (một lần) và trả về bản copy sâu, sửa thoải mái không ảnh hưởng mốc."""
+        return copy.deepcopy(self._load())
+
+    def _load(self) -> dict:
+        if self._state is None:
+            state = decode_state(self._data)
+            for delta in self._deltas:
+                apply_delta(state, decode_state(delta["payload"]))
+            self._state = state
+        return self._state
+
+    def __bool__(self) -> bool:
+        return bool(self._data) or bool(self._deltas)
+
+    def __getitem__(self, key: str) -> Any:
+        return self._load()[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._load())
+
+    def __len__(self) -> int:
+        return len(self._load())
+
+    def __repr__(self) -> str:
+        state = "decoded" if self._state is not None else "not decoded"
+        return (
+            f"<LazyState {len(self._data or '')} chars + {len(self._deltas)} deltas ({state})>"
+        )
+
+def encode_state(state: Mapping[str, Any]) -> str:
+    return base64.b64encode(encode_state_bytes(state)).decode("utf-8")
+
+def decode_state(data: str | None) -> dict:
+    if not data:
+        return {}
+
+    return decode_state_bytes(base64.b64decode(data.encode("utf-8")))
@@ -0,0 +1,217 @@
+import os
+import threading
+import traceback
+from dotenv import load_dotenv
+
+from langgraph.graph.message import REMOVE_ALL_MESSAGES
+from langchain_core.messages.utils import count_tokens_approximately
+from langchain_core.messages import AnyMessage, HumanMessage, RemoveMessage, SystemMessage
+
+from core.graph.state import AgentState
+from database.connection import orchestrator_llm_provider
+
+from log.logger_config import setup_logging
+
+load_dotenv()
+logger = setup_logging(__name__)
+
+# Tóm tắt khi lịch sử vượt quá số token (ước lượng) này, giữ nguyên K lượt gần nhất
+SUMMARY_TOKEN_BUDGET = int(os.getenv("SUMMARY_TOKEN_BUDGET", "2000"))
+SUMMARY_KEEP_TURNS = int(os.getenv("SUMMARY_KEEP_TURNS", "4"))
+SUMMARY_MESSAGE_ID = "conversation_summary"
+SUMMARY_HEADER = "Tóm tắt các lượt hội thoại trước:"
+FACTS_HEADER = "Thông tin đã lưu:"
+
+
+class SummaryStats:
+    """Số token của lịch sử đưa vào prompt mỗi lượt, trước và sau khi tóm tắt."""
+    def __init__(self):
+        self.turns = 0
+        self.summarized_turns = 0
+        self.failures = 0
+        self.tokens_before = 0
+        self.tokens_after = 0
+        self.max_tokens_before = 0
+        self.max_tokens_after = 0
+        self._lock = threading.Lock()
+
+    def add(self, tokens_before: int, tokens_after: int, summarized: bool, failed: bool = False):
+        with self._lock:
+            self.turns += 1
+            self.summarized_turns += int(summarized)
+            self.failures += int(failed)
+            self.tokens_before += tokens_before
+            self.tokens_after += tokens_after
+            self.max_tokens_before = max(self.max_tokens_before, tokens_before)
+            self.max_tokens_after = max(self.max_tokens_after, tokens_after)
+
+    def stats(self) -> dict:
+        return {
+            "token_budget": SUMMARY_TOKEN_BUDGET,
+            "keep_turns": SUMMARY_KEEP_TURNS,
+            "turns": self.turns,
+            "summarized_turns": self.summarized_turns,
+            "failures": self.failures,
+            "avg_tokens_before": round(self.tokens_before / self.turns, 1) if self.turns else None,
+            "avg_tokens_after": round(self.tokens_after / self.turns, 1) if self.turns else None,
+            "max_tokens_before": self.max_tokens_before,
+            "max_tokens_after": self.max_tokens_after,
+            "tokens_saved": self.tokens_before - self.tokens_after,
+        }
+
+
+summary_stats = SummaryStats()
+
+
+def _render_facts(state: AgentState) -> str:
+    """Thông tin có cấu trúc trong state, gắn vào cuối bản tóm tắt để không bị LLM làm mất."""
+    lines = []
+    for service in (state.get("services") or {}).values():
+        lines.append(f"- Dịch vụ khách đã chọn: {service.get('service_name')} (id {service.get('service_id')})")
+
+    for appointment_id, book in (state.get("book_info") or {}).items():
+        services = ", ".join(
+            str(service.get("service_name")) for service in (book.get("services") or {}).values()
+        )
+        lines.append(
+            f"- Lịch đã đặt #{appointment_id}: {book.get('booking_date')} "
+            f"{book.get('start_time')}-{book.get('end_time')}, {services}, "
+            f"trạng thái {book.get('status')}"
+        )
+
+    return "\n".join(lines)
+
+
+def _render_conversation(messages: list[AnyMessage]) -> str:
+    lines = []
+    for message in messages:
+        if message.id == SUMMARY_MESSAGE_ID or not message.content:
+            continue
+        speaker = "Khách" if isinstance(message, HumanMessage) else "Chatbot"
+        lines.append(f"{speaker}: {message.content}")
+    return "\n".join(lines)
+
+
+def split_history(messages: list[AnyMessage], keep_turns: int) -> tuple[list, list]:
+    """Tách lịch sử thành (phần cũ cần tóm tắt, `keep_turns` lượt gần nhất giữ nguyên)."""
+    human_indexes = [
+        index for index, message in enumerate(messages) if isinstance(message, HumanMessage)
+    ]
+    if len(human_indexes) <= keep_turns:
+        return [], messages
+
+    cut = human_indexes[-keep_turns] if keep_turns > 0 else len(messages)
+    return messages[:cut], messages[cut:]
+
+
+class Summarizer:
+    """
+    Node chạy trước supervisor: khi lịch sử vượt SUMMARY_TOKEN_BUDGET thì gộp các lượt cũ
+    vào một SystemMessage tóm tắt (id cố định, luôn đứng đầu) và chỉ giữ SUMMARY_KEEP_TURNS
+    lượt gần nhất. Các field có cấu trúc (services, book_info, ...) không bị thay đổi.
+    """
+    def __init__(
+        self,
+        token_budget: int = SUMMARY_TOKEN_BUDGET,
+        keep_turns: int = SUMMARY_KEEP_TURNS
+    ):
+        with open("core/prompts/summarizer_prompt.md", "r", encoding="utf-8") as f:
+            self.system_prompt = f.read()
+
+        self.token_budget = token_budget
+        self.keep_turns = keep_turns
+        self.llm = orchestrator_llm_provider.get()
+
+    def _plan(self, state: AgentState) -> tuple[int, list, list, str] | None:
+        """Trả về (số token, phần cũ, phần giữ lại, tóm tắt hiện có) nếu cần tóm tắt."""
+        messages = state.get("messages") or []
+        tokens = count_tokens_approximately(messages)
+        if tokens <= self.token_budget:
+            summary_stats.add(tokens_before=tokens, tokens_after=tokens, summarized=False)
+            return None
+
+        old, recent = split_history(messages, keep_turns=self.keep_turns)
+        if not old:
+            summary_stats.add(tokens_before=tokens, tokens_after=tokens, summarized=False)
+            return None
+
+        previous = next(
+            (message.content for message in old if message.id == SUMMARY_MESSAGE_ID), ""
+        )
+        previous = previous.split(f"\n\n{FACTS_HEADER}")[0].removeprefix(SUMMARY_HEADER).strip()
+        return tokens, old, recent, previous
+
+    def _summary_input(self, old: list, previous: str) -> list:
+        return [
+            SystemMessage(content=self.system_prompt),
+            HumanMessage(content=(
+                f"summary:\n{previous or '(trống)'}\n\n"
+                f"conversation:\n{_render_conversation(old)}"
+            ))
+        ]
+
+    def _build_update(self, state: AgentState, tokens: int, recent: list, summary: str) -> dict:
+        content = f"{SUMMARY_HEADER}\n{summary.strip()}"
+        facts = _render_facts(state)
+        if facts:
+            content += f"\n\n{FACTS_HEADER}\n{facts}"
+
+        new_messages = [SystemMessage(content=content, id=SUMMARY_MESSAGE_ID)] + recent
+        tokens_after = count_tokens_approximately(new_messages)
+        summary_stats.add(tokens_before=tokens, tokens_after=tokens_after, summarized=True)
+        logger.info(f"Summarized history: {tokens} -> {tokens_after} tokens")
+
+        return {"messages": [RemoveMessage(id=REMOVE_ALL_MESSAGES)] + new_messages}
+
+    def _on_error(self, e: Exception, tokens: int):
+        # Không tóm tắt được thì vẫn trả lời khách với lịch sử đầy đủ
+        error_details = traceback.format_exc()
+        logger.error(f"Exception: {e}")
+        logger.error(f"Chi tiết lỗi: \n{error_details}")
+        summary_stats.add(tokens_before=tokens, tokens_after=tokens, summarized=False, failed=True)
+
+    def summarize_node(self, state: AgentState) -> dict:
+        """
+        Tóm tắt lịch sử hội thoại nếu vượt ngân sách token.
+
+        Args:
+            state (AgentState): Trạng thái hội thoại hiện tại.
+
+        Returns:
+            dict: Cập nhật `messages` (rỗng nếu không cần tóm tắt).
+        """
+        plan = self._plan(state)
+        if plan is None:
+            return {}
+
+        tokens, old, recent, previous = plan
+        try:
+            summary = self.llm.invoke(self._summary_input(old, previous)).content
+        except Exception as e:
+            self._on_error(e, tokens)
+            return {}
+
+        return self._build_update(state, tokens, recent, summary)
+
+    async def asummarize_node(self, state: AgentState) -> dict:
+        """
+        Phiên bản async của `summarize_node`, dùng khi graph chạy bằng `ainvoke`.
+
+        Args:
+            state (AgentState): Trạng thái hội thoại hiện tại.
+
+        Returns:
+            dict: Cập nhật `messages` (rỗng nếu không cần tóm tắt).
+        """
+        plan = self._plan(state)
+        if plan is None:
+            return {}
+
+        tokens, old, recent, previous = plan
+        try:
+            summary = (await self.llm.ainvoke(self._summary_input(old, previous))).content
+        except Exception as e:
+            self._on_error(e, tokens)
+            return {}
+
+        return self._build_update(state, tokens, recent, summary)
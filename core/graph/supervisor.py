@@ -1,3 +1,4 @@
+import asyncio
 from typing import Literal
 from datetime import datetime
 from pydantic import BaseModel, Field
@@ -9,7 +10,7 @@ from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from core.graph.state import AgentState 
 from repository.sync_repo import CustomerRepo
 from database.connection import supabase_client
-from database.connection import orchestrator_llm
+from database.connection import orchestrator_llm_provider
 
 from log.logger_config import setup_logging
 
@@ -50,9 +51,74 @@ class Supervisor:
             ("human", "{user_input}")
         ])
         
-        self.chain = self.prompt | orchestrator_llm.with_structured_output(Route)
+        self.chain = self.prompt | orchestrator_llm_provider.get().with_structured_output(Route)
         self.customer_repo = CustomerRepo(supabase_client=supabase_client)
         
+    def _resolve_customer(self, state: AgentState) -> dict:
+        """
+        Lấy thông tin khách (tạo mới nếu cần) và cờ khách mới, cập nhật trực tiếp vào `state`.
+
+        Args:
+            state (AgentState): Trạng thái hội thoại hiện tại.
+
+        Returns:
+            dict: Các trường cần cập nhật vào state.
+        """
+        update = {}
+        if not state["customer_id"]:
+            customer = self.customer_repo.get_or_create_customer(
+                chat_id=state["chat_id"]
+            )
+            
+            logger.info(f"Tạo mới hoặc lấy thông tin khách: {customer}")
+
+            if not customer:
+                logger.error("Lỗi không lấy được thông tin khách")
+            else:
+                update.update({
+                    "customer_id": customer.get("id"),
+                    "name": customer.get("name"),
+                    "phone": customer.get("phone"),
+                    "emai": customer.get("email")
+                })
+                state["customer_id"] = customer.get("id")
+        else:
+            logger.info(
+                "Thông tin của khách: "
+                f"- Tên: {state["name"]} | "
+                f"- Số điện thoại: {state["phone"]} | "
+                f"- Email: {state["email"]}"
+            )
+        
+        # Check the customer is new or not
+        if state["new_customer"] is None:
+            update["new_customer"] = self.customer_repo.is_new_customer(
+                customer_id=state.get("customer_id", 0)
+            )
+            state["new_customer"] = update["new_customer"]
+        
+        logger.info(f"New customer: {state["new_customer"]}")
+        logger.info(f"Yêu cầu của khách: {state["user_input"]}")
+        
+        return update
+    
+    def _build_command(self, state: AgentState, update: dict, result: Route) -> Command:
+        next_node = result.next
+        update.update({
+            "next": next_node,
+            "messages": [HumanMessage(
+                content=state["user_input"]
+            )],
+            "current_date": str(datetime.now().strftime("%A, %d-%m-%Y"))
+        })
+        
+        logger.info(f"Agent tiếp theo: {next_node}")
+
+        return Command(
+            update=update,
+            goto=next_node
+        )
+        
     def supervisor_node(self, state: AgentState) -> Command:
         """
         Phân luồng yêu cầu của khách tới agent phù hợp dựa trên `state` và prompt điều phối.
@@ -63,64 +129,32 @@ class Supervisor:
         Returns:
             Command: Lệnh cập nhật `messages`, trường `next` và điều hướng `goto` tới node tiếp theo.
         """
-        update = {}
         try:
-            if not state["customer_id"]:
-                customer = self.customer_repo.get_or_create_customer(
-                    chat_id=state["chat_id"]
-                )
-                
-                logger.info(f"Tạo mới hoặc lấy thông tin khách: {customer}")
-
-                if not customer:
-                    logger.error("Lỗi không lấy được thông tin khách")
-                else:
-                    update.update({
-                        "customer_id": customer.get("id"),
-                        "name": customer.get("name"),
-                        "phone": customer.get("phone"),
-                        "emai": customer.get("email")
-                    })
-                    state["customer_id"] = customer.get("id")
-            else:
-                logger.info(
-                    "Thông tin của khách: "
-                    f"- Tên: {state["name"]} | "
-                    f"- Số điện thoại: {state["phone"]} | "
-                    f"- Email: {state["email"]}"
-                )
-            
-            # Check the customer is new or not
-            if state["new_customer"] is None:
-                update["new_customer"] = self.customer_repo.is_new_customer(
-                    customer_id=state.get("customer_id", 0)
-                )
-                state["new_customer"] = update["new_customer"]
-            
-            logger.info(f"New customer: {state["new_customer"]}")
-            logger.info(f"Yêu cầu của khách: {state["user_input"]}")
-            
+            update = self._resolve_customer(state=state)
             result = self.chain.invoke(state)
             
-            next_node = result.next
-            update["next"] = next_node
-            update["messages"] = [HumanMessage(
-                content=state["user_input"]
-            )]
-            update.update({
-                "next": next_node,
-                "messages": [HumanMessage(
-                    content=state["user_input"]
-                )],
-                "current_date": str(datetime.now().strftime("%A, %d-%m-%Y"))
-            })
-            
-            logger.info(f"Agent tiếp theo: {next_node}")
+            return self._build_command(state=state, update=update, result=result)
+        
+        except Exception as e:
+            logger.error(f"Lỗi: {e}")
+            raise
     
-            return Command(
-                update=update,
-                goto=next_node
-            )
+    async def asupervisor_node(self, state: AgentState) -> Command:
+        """
+        Phiên bản async của `supervisor_node`: truy vấn Supabase (client sync) được chạy
+        trong thread pool, LLM điều phối được gọi bằng `ainvoke` nên không chặn event loop.
+
+        Args:
+            state (AgentState): Trạng thái hội thoại hiện tại.
+
+        Returns:
+            Command: Lệnh cập nhật `messages`, trường `next` và điều hướng `goto` tới node tiếp theo.
+        """
+        try:
+            update = await asyncio.to_thread(self._resolve_customer, state)
+            result = await self.chain.ainvoke(state)
+            
+            return self._build_command(state=state, update=update, result=result)
         
         except Exception as e:
             logger.error(f"Lỗi: {e}")
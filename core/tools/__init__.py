@@ -1,6 +1,7 @@
 from core.tools.booking_tool import (
     create_appointment_tool,
     check_available_booking_tool,
+    find_available_slots_tool,
     resolve_weekday_to_date_tool
 )
 from core.tools.modify_booking_tool import (
@@ -24,6 +25,7 @@ booking_toolbox = [
     remove_service_tool,
     create_appointment_tool,
     check_available_booking_tool,
+    find_available_slots_tool,
     modify_customer_tool,
     resolve_weekday_to_date_tool
 ]
@@ -33,6 +35,7 @@ modify_booking_toolbox = [
     cancel_booking_tool,
     get_all_editable_booking,
     check_available_booking_tool,
+    find_available_slots_tool,
     resolve_weekday_to_date_tool,
 ]
 
@@ -9,15 +9,20 @@ from datetime import date, time, timedelta, datetime
 
 from database.connection import supabase_client
 from core.graph.state import AgentState, PreBookings
-from google_connection.sheet_logger import DemoLogger
+from core.utils.availability import SLOT_SEARCH_MAX_DAYS, DayAvailability, rank_slot_options
+from core.utils.group_booking import find_group_alternatives, solve_group_booking
+from core.utils.placement import bookable_starts, place_booking
+from repository.availability_cache import DaySchedule, availability_cache
+from google_connection.sheet_logger import demo_logger_provider
 from repository.sync_repo import AppointmentRepo, RoomRepo, StaffRepo
 from core.utils.function import (
+    add_async_variant,
     build_update,
-    choose_room_and_staff,
     convert_date_str,
-    free_slots_with_staff,
+    minutes_to_time,
     parese_date,
     parse_time, 
+    time_to_minutes,
     time_to_str, 
     return_appointments,
     update_book_info
@@ -30,7 +35,6 @@ logger = setup_logging(__name__)
 appointment_repo = AppointmentRepo(supabase_client=supabase_client)
 room_repo = RoomRepo(supabase_client=supabase_client)
 staff_repo = StaffRepo(supabase_client=supabase_client)
-demo_logger = DemoLogger()
 
 def _handle_send_to_sheet(appointment_details: dict):
     if appointment_details["customer"]["email"]:
@@ -38,25 +42,149 @@ def _handle_send_to_sheet(appointment_details: dict):
     else:
         email = "Không có"
         
-    demo_logger.log(
+    demo_logger_provider.get().log(
         booking_info=appointment_details,
         service_items=appointment_details["appointment_services"]
     )
 
+def _load_day_schedule(booking_date: str) -> DaySchedule:
+    staffs = staff_repo.get_all_staff_return_dict()
+    rooms = room_repo.get_all_rooms_return_dict()
+    orders = appointment_repo.get_appointment_by_booking_date(
+        booking_date=booking_date
+    )
+    
+    return DaySchedule(
+        booking_date=booking_date,
+        rooms=rooms,
+        staffs=staffs,
+        orders=orders,
+        availability=DayAvailability(orders=orders, staffs=staffs)
+    )
+
+def _load_day_schedules(dates: list[str]) -> dict[str, DaySchedule]:
+    """
+    Lịch của nhiều ngày liên tiếp qua `availability_cache`: các ngày chưa có trong cache
+    được đọc chung bằng một query theo khoảng ngày thay vì một query mỗi ngày.
+    """
+    fetched = {}
+    
+    def load(booking_date: str) -> DaySchedule:
+        if not fetched:
+            fetched["staffs"] = staff_repo.get_all_staff_return_dict()
+            fetched["rooms"] = room_repo.get_all_rooms_return_dict()
+            fetched["orders"] = {}
+            appointments = appointment_repo.get_appointments_by_date_range(
+                date_from=dates[0],
+                date_to=dates[-1]
+            )
+            for order in appointments or []:
+                fetched["orders"].setdefault(str(order["booking_date"]), []).append(order)
+        
+        # Ngày không có lịch hẹn -> None, giống get_appointment_by_booking_date
+        orders = fetched["orders"].get(booking_date)
+        return DaySchedule(
+            booking_date=booking_date,
+            rooms=fetched["rooms"],
+            staffs=fetched["staffs"],
+            orders=orders,
+            availability=DayAvailability(orders=orders, staffs=fetched["staffs"])
+        )
+    
+    return {
+        booking_date: availability_cache.get_or_load(
+            booking_date=booking_date,
+            loader=lambda booking_date=booking_date: load(booking_date)
+        )
+        for booking_date in dates
+    }
+
+def _format_time_range(slot: dict) -> str:
+    return (
+        f"{minutes_to_time(slot['start_min']).strftime('%H:%M:%S')} - "
+        f"{minutes_to_time(slot['end_min']).strftime('%H:%M:%S')}"
+    )
+
+def _handle_group_booking(
+    booking_date: str,
+    start_time: str,
+    end_time: str,
+    duration: int,
+    day: DaySchedule,
+    k: int,
+    tool_call_id: str
+) -> Command:
+    """
+    Nhóm k > 1 khách: kiểm tra xếp được mỗi khách một nhân viên riêng, phòng đủ chỗ cho cả
+    nhóm (có thể chia phòng). `create_appointment_tool` chỉ tạo một lịch hẹn cho cả nhóm
+    nên chỉ báo khách là còn lịch, không hứa phòng/nhân viên cho từng khách.
+    """
+    rooms, staffs = day.rooms, day.staffs
+    start_min = time_to_minutes(parse_time(start_time))
+    group = solve_group_booking(
+        availability=day.availability,
+        rooms=rooms,
+        start_min=start_min,
+        durations=[duration] * k
+    )
+    
+    if group is None:
+        alternatives = find_group_alternatives(
+            availability=day.availability,
+            rooms=rooms,
+            start_min=start_min,
+            durations=[duration] * k
+        )
+        logger.info(f"Không xếp được nhóm {k} khách | Số giờ thay thế: {len(alternatives)}")
+        
+        response = f"Không đủ phòng hoặc nhân viên cho nhóm {k} khách lúc {start_time}.\n"
+        if alternatives:
+            response += "Các giờ gần nhất trong ngày xếp được cả nhóm:\n"
+            for alternative in alternatives:
+                response += f"- {_format_time_range(alternative)}\n"
+        else:
+            response += "Trong ngày không còn giờ nào xếp được cả nhóm, hỏi khách chọn ngày khác"
+        
+        return Command(
+            update=build_update(
+                content=response,
+                tool_call_id=tool_call_id,
+                booking_date=booking_date
+            )
+        )
+    
+    # State chỉ giữ một phòng/nhân viên cho lịch hẹn: lấy của khách đầu tiên
+    first = group["assignments"][0]
+    logger.info(f"Xếp được nhóm {k} khách: {group['assignments']}")
+    
+    return Command(
+        update=build_update(
+            content=(
+                f"Thông báo khách có lịch trống cho nhóm {k} khách "
+                f"từ {start_time} đến {end_time}"
+            ),
+            tool_call_id=tool_call_id,
+            booking_date=booking_date,
+            start_time=start_time,
+            end_time=end_time,
+            room_id=first["room_id"],
+            room_name=rooms[first["room_id"]]["name"],
+            staff_id=first["staff_id"],
+            staff_name=staffs[first["staff_id"]]
+        )
+    )
+
 def _handle_not_start_time(
     rooms: dict,
-    orders: dict,
-    staffs: dict,
+    availability: DayAvailability,
     k: int = 1
 ) -> str:
     response = ""
     for r_id, value in rooms.items():
         response += f"Room: {value["name"]} (capacity={value['capacity']}):\n"
-        slots = free_slots_with_staff(
-            orders=orders,
+        slots = availability.free_slots_with_staff(
             room_id=r_id,
             room_capacity=value["capacity"],
-            staffs=staffs,
             k=k
         )
         for slot in slots:
@@ -68,29 +196,20 @@ def _handle_not_start_time(
 def _check_available_with_end_time(
     start_time_new: str,
     end_time_new: str,
-    orders: dict,
     rooms: dict,
-    staffs: dict,
+    availability: DayAvailability,
     k: int = 1
 ) -> dict:
-    all_slots = {}
-    for r_id, value in rooms.items():
-        slots = free_slots_with_staff(
-            orders=orders,
-            room_id=r_id,
-            room_capacity=value["capacity"],
-            staffs=staffs,
-            k=k
-        )
-        all_slots[r_id] = slots
-    
-    available = choose_room_and_staff(
-        free_dict=all_slots,
-        s_req=start_time_new,
-        e_req=end_time_new
+    # Phòng/nhân viên được chọn theo PLACEMENT_POLICY (xem core.utils.placement)
+    available = place_booking(
+        availability=availability,
+        rooms=rooms,
+        start_min=time_to_minutes(parse_time(start_time_new)),
+        end_min=time_to_minutes(parse_time(end_time_new)),
+        k=k
     )
     
-    return available
+    return available or {"room_id": None, "staff_id": None}
 
 @tool
 def resolve_weekday_to_date_tool(
@@ -204,19 +323,18 @@ def check_available_booking_tool(
                 )
             )
         
-        staffs = staff_repo.get_all_staff_return_dict()
-        rooms = room_repo.get_all_rooms_return_dict()
-        orders = appointment_repo.get_appointment_by_booking_date(
-            booking_date=booking_date_new
+        day = availability_cache.get_or_load(
+            booking_date=booking_date_new,
+            loader=lambda: _load_day_schedule(booking_date=booking_date_new)
         )
+        rooms, staffs = day.rooms, day.staffs
     
         if not start_time_new:
             logger.info("Khách không cung cấp thời gian cụ thể")
 
             response = _handle_not_start_time(
                 rooms=rooms,
-                orders=orders,
-                staffs=staffs,
+                availability=day.availability,
                 k=k
             )
 
@@ -250,13 +368,23 @@ def check_available_booking_tool(
         
         end_time_new = time_to_str(dt_end)
         logger.info(f"Thời gian kết thúc: {end_time_new}")
+        
+        if k > 1:
+            return _handle_group_booking(
+                booking_date=booking_date_new,
+                start_time=start_time_new,
+                end_time=end_time_new,
+                duration=int((dt_end - dt_start).total_seconds() // 60),
+                day=day,
+                k=k,
+                tool_call_id=tool_call_id
+            )
 
         available = _check_available_with_end_time(
             start_time_new=start_time_new,
             end_time_new=end_time_new,
-            orders=orders,
             rooms=rooms,
-            staffs=staffs,
+            availability=day.availability,
             k=k
         )
 
@@ -264,6 +392,16 @@ def check_available_booking_tool(
             logger.info(
                 "Không có phòng trống hoặc nhân viên khả dụng"
             )
+            return Command(
+                update=build_update(
+                    content=(
+                        f"Không còn phòng hoặc nhân viên trống từ {start_time_new} đến {end_time_new}, "
+                        "dùng `find_available_slots_tool` để gợi ý giờ khác cho khách"
+                    ),
+                    tool_call_id=tool_call_id,
+                    booking_date=booking_date_new
+                )
+            )
         
         room_id = available["room_id"]
         staff_id = available["staff_id"]
@@ -293,6 +431,127 @@ def check_available_booking_tool(
         logger.error(f"Chi tiết lỗi: \n{error_details}")
         raise
     
+@tool
+def find_available_slots_tool(
+    date_from: Annotated[str | None, "Ngày đầu tiên của khoảng ngày cần tìm"],
+    date_to: Annotated[str | None, "Ngày cuối cùng của khoảng ngày cần tìm"],
+    total_time: Annotated[int | None, "Tổng thời gian (phút) khách muốn đặt lịch"],
+    k: Annotated[int, "Số lượng khách muốn đặt"],
+    preferred_time: Annotated[str | None, "Giờ khách mong muốn"],
+    top_n: Annotated[int, "Số lựa chọn trả về cho khách"],
+    state: Annotated[AgentState, InjectedState],
+    tool_call_id: Annotated[str, InjectedToolCallId]
+):
+    """
+    Sử dụng tool này để tìm các lịch trống gần nhất trong một khoảng nhiều ngày (tối đa 30 ngày) chỉ với một lần gọi,
+    khi giờ khách muốn đã kín, khi khách hỏi lịch trống sớm nhất, hoặc khi khách đưa ra nhiều ngày / một khoảng ngày.
+    
+    Parameters:
+        - date_from (str | None): 
+            - Ngày bắt đầu tìm, bắt buộc có định dạng "%Y-%m-%d".
+            - Nếu None thì tìm từ hôm nay.
+        - date_to (str | None): 
+            - Ngày cuối cùng tìm, bắt buộc có định dạng "%Y-%m-%d".
+            - Nếu None thì tìm 7 ngày kể từ date_from.
+        - total_time (int | None): Tổng thời gian (phút) khách muốn đặt lịch, None thì lấy `total_time` trong state.
+        - k (int): Số lượng khách muốn đặt, nếu khách không đề cập thì mặc định là 1
+        - preferred_time (str | None): 
+            - Giờ khách mong muốn, bắt buộc có định dạng "%H:%M:%S". 
+            - Nếu có, ưu tiên các lịch gần giờ này nhất; nếu None, ưu tiên lịch sớm nhất.
+        - top_n (int): Số lựa chọn trả về, mặc định là 5
+    """
+    logger.info("find_available_slots_tool được gọi")
+    
+    try:
+        today = date.today()
+        start_date = max(parese_date(date_from), today) if date_from else today
+        end_date = parese_date(date_to) if date_to else start_date + timedelta(days=6)
+        end_date = min(end_date, start_date + timedelta(days=SLOT_SEARCH_MAX_DAYS - 1))
+        
+        if end_date < start_date:
+            logger.info(f"Khoảng ngày không hợp lệ: {date_from} -> {date_to}")
+            return Command(
+                update=build_update(
+                    content=(
+                        "Khoảng ngày không hợp lệ (ngày kết thúc trước ngày bắt đầu hoặc đã qua), hỏi lại khách"
+                    ),
+                    tool_call_id=tool_call_id
+                )
+            )
+        
+        duration = total_time or state["total_time"] or 60
+        preferred_min = time_to_minutes(parse_time(preferred_time)) if preferred_time else None
+        dates = [
+            (start_date + timedelta(days=offset)).isoformat()
+            for offset in range((end_date - start_date).days + 1)
+        ]
+        logger.info(
+            f"Tìm lịch trống từ {dates[0]} đến {dates[-1]} | "
+            f"duration: {duration} | k: {k} | preferred_time: {preferred_time}"
+        )
+        
+        schedules = _load_day_schedules(dates=dates)
+        now = datetime.now()
+        options_by_date = {
+            booking_date: bookable_starts(
+                availability=day.availability,
+                rooms=day.rooms or {},
+                duration=duration,
+                k=k,
+                # Hôm nay chỉ gợi ý các giờ chưa qua
+                not_before=now.hour * 60 + now.minute if booking_date == today.isoformat() else None
+            )
+            for booking_date, day in schedules.items()
+        }
+        options = rank_slot_options(
+            options_by_date=options_by_date,
+            top_n=top_n,
+            preferred_min=preferred_min
+        )
+        
+        if not options:
+            logger.info("Không tìm thấy lịch trống trong khoảng ngày")
+            return Command(
+                update=build_update(
+                    content=(
+                        f"Không còn lịch trống nào từ {dates[0]} đến {dates[-1]} "
+                        f"cho {duration} phút, {k} khách. Hỏi khách chọn khoảng ngày khác"
+                    ),
+                    tool_call_id=tool_call_id
+                )
+            )
+        
+        response = f"Các lịch trống ({duration} phút, {k} khách):\n"
+        for option in options:
+            day = schedules[option["booking_date"]]
+            weekday = parese_date(option["booking_date"]).strftime("%A")
+            response += f"- {option['booking_date']} ({weekday}) {_format_time_range(option)}"
+            # Nhóm: chỉ báo giờ, phòng/nhân viên từng khách chưa được giữ
+            if k == 1:
+                response += (
+                    f" | Room: {day.rooms[option['room_id']]['name']} | "
+                    f"Staff: {day.staffs[option['staff_id']]}"
+                )
+            response += "\n"
+        response += (
+            "Đưa các lựa chọn này cho khách. Khi khách chọn, gọi `check_available_booking_tool` "
+            "với ngày và giờ đó để giữ lịch"
+        )
+        
+        logger.info(f"Tìm thấy {len(options)} lựa chọn lịch trống")
+        
+        return Command(
+            update=build_update(
+                content=response,
+                tool_call_id=tool_call_id
+            )
+        )
+    except Exception as e:
+        error_details = traceback.format_exc()
+        logger.error(f"Exception: {e}")
+        logger.error(f"Chi tiết lỗi: \n{error_details}")
+        raise
+    
 @tool
 def create_appointment_tool(
     note: Annotated[str, "Ghi chú của khách cho lịch hẹn"],
@@ -446,4 +705,9 @@ def create_appointment_tool(
         error_details = traceback.format_exc()
         logger.error(f"Exception: {e}")
         logger.error(f"Chi tiết lỗi: \n{error_details}")
-        raise
\ No newline at end of file
+        raise
+
+add_async_variant(resolve_weekday_to_date_tool)
+add_async_variant(check_available_booking_tool)
+add_async_variant(find_available_slots_tool)
+add_async_variant(create_appointment_tool)
@@ -6,7 +6,7 @@ from langgraph.prebuilt import InjectedState
 from langchain_core.tools import tool, InjectedToolCallId
 
 from core.graph.state import AgentState
-from core.utils.function import build_update
+from core.utils.function import add_async_variant, build_update
 from repository.sync_repo import CustomerRepo
 from database.connection import supabase_client
 
@@ -108,4 +108,6 @@ def modify_customer_tool(
         error_details = traceback.format_exc()
         logger.error(f"Exception: {e}")
         logger.error(f"Chi tiết lỗi: \n{error_details}")
-        raise
\ No newline at end of file
+        raise
+
+add_async_variant(modify_customer_tool)
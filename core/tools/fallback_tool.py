@@ -4,7 +4,6 @@ import traceback
 from dotenv import load_dotenv
 from typing import Annotated, Literal
 
-from telegram import Bot, constants
 from langgraph.types import Command
 from langgraph.prebuilt import InjectedState
 from langchain_core.tools import tool, InjectedToolCallId
@@ -15,12 +14,14 @@ from repository.sync_repo import CustomerRepo
 from database.connection import supabase_client
 from repository.sync_repo import AppointmentRepo
 from core.utils.function import (
+    add_async_variant,
     build_update, 
     return_appointments,
     update_book_info
 )
 
-from google_connection.sheet_logger import SheetLogger
+from database.client_provider import ClientProvider
+from google_connection.sheet_logger import sheet_logger_provider
 from log.logger_config import setup_logging
 
 load_dotenv()
@@ -33,18 +34,25 @@ WORKSHEET_NAME = os.getenv("WORKSHEET_NAME")
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
 ADMIN_CHAT_ID = os.getenv("ADMIN_CHAT_ID")
 
-sheet_logger = SheetLogger()
-bot = Bot(token=TELEGRAM_TOKEN)
 customer_repo = CustomerRepo(supabase_client=supabase_client)
 
 
 
 
+def _create_bot():
+    from telegram import Bot
+
+    return Bot(token=TELEGRAM_TOKEN)
+
+bot_provider = ClientProvider(_create_bot, name="telegram_bot")
+
 async def _send_message_tele(chat_id: str, text: str):
+    from telegram import constants
+
     logger.info(f"Sending message to chat_id {chat_id}: {text}")
     
     try:
-        return await bot.send_message(
+        return await bot_provider.get().send_message(
             chat_id=chat_id, 
             text=text, 
             parse_mode=constants.ParseMode.MARKDOWN
@@ -70,6 +78,117 @@ def _get_chat_histories(chat_histories: list) -> list:
     
     return formatted_histories
 
+def _check_customer_contact(
+    state: AgentState,
+    tool_call_id: str
+) -> Command | None:
+    if not state["name"]:
+        logger.info("Cant find customer name")
+        return Command(
+            update=build_update(
+                content=(
+                    "Chưa có tên khách, hỏi khách"
+                ),
+                tool_call_id=tool_call_id
+            )
+        )
+    
+    if not state["phone"]:
+        logger.info("Cant find customer phone")
+        return Command(
+            update=build_update(
+                content=(
+                    "Chưa có số điện thoại khách, hỏi khách"
+                ),
+                tool_call_id=tool_call_id
+            )
+        )
+    
+    return None
+
+def _save_complaint(
+    summary: str,
+    type: str | None,
+    priority: str,
+    appointment_id: int | None,
+    state: AgentState
+) -> dict | None:
+    sheet_logger_provider.get().log(
+        customer_id=state["customer_id"],
+        chat_id=state["chat_id"],
+        customer_name=state["name"],
+        customer_phone=state["phone"],
+        chat_histories=_get_chat_histories(state["messages"][-5:]),
+        summary=summary,
+        type=type,
+        appointment_id=appointment_id,
+        priority=priority,
+        platform="telegram"
+    )
+    
+    logger.info("Send to google sheet successfully")
+    
+    return customer_repo.add_complaints(
+        complaint_payload={
+            "customer_id": state["customer_id"],
+            "chat_id": state["chat_id"],
+            "customer_name": state["name"],
+            "customer_phone": state["phone"],
+            "chat_histories": _get_chat_histories(state["messages"]),
+            "summary": summary,
+            "type": type,
+            "appointment_id": appointment_id,
+            "priority": priority,
+            "platform": "telegram"
+        }
+    )
+
+def _build_tele_content(
+    summary: str,
+    type: str | None,
+    priority: str,
+    appointment_id: int | None,
+    state: AgentState
+) -> str:
+    tele_type = type if type else "Không xác định"
+    tele_type = tele_type.replace("_", " ").title()
+    
+    return (
+        f"ID khách hàng: {state['customer_id']}\n"
+        f"Tên khách hàng: {state['name']}\n"
+        f"Số điện thoại: {state['phone']}\n\n"
+        
+        f"Tóm tắt khiếu nại:\n{summary}\n\n"
+        
+        f"Loại khiếu nại: {tele_type}\n"
+        f"ID đơn đặt lịch liên quan: {appointment_id if appointment_id else 'Không có'}\n"
+        f"Mức độ ưu tiên: {priority}\n"
+    )
+
+def _complaint_failed(tool_call_id: str) -> Command:
+    logger.error("Lỗi ở cấp DB -> Không thể cập nhật khiếu nại")
+    return Command(
+        update=build_update(
+            content=(
+                "Có lỗi trong quá trình gửi khiếu nại, xin lỗi khách"
+            ),
+            tool_call_id=tool_call_id
+        )
+    )
+
+def _complaint_sent(tool_call_id: str) -> Command:
+    logger.info("Send to telegram successfully")
+    
+    logger.info("Send to supabase successfully")
+    logger.info("Send complaint successfully")
+    
+    return Command(
+        update=build_update(
+            content="Khiếu nại đã được gửi đi, thông báo cho khách",
+            tool_call_id=tool_call_id
+        )
+    )
+
 @tool
 def send_fallback_tool(
     summary: Annotated[str, "Tóm tắt nội dung yêu cầu của khách"],
@@ -105,103 +224,82 @@ def send_fallback_tool(
 
     Returns: Command: Updates chatbot to confirm complaint submission.
     """
-    if not state["name"]:
-        logger.info("Cant find customer name")
-        return Command(
-            update=build_update(
-                content=(
-                    "Chưa có tên khách, hỏi khách"
-                ),
-                tool_call_id=tool_call_id
-            )
-        )
-    
-    if not state["phone"]:
-        logger.info("Cant find customer phone")
-        return Command(
-            update=build_update(
-                content=(
-                    "Chưa có số điện thoại khách, hỏi khách"
-                ),
-                tool_call_id=tool_call_id
-            )
-        )    
+    missing_contact = _check_customer_contact(state=state, tool_call_id=tool_call_id)
+    if missing_contact:
+        return missing_contact
 
     try:
         logger.info("send_complaint_tool được gọi")
-        sheet_logger.log(
-            customer_id=state["customer_id"],
-            chat_id=state["chat_id"],
-            customer_name=state["name"],
-            customer_phone=state["phone"],
-            chat_histories=_get_chat_histories(state["messages"][-5:]),
+        response = _save_complaint(
             summary=summary,
             type=type,
-            appointment_id=appointment_id,
             priority=priority,
-            platform="telegram"
-        )
-        
-        logger.info("Send to google sheet successfully")
-        
-        response = customer_repo.add_complaints(
-            complaint_payload={
-                "customer_id": state["customer_id"],
-                "chat_id": state["chat_id"],
-                "customer_name": state["name"],
-                "customer_phone": state["phone"],
-                "chat_histories": _get_chat_histories(state["messages"]),
-                "summary": summary,
-                "type": type,
-                "appointment_id": appointment_id,
-                "priority": priority,
-                "platform": "telegram"
-            }
-        )
-        
-        tele_type = type if type else "Không xác định"
-        tele_type = tele_type.replace("_", " ").title()
-        
-        tele_content = (
-            f"ID khách hàng: {state['customer_id']}\n"
-            f"Tên khách hàng: {state['name']}\n"
-            f"Số điện thoại: {state['phone']}\n\n"
-            
-            f"Tóm tắt khiếu nại:\n{summary}\n\n"
-            
-            f"Loại khiếu nại: {tele_type}\n"
-            f"ID đơn đặt lịch liên quan: {appointment_id if appointment_id else 'Không có'}\n"
-            f"Mức độ ưu tiên: {priority}\n"
+            appointment_id=appointment_id,
+            state=state
         )
         
         if not response:
-            logger.error("Lỗi ở cấp DB -> Không thể cập nhật khiếu nại")
-            return Command(
-                update=build_update(
-                    content=(
-                        "Có lỗi trong quá trình gửi khiếu nại, xin lỗi khách"
-                    ),
-                    tool_call_id=tool_call_id
-                )
-            )
+            return _complaint_failed(tool_call_id=tool_call_id)
             
         asyncio.run(_send_message_tele(
             chat_id=ADMIN_CHAT_ID,
-            text=tele_content
+            text=_build_tele_content(
+                summary=summary,
+                type=type,
+                priority=priority,
+                appointment_id=appointment_id,
+                state=state
+            )
         ))
         
-        logger.info("Send to telegram successfully")
+        return _complaint_sent(tool_call_id=tool_call_id)
+        
+    except Exception as e:
+        error_details = traceback.format_exc()
+        logger.error(f"Exception: {e}")
+        logger.error(f"Chi tiết lỗi: \n{error_details}")
+        raise
+
+async def _asend_fallback_tool(
+    summary: str,
+    type: str | None,
+    priority: str,
+    appointment_id: int | None,
+    state: AgentState,
+    tool_call_id: str
+) -> Command:
+    missing_contact = _check_customer_contact(state=state, tool_call_id=tool_call_id)
+    if missing_contact:
+        return missing_contact
+
+    try:
+        logger.info("send_complaint_tool (async) được gọi")
+        response = await asyncio.to_thread(
+            _save_complaint,
+            summary=summary,
+            type=type,
+            priority=priority,
+            appointment_id=appointment_id,
+            state=state
+        )
         
-        logger.info("Send to supabase successfully")
-        logger.info("Send complaint successfully")
+        if not response:
+            return _complaint_failed(tool_call_id=tool_call_id)
         
-        return Command(
-            update=build_update(
-                content="Khiếu nại đã được gửi đi, thông báo cho khách",
-                tool_call_id=tool_call_id
+        # Gửi Telegram trên chính event loop thay vì asyncio.run trong thread
+        await _send_message_tele(
+            chat_id=ADMIN_CHAT_ID,
+            text=_build_tele_content(
+                summary=summary,
+                type=type,
+                priority=priority,
+                appointment_id=appointment_id,
+                state=state
             )
         )
         
+        return _complaint_sent(tool_call_id=tool_call_id)
+        
     except Exception as e:
         error_details = traceback.format_exc()
         logger.error(f"Exception: {e}")
@@ -278,4 +376,7 @@ def get_all_booking_tool(
         error_details = traceback.format_exc()
         logger.error(f"Exception: {e}")
         logger.error(f"Chi tiết lỗi: \n{error_details}")
-        raise
\ No newline at end of file
+        raise
+
+add_async_variant(send_fallback_tool, _asend_fallback_tool)
+add_async_variant(get_all_booking_tool)
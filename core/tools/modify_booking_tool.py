@@ -10,6 +10,7 @@ from core.graph.state import AgentState
 from database.connection import supabase_client
 from repository.sync_repo import AppointmentRepo, RoomRepo, StaffRepo
 from core.utils.function import (
+    add_async_variant,
     build_update, 
     return_appointments,
     update_book_info
@@ -376,4 +377,9 @@ def edit_services_booking_tool(
         error_details = traceback.format_exc()
         logger.error(f"Exception: {e}")
         logger.error(f"Chi tiết lỗi: \n{error_details}")
-        raise
\ No newline at end of file
+        raise
+
+add_async_variant(cancel_booking_tool)
+add_async_variant(get_all_editable_booking)
+add_async_variant(edit_time_booking_tool)
+add_async_variant(edit_services_booking_tool)
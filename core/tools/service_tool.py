@@ -5,7 +5,7 @@ from langgraph.types import Command
 from langgraph.prebuilt import InjectedState
 from langchain_core.tools import tool, InjectedToolCallId
 
-from core.utils.function import build_update, cal_discount
+from core.utils.function import add_async_variant, build_update, cal_discount
 from core.graph.state import AgentState, BookInfo, Customer, Services, Staff
 
 from log.logger_config import setup_logging
@@ -249,4 +249,7 @@ def remove_service_tool(
         error_details = traceback.format_exc()
         logger.error(f"Exception: {e}")
         logger.error(f"Chi tiết lỗi: \n{error_details}")
-        raise
\ No newline at end of file
+        raise
+
+add_async_variant(add_service_tool)
+add_async_variant(remove_service_tool)
@@ -1,3 +1,4 @@
+import asyncio
 import traceback
 from shutil import ExecError
 from pydantic import BaseModel, Field
@@ -7,7 +8,7 @@ from langgraph.types import Command
 from langgraph.prebuilt import InjectedState
 from langchain_core.tools import tool, InjectedToolCallId
 
-from core.utils.function import build_update
+from core.utils.function import add_async_variant, build_update
 from repository.sync_repo import ServiceRepo
 from core.graph.state import AgentState, Services
 from database.connection import supabase_client, embeddings_model
@@ -88,6 +89,53 @@ def _update_seen_services(
         )
     return seen_services
 
+def _build_services_command(
+    services: List[dict],
+    header: str,
+    state: AgentState,
+    tool_call_id: str
+) -> Command:
+    updated_seen_services = _update_seen_services(
+        seen_services=state["seen_services"] if state["seen_services"] is not None else {},
+        services=services
+    )
+    
+    formatted_response = (
+        f"{header}"
+        f"{services}\n"
+    )
+    
+    return Command(
+        update=build_update(
+            content=formatted_response,
+            tool_call_id=tool_call_id,
+            seen_services=updated_seen_services
+        )
+    )
+
+def _build_qna_command(qnas: list[dict] | None, tool_call_id: str) -> Command:
+    if not qnas:
+        logger.error("No Q&A documents found from RAG")
+        return Command(
+            update=build_update(
+                content="Sorry customer, an error occurred while searching for instructions.",
+                tool_call_id=tool_call_id
+            )
+        ) 
+    
+    logger.info(f"qna: {qnas}")
+    
+    logger.info(f"Found {len(qnas)} Q&A documents")
+    return Command(
+        update=build_update(
+            content=(
+                "Here is the information found related to the customer's question: \n"
+                f"{qnas}"
+            ),
+            tool_call_id=tool_call_id
+        )
+    )
+
 @tool
 def get_services_tool(
     keyword: Annotated[str, "Only accept Vietnamese - The keyword provided by the customer that refers to a specific service"],
@@ -117,24 +165,12 @@ def get_services_tool(
 
         if db_result:
             logger.info("Data returned from SQL")
-            
-            updated_seen_services = _update_seen_services(
-                seen_services=state["seen_services"] if state["seen_services"] is not None else {},
-                services=db_result
-            )
-            
-            formatted_response = (
-                "Here are the services found based on the customer's request:\n"
-                f"{db_result}\n"
-            )
-            
             logger.info("Returning results from SQL")
-            return Command(
-                update=build_update(
-                    content=formatted_response,
-                    tool_call_id=tool_call_id,
-                    seen_services=updated_seen_services
-                )
+            return _build_services_command(
+                services=db_result,
+                header="Here are the services found based on the customer's request:\n",
+                state=state,
+                tool_call_id=tool_call_id
             )
             
         logger.info("No results from SQL, switching to RAG search")
@@ -156,24 +192,69 @@ def get_services_tool(
             ))
 
         logger.info("Results returned from RAG")
+        logger.info("Returning results from RAG")
+        return _build_services_command(
+            services=services,
+            header="Here are the services returned based on the customer's request:\n\n",
+            state=state,
+            tool_call_id=tool_call_id
+        )
+
+    except Exception as e:
+        error_details = traceback.format_exc()
+        logger.error(f"Exception: {e}")
+        logger.error(f"Chi tiết lỗi: \n{error_details}")
+        raise
 
-        updated_seen_services = _update_seen_services(
-            seen_services=state["seen_services"] if state["seen_services"] is not None else {},
-            services=services
+async def _aget_services_tool(
+    keyword: str,
+    state: AgentState,
+    tool_call_id: str
+) -> Command:
+    logger.info(f"get_services_tool (async) called with keyword: {keyword}")
+    # --- SQL First Approach ---
+    try:
+        db_result = await asyncio.to_thread(
+            service_repo.get_service_by_keyword,
+            keyword=keyword
         )
+
+        if db_result:
+            logger.info("Data returned from SQL")
+            logger.info("Returning results from SQL")
+            return _build_services_command(
+                services=db_result,
+                header="Here are the services found based on the customer's request:\n",
+                state=state,
+                tool_call_id=tool_call_id
+            )
+            
+        logger.info("No results from SQL, switching to RAG search")
         
-        formatted_response = (
-            "Here are the services returned based on the customer's request:\n\n"
-            f"{services}\n"
+        query_embedding = await embeddings_model.aembed_query(state["user_input"])
+        
+        services = await asyncio.to_thread(
+            _get_services_and_discount_by_embedding,
+            query_embedding=query_embedding,
+            match_count=5
         )
         
+        logger.info(f"RAG results: {services}")
+        
+        if not services:
+            logger.info("No results from RAG")
+            return Command(update=build_update(
+                content="Apologies to the customer, couldn't find the service you're looking for.",
+                tool_call_id=tool_call_id
+            ))
+
+        logger.info("Results returned from RAG")
         logger.info("Returning results from RAG")
-        return Command(
-            update=build_update(
-                content=formatted_response,
-                tool_call_id=tool_call_id,
-                seen_services=updated_seen_services
-            )
+        return _build_services_command(
+            services=services,
+            header="Here are the services returned based on the customer's request:\n\n",
+            state=state,
+            tool_call_id=tool_call_id
         )
 
     except Exception as e:
@@ -206,30 +287,37 @@ def get_qna_tool(
             match_count=3
         )
 
-        if not qnas:
-            logger.error("No Q&A documents found from RAG")
-            return Command(
-                update=build_update(
-                    content="Sorry customer, an error occurred while searching for instructions.",
-                    tool_call_id=tool_call_id
-                )
-            ) 
-        
-        logger.info(f"qna: {qnas}")
+        return _build_qna_command(qnas=qnas, tool_call_id=tool_call_id)
+             
+    except Exception as e:
+        error_details = traceback.format_exc()
+        logger.error(f"Exception: {e}")
+        logger.error(f"Chi tiết lỗi: \n{error_details}")
+        raise
+
+async def _aget_qna_tool(
+    state: AgentState,
+    tool_call_id: str
+) -> Command:
+    query = state["user_input"]
+    logger.info(f"get_qna_tool (async) called with query: {query}")
+    
+    try:
+        query_embedding = await embeddings_model.aembed_query(query)
         
-        logger.info(f"Found {len(qnas)} Q&A documents")
-        return Command(
-            update=build_update(
-                content=(
-                    "Here is the information found related to the customer's question: \n"
-                    f"{qnas}"
-                ),
-                tool_call_id=tool_call_id
-            )
+        qnas = await asyncio.to_thread(
+            _get_qna_by_embedding,
+            query_embedding=query_embedding,
+            match_count=3
         )
+
+        return _build_qna_command(qnas=qnas, tool_call_id=tool_call_id)
              
     except Exception as e:
         error_details = traceback.format_exc()
         logger.error(f"Exception: {e}")
         logger.error(f"Chi tiết lỗi: \n{error_details}")
         raise
+
+add_async_variant(get_services_tool, _aget_services_tool)
+add_async_variant(get_qna_tool, _aget_qna_tool)
@@ -0,0 +1,256 @@
+import os
+import numpy as np
+from datetime import datetime
+from numpy.lib.stride_tricks import sliding_window_view
+
+from core.utils.function import OPEN_TIME_STR, CLOSE_TIME_STR
+
+MINUTES_PER_DAY = 24 * 60
+# Bước của các giờ bắt đầu gợi ý cho khách (phút)
+SLOT_STEP_MINUTES = int(os.getenv("SLOT_STEP_MINUTES", "15"))
+# Số ngày tối đa một lần tìm lịch trống nhiều ngày
+SLOT_SEARCH_MAX_DAYS = int(os.getenv("SLOT_SEARCH_MAX_DAYS", "30"))
+
+
+def _to_minutes(time_str: str) -> int:
+    t = datetime.strptime(time_str, "%H:%M:%S")
+    return t.hour * 60 + t.minute
+
+
+def _to_time_str(minutes: int) -> str:
+    return f"{minutes // 60:02d}:{minutes % 60:02d}:00"
+
+
+class DayAvailability:
+    """
+    Index lịch trống của một ngày, dựng một lần từ các lịch hẹn của ngày đó
+    (`AppointmentRepo.get_appointment_by_booking_date`), độ phân giải 1 phút:
+
+    - Mỗi phòng: số lịch đang chiếm phòng tại từng phút (mảng NumPy 1440 phần tử).
+    - Mỗi nhân viên: bitmap phút bận, lưu dạng prefix sum để hỏi "có bận trong
+      [s, e) không" bằng một phép trừ.
+
+    `free_slots_with_staff` trả kết quả giống hệt `core.utils.function.free_slots_with_staff`
+    (kể cả dữ liệu lạ: lịch có start >= end, lịch nằm ngoài giờ mở cửa) nhưng không
+    parse lại giờ và không lọc lại `orders` cho từng phòng/khoảng/nhân viên.
+    Kiểm chứng bằng `python -m core.utils.check_availability`.
+    """
+    def __init__(
+        self,
+        orders: list[dict] | None,
+        staffs: dict | None,
+        open_time_str: str = OPEN_TIME_STR,
+        close_time_str: str = CLOSE_TIME_STR
+    ):
+        self.orders = orders
+        self.staffs = staffs
+        self.open_time_str = open_time_str
+        self.close_time_str = close_time_str
+        self.open_min = _to_minutes(open_time_str)
+        self.close_min = _to_minutes(close_time_str)
+
+        self._staff_ids = list((staffs or {}).keys())
+        staff_row = {staff_id: row for row, staff_id in enumerate(self._staff_ids)}
+
+        room_diff: dict[int, np.ndarray] = {}
+        room_times: dict[int, list[int]] = {}
+        staff_diff = np.zeros((len(self._staff_ids), MINUTES_PER_DAY + 1), dtype=np.int32)
+        staff_orders: list[tuple[int, int, int]] = []
+
+        for order in orders or []:
+            st = _to_minutes(order["start_time"])
+            et = _to_minutes(order["end_time"])
+
+            diff = room_diff.get(order["room_id"])
+            if diff is None:
+                diff = room_diff[order["room_id"]] = np.zeros(MINUTES_PER_DAY + 1, dtype=np.int32)
+                room_times[order["room_id"]] = []
+            diff[st] += 1
+            diff[et] -= 1
+            room_times[order["room_id"]] += (st, et)
+
+            row = staff_row.get(order["staff_id"])
+            if row is None:
+                continue
+            staff_orders.append((row, st, et))
+            if st < et:
+                staff_diff[row, st] += 1
+                staff_diff[row, et] -= 1
+
+        # occupancy[t] = số lịch bắt đầu <= t trừ số lịch kết thúc <= t, đúng như
+        # curr_active của vòng sweep trong hàm gốc
+        self._room_occupancy = {
+            room_id: np.cumsum(diff[:MINUTES_PER_DAY]) for room_id, diff in room_diff.items()
+        }
+        self._room_times = room_times
+        self._empty_occupancy = np.zeros(MINUTES_PER_DAY, dtype=np.int32)
+
+        busy = self._staff_busy = np.cumsum(staff_diff[:, :MINUTES_PER_DAY], axis=1) > 0
+        self._staff_busy_prefix = np.zeros((len(self._staff_ids), MINUTES_PER_DAY + 1), dtype=np.int32)
+        np.cumsum(busy, axis=1, out=self._staff_busy_prefix[:, 1:])
+
+        # Lịch có start >= end không chiếm phút nào nhưng vẫn "overlap" theo điều kiện
+        # o_st < e and o_et > s của hàm gốc -> giữ lại để kiểm tra trực tiếp
+        orders_array = np.array(staff_orders, dtype=np.int32).reshape(-1, 3)
+        self._staff_orders = orders_array
+        self._degenerate_staff = orders_array[orders_array[:, 1] >= orders_array[:, 2]]
+
+    # -----------------------------------------------------------------------------
+    # Phòng
+    # -----------------------------------------------------------------------------
+
+    def room_occupancy(self, room_id: int) -> np.ndarray:
+        """Số lịch đang chiếm phòng tại từng phút trong ngày (index = phút)."""
+        return self._room_occupancy.get(room_id, self._empty_occupancy)
+
+    def room_free_capacity(self, room_id: int, room_capacity: int) -> np.ndarray:
+        return room_capacity - self.room_occupancy(room_id)
+
+    def room_peak_occupancy(self, room_id: int, starts: np.ndarray, duration: int) -> np.ndarray:
+        """Số lịch chiếm phòng lúc đông nhất trong [start, start + duration) của từng giờ bắt đầu."""
+        return sliding_window_view(self.room_occupancy(room_id), duration)[starts].max(axis=1)
+
+    def room_free_run(self, room_id: int, room_capacity: int, k: int, start_min: int, end_min: int) -> tuple[int, int]:
+        """Khoảng liên tục quanh [start_min, end_min) mà phòng còn >= k chỗ (trong giờ mở cửa)."""
+        return self._free_run(self.room_free_capacity(room_id, room_capacity) >= k, start_min, end_min)
+
+    def _free_run(self, free: np.ndarray, start_min: int, end_min: int) -> tuple[int, int]:
+        before = np.flatnonzero(~free[self.open_min:start_min])
+        after = np.flatnonzero(~free[end_min:self.close_min])
+        return (
+            self.open_min + int(before[-1]) + 1 if len(before) else self.open_min,
+            end_min + int(after[0]) if len(after) else self.close_min
+        )
+
+    def _segments(self, room_id: int) -> tuple[np.ndarray, np.ndarray]:
+        """Các khoảng giữa hai mốc liên tiếp (giờ mở/đóng cửa, giờ bắt đầu/kết thúc lịch của phòng)."""
+        bounds = np.unique(np.array(
+            [self.open_min, self.close_min, *self._room_times.get(room_id, ())],
+            dtype=np.int32
+        ))
+        return bounds[:-1], bounds[1:]
+
+    # -----------------------------------------------------------------------------
+    # Nhân viên
+    # -----------------------------------------------------------------------------
+
+    @property
+    def staff_ids(self) -> list:
+        """Id nhân viên theo thứ tự hàng của `free_staff_mask`."""
+        return self._staff_ids
+
+    def free_staff_mask(self, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+        """
+        Returns:
+            np.ndarray: bool (số nhân viên × số khoảng), True nếu nhân viên không có
+                lịch nào overlap khoảng [starts[j], ends[j]).
+        """
+        starts, ends = np.asarray(starts), np.asarray(ends)
+        if len(starts) and (starts >= ends).any():
+            # Khoảng rỗng/ngược: bitmap không trả lời được, xét trực tiếp mọi lịch
+            return ~self._overlap_any(self._staff_orders, starts, ends)
+
+        busy_minutes = self._staff_busy_prefix[:, ends] - self._staff_busy_prefix[:, starts]
+        mask = busy_minutes == 0
+        if len(self._degenerate_staff):
+            mask &= ~self._overlap_any(self._degenerate_staff, starts, ends)
+        return mask
+
+    def _overlap_any(self, staff_orders: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+        rows, st, et = staff_orders[:, 0], staff_orders[:, 1:2], staff_orders[:, 2:3]
+        overlap = (st < ends) & (et > starts)
+        busy = np.zeros((len(self._staff_ids), len(starts)), dtype=bool)
+        np.logical_or.at(busy, rows, overlap)
+        return busy
+
+    def staff_free_run(self, staff_row: int, start_min: int, end_min: int) -> tuple[int, int]:
+        """Khoảng rỗi liên tục của nhân viên (hàng `staff_row`) quanh [start_min, end_min)."""
+        return self._free_run(~self._staff_busy[staff_row], start_min, end_min)
+
+    def staff_busy_minutes(self) -> np.ndarray:
+        """Tổng số phút đã có lịch trong ngày của từng nhân viên."""
+        return self._staff_busy_prefix[:, -1]
+
+    def free_staffs(self, start_min: int, end_min: int) -> dict:
+        """Giống `staff_free_in_interval`: {staff_id: name} của nhân viên rỗi, giữ thứ tự `staffs`."""
+        mask = self.free_staff_mask(np.array([start_min]), np.array([end_min]))[:, 0]
+        return {
+            staff_id: self.staffs[staff_id]
+            for staff_id, free in zip(self._staff_ids, mask) if free
+        }
+
+    # -----------------------------------------------------------------------------
+    # Khung trống
+    # -----------------------------------------------------------------------------
+
+    def _free_segments(self, room_id: int, room_capacity: int, k: int) -> tuple[np.ndarray, ...]:
+        """
+        Returns:
+            tuple: (starts, ends, free_capacity, free_staff_mask) của các khoảng còn >= k chỗ.
+        """
+        if not self.orders:
+            # Ngày chưa có lịch: hàm gốc trả nguyên khung giờ mở cửa, không xét k
+            return (
+                np.array([self.open_min]),
+                np.array([self.close_min]),
+                np.array([room_capacity]),
+                np.ones((len(self._staff_ids), 1), dtype=bool)
+            )
+
+        starts, ends = self._segments(room_id)
+        free_capacity = room_capacity - self.room_occupancy(room_id)[starts]
+        keep = free_capacity >= k
+        starts, ends, free_capacity = starts[keep], ends[keep], free_capacity[keep]
+        return starts, ends, free_capacity, self.free_staff_mask(starts, ends)
+
+    def free_slots_with_staff(self, room_id: int, room_capacity: int, k: int) -> list:
+        """Các khoảng phòng còn >= k chỗ kèm nhân viên rỗi, như `free_slots_with_staff`."""
+        if not self.orders:
+            return [{
+                "start_time": self.open_time_str,
+                "end_time": self.close_time_str,
+                "free_capacity": room_capacity,
+                "free_staffs": self.staffs
+            }]
+
+        starts, ends, free_capacity, mask = self._free_segments(room_id, room_capacity, k)
+        if not len(starts):
+            return []
+
+        free_rows = [np.flatnonzero(mask[:, index]) for index in range(len(starts))]
+        return [
+            {
+                "start_time": _to_time_str(int(start)),
+                "end_time": _to_time_str(int(end)),
+                "free_capacity": int(capacity),
+                "free_staffs": {
+                    self._staff_ids[row]: self.staffs[self._staff_ids[row]] for row in rows
+                }
+            }
+            for start, end, capacity, rows in zip(starts, ends, free_capacity, free_rows)
+        ]
+
+
+def rank_slot_options(
+    options_by_date: dict[str, list[dict]],
+    top_n: int,
+    preferred_min: int | None = None,
+    per_day: int = 3
+) -> list[dict]:
+    """
+    Chọn `top_n` lựa chọn từ kết quả `bookable_starts` của nhiều ngày (mỗi ngày tối đa
+    `per_day` để khách có nhiều ngày để chọn): sớm nhất, hoặc gần `preferred_min` nhất
+    (cùng độ lệch thì ngày sớm hơn).
+
+    Returns:
+        list[dict]: các option kèm "booking_date".
+    """
+    ranked = []
+    for booking_date, options in sorted(options_by_date.items()):
+        if preferred_min is not None:
+            options = sorted(options, key=lambda option: (abs(option["start_min"] - preferred_min), option["start_min"]))
+        ranked += [{"booking_date": booking_date, **option} for option in options[:per_day]]
+
+    if preferred_min is not None:
+        ranked.sort(key=lambda option: (abs(option["start_min"] - preferred_min), option["booking_date"], option["start_min"]))
+    return ranked[:top_n]
@@ -0,0 +1,337 @@
+"""
+Kiểm tra tương đương (property-based, sinh dữ liệu ngẫu nhiên có seed) giữa
+`core.utils.availability.DayAvailability` và các hàm gốc trong `core.utils.function`:
+
+    - free_slots_with_staff: mọi phòng (kể cả phòng không có lịch), k ngẫu nhiên.
+    - free_staffs: so với staff_free_in_interval trên khoảng ngẫu nhiên.
+    - room_occupancy: so với đếm trực tiếp số lịch bắt đầu/kết thúc trước mỗi phút.
+    - bookable_starts / place_booking: giờ đặt được khi và chỉ khi vét cạn (đếm chỗ từng
+      phút, staff_free_in_interval; k > 1 như solve_group_booking) đặt được; phòng/nhân
+      viên chọn bởi mọi PLACEMENT_POLICIES hợp lệ, nhóm k > 1 có k nhân viên khác nhau.
+    - solve_group_booking: xếp được khi và chỉ khi vét cạn (đếm chỗ từng phút, thử mọi
+      cách chọn nhân viên) xếp được; kết quả hợp lệ (nhân viên khác nhau và rỗi, phòng đủ chỗ).
+
+Dữ liệu sinh ra gồm cả trường hợp lạ: lịch có start == end hoặc start > end, lịch
+ngoài giờ mở cửa, giờ có giây, staff_id không có trong danh sách nhân viên, ngày
+không có lịch. Case sai được rút gọn (bỏ bớt lịch) trước khi in ra.
+
+Chạy từ thư mục gốc của repo:
+    python -m core.utils.check_availability --cases 2000 --seed 0
+"""
+import time
+import random
+import argparse
+from itertools import permutations
+
+from core.utils.availability import DayAvailability
+from core.utils.group_booking import find_group_alternatives, solve_group_booking
+from core.utils.placement import PLACEMENT_POLICIES, bookable_starts, place_booking
+from core.utils.function import free_slots_with_staff, staff_free_in_interval
+
+
+def _time_str(rng: random.Random, low: int = 0, high: int = 24 * 60 - 1) -> str:
+    minutes = rng.randint(low, high)
+    return f"{minutes // 60:02d}:{minutes % 60:02d}:{rng.choice([0, 0, 0, rng.randint(0, 59)]):02d}"
+
+
+def random_day(rng: random.Random) -> dict:
+    n_rooms = rng.randint(1, 6)
+    rooms = {
+        room_id: {"name": f"Phòng {room_id}", "capacity": rng.randint(1, 4)}
+        for room_id in rng.sample(range(1, 20), n_rooms)
+    }
+    staffs = {staff_id: f"Nhân viên {staff_id}" for staff_id in rng.sample(range(1, 30), rng.randint(0, 8))}
+
+    open_min = rng.choice([8 * 60, 8 * 60, rng.randint(0, 12 * 60)])
+    close_min = rng.choice([21 * 60, 21 * 60, rng.randint(open_min, 24 * 60 - 1)])
+
+    orders = []
+    for order_id in range(rng.choice([0, rng.randint(1, 5), rng.randint(1, 40)])):
+        shape = rng.random()
+        if shape < 0.8:
+            start = rng.randint(open_min, max(open_min, close_min - 15))
+            end = min(start + rng.choice([15, 30, 45, 60, 90, 120]), 24 * 60 - 1)
+            start_str = f"{start // 60:02d}:{start % 60:02d}:00"
+            end_str = f"{end // 60:02d}:{end % 60:02d}:00"
+        else:
+            # start == end, start > end, ngoài giờ mở cửa, có giây
+            start_str, end_str = _time_str(rng), _time_str(rng)
+            if rng.random() < 0.3:
+                end_str = start_str
+        orders.append({
+            "id": order_id,
+            "staff_id": rng.choice([*staffs, None, 99]) if staffs else rng.choice([None, 99]),
+            "room_id": rng.choice([*rooms, 77]),
+            "start_time": start_str,
+            "end_time": end_str,
+        })
+
+    return {
+        "orders": orders or rng.choice([None, []]),
+        "rooms": rooms,
+        "staffs": staffs,
+        "open_time_str": f"{open_min // 60:02d}:{open_min % 60:02d}:00",
+        "close_time_str": f"{close_min // 60:02d}:{close_min % 60:02d}:00",
+    }
+
+
+def _minutes(time_str: str) -> int:
+    hour, minute, _ = time_str.split(":")
+    return int(hour) * 60 + int(minute)
+
+
+def find_mismatch(day: dict, rng: random.Random) -> str | None:
+    index = DayAvailability(
+        orders=day["orders"],
+        staffs=day["staffs"],
+        open_time_str=day["open_time_str"],
+        close_time_str=day["close_time_str"]
+    )
+
+    for room_id in [*day["rooms"], 77, 1000]:
+        capacity = day["rooms"].get(room_id, {"capacity": rng.randint(1, 4)})["capacity"]
+        for k in sorted({0, 1, rng.randint(1, capacity + 1)}):
+            expected = free_slots_with_staff(
+                orders=day["orders"],
+                room_id=room_id,
+                room_capacity=capacity,
+                staffs=day["staffs"],
+                k=k,
+                open_time_str=day["open_time_str"],
+                close_time_str=day["close_time_str"]
+            )
+            actual = index.free_slots_with_staff(room_id=room_id, room_capacity=capacity, k=k)
+            if actual != expected or [list(s["free_staffs"]) for s in actual] != [list(s["free_staffs"]) for s in expected]:
+                return f"free_slots_with_staff room={room_id} k={k}\nexpected={expected}\nactual=  {actual}"
+
+        occupancy = index.room_occupancy(room_id)
+        room_orders = [o for o in day["orders"] or [] if o["room_id"] == room_id]
+        for minute in rng.sample(range(24 * 60), 50):
+            expected = (
+                sum(_minutes(o["start_time"]) <= minute for o in room_orders)
+                - sum(_minutes(o["end_time"]) <= minute for o in room_orders)
+            )
+            if occupancy[minute] != expected:
+                return f"room_occupancy room={room_id} minute={minute}: expected={expected} actual={occupancy[minute]}"
+
+    for _ in range(20):
+        start = rng.randint(0, 24 * 60 - 1)
+        end = rng.randint(start, 24 * 60 - 1)
+        expected = staff_free_in_interval(
+            orders=day["orders"] or [],
+            interval_start_min=start,
+            interval_end_min=end,
+            staffs=day["staffs"]
+        )
+        actual = index.free_staffs(start, end)
+        if actual != expected or list(actual) != list(expected):
+            return f"free_staffs [{start}, {end})\nexpected={expected}\nactual=  {actual}"
+
+    duration, k, step = rng.choice([15, 30, 60, 90]), rng.randint(1, 3), rng.choice([5, 15, 30])
+    options = {
+        option["start_min"]: option
+        for option in bookable_starts(index, rooms=day["rooms"], duration=duration, k=k, step=step)
+    }
+    for start in range(index.open_min, index.close_min - duration + 1, step):
+        free_staffs = staff_free_in_interval(day["orders"] or [], start, start + duration, day["staffs"])
+        if k > 1:
+            feasible, free_capacity = _group_feasible(day, start, [duration] * k, allow_split=True)
+        else:
+            free_capacity = _room_free_capacity(day, start, start + duration)
+            feasible = any(free >= k for free in free_capacity.values()) and bool(free_staffs)
+        option = options.get(start)
+        label = f"bookable_starts start={start} duration={duration} k={k}"
+        if (option is not None) != feasible:
+            return f"{label}\nexpected feasible={feasible} free_capacity={free_capacity} free_staffs={free_staffs}\nactual=  {option}"
+        if option is None:
+            continue
+        if k > 1:
+            staff_ids = [assignment["staff_id"] for assignment in option["assignments"]]
+            if len(set(staff_ids)) != k or not set(staff_ids) <= set(free_staffs):
+                return f"{label}: staff busy or reused free_staffs={free_staffs}\nactual=  {option}"
+            continue
+
+        for name, policy in PLACEMENT_POLICIES.items():
+            placed = place_booking(index, day["rooms"], start, start + duration, k=k, policy=policy)
+            if placed is None or free_capacity[placed["room_id"]] < k or placed["staff_id"] not in free_staffs:
+                return f"place_booking policy={name} {label}\nfree_capacity={free_capacity} free_staffs={free_staffs}\nactual=  {placed}"
+
+    for _ in range(5):
+        mismatch = _check_group(day, index, rng)
+        if mismatch:
+            return mismatch
+
+    return None
+
+
+def _room_free_capacity(day: dict, start: int, end: int) -> dict:
+    """Vét cạn: số chỗ trống lúc đông nhất trong [start, end) của mỗi phòng, đếm từng phút."""
+    free_capacity = {}
+    for room_id, room in day["rooms"].items():
+        room_orders = [o for o in day["orders"] or [] if o["room_id"] == room_id]
+        peak = max(
+            sum(_minutes(o["start_time"]) <= minute for o in room_orders)
+            - sum(_minutes(o["end_time"]) <= minute for o in room_orders)
+            for minute in range(start, end)
+        )
+        free_capacity[room_id] = room["capacity"] - peak
+    return free_capacity
+
+
+def _group_feasible(day: dict, start: int, durations: list[int], allow_split: bool) -> tuple[bool, dict]:
+    """Vét cạn: số chỗ trống từng phút của mỗi phòng, thử mọi cách gán nhân viên khác nhau."""
+    free_capacity = _room_free_capacity(day, start, start + max(durations))
+
+    k = len(durations)
+    if any(free >= k for free in free_capacity.values()):
+        room_ok = True
+    else:
+        room_ok = allow_split and sum(max(free, 0) for free in free_capacity.values()) >= k
+
+    free_staffs = [
+        set(staff_free_in_interval(day["orders"] or [], start, start + duration, day["staffs"]))
+        for duration in durations
+    ]
+    staff_ok = any(
+        all(staff in free_staffs[guest] for guest, staff in enumerate(chosen))
+        for chosen in permutations(day["staffs"], k)
+    )
+    return room_ok and staff_ok, free_capacity
+
+
+def _check_group(day: dict, index: DayAvailability, rng: random.Random) -> str | None:
+    durations = [rng.choice([30, 60, 90]) for _ in range(rng.randint(1, 4))]
+    start = rng.randrange(index.open_min, max(index.open_min + 1, index.close_min - max(durations) + 1))
+    if start + max(durations) > index.close_min:
+        return None
+    allow_split = rng.random() < 0.7
+
+    solution = solve_group_booking(index, day["rooms"], start, durations, allow_split)
+    feasible, free_capacity = _group_feasible(day, start, durations, allow_split)
+    label = f"solve_group_booking start={start} durations={durations} allow_split={allow_split}"
+    if (solution is not None) != feasible:
+        return f"{label}\nexpected feasible={feasible}\nactual=  {solution}"
+    if solution is None:
+        return None
+
+    staff_ids = [assignment["staff_id"] for assignment in solution["assignments"]]
+    if len(set(staff_ids)) != len(durations):
+        return f"{label}: staff reused {solution}"
+    for assignment, duration in zip(solution["assignments"], durations):
+        free = staff_free_in_interval(day["orders"] or [], start, start + duration, day["staffs"])
+        if assignment["staff_id"] not in free:
+            return f"{label}: staff {assignment['staff_id']} busy {solution}"
+    room_ids = [assignment["room_id"] for assignment in solution["assignments"]]
+    for room_id in set(room_ids):
+        if room_ids.count(room_id) > free_capacity[room_id]:
+            return f"{label}: room {room_id} over capacity {free_capacity} {solution}"
+    if any(free >= len(durations) for free in free_capacity.values()) and len(set(room_ids)) > 1:
+        return f"{label}: split although one room fits {free_capacity} {solution}"
+
+    for alternative in find_group_alternatives(index, day["rooms"], start, durations, allow_split):
+        if not _group_feasible(day, alternative["start_min"], durations, allow_split)[0]:
+            return f"{label}: infeasible alternative {alternative}"
+    return None
+
+
+def shrink(day: dict, seed: int) -> dict:
+    """Bỏ dần từng lịch khi case vẫn sai, để in ra case nhỏ nhất dễ đọc."""
+    changed = True
+    while changed and day["orders"]:
+        changed = False
+        for index in range(len(day["orders"])):
+            smaller = {**day, "orders": day["orders"][:index] + day["orders"][index + 1:]}
+            if smaller["orders"] and find_mismatch(smaller, random.Random(seed)):
+                day, changed = smaller, True
+                break
+    return day
+
+
+def bench(days: list[dict]) -> tuple[float, float]:
+    """Thời gian của một lần check_available_booking (mọi phòng) theo hai cách."""
+    started = time.perf_counter()
+    for day in days:
+        for room_id, room in day["rooms"].items():
+            free_slots_with_staff(
+                orders=day["orders"], room_id=room_id, room_capacity=room["capacity"],
+                staffs=day["staffs"], k=1
+            )
+    legacy_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for day in days:
+        index = DayAvailability(orders=day["orders"], staffs=day["staffs"])
+        for room_id, room in day["rooms"].items():
+            index.free_slots_with_staff(room_id=room_id, room_capacity=room["capacity"], k=1)
+    index_s = time.perf_counter() - started
+
+    return legacy_s * 1000 / len(days), index_s * 1000 / len(days)
+
+
+def bench_group(days: list[dict], k: int = 3, duration: int = 60) -> tuple[float, float]:
+    """Thời gian (µs) xếp một nhóm k khách và tìm giờ thay thế trên index đã dựng sẵn."""
+    indexes = [DayAvailability(orders=day["orders"], staffs=day["staffs"]) for day in days]
+    starts = range(9 * 60, 19 * 60, 30)
+
+    started = time.perf_counter()
+    for day, index in zip(days, indexes):
+        for start in starts:
+            solve_group_booking(index, day["rooms"], start, [duration] * k)
+    solve_us = (time.perf_counter() - started) * 1e6 / (len(days) * len(starts))
+
+    started = time.perf_counter()
+    for day, index in zip(days, indexes):
+        find_group_alternatives(index, day["rooms"], 12 * 60, [duration] * k)
+    alternatives_us = (time.perf_counter() - started) * 1e6 / len(days)
+
+    return solve_us, alternatives_us
+
+
+def busy_day(rng: random.Random, n_rooms: int = 8, n_staffs: int = 15, n_orders: int = 80) -> dict:
+    rooms = {room_id: {"name": f"Phòng {room_id}", "capacity": rng.randint(2, 4)} for room_id in range(1, n_rooms + 1)}
+    staffs = {staff_id: f"Nhân viên {staff_id}" for staff_id in range(1, n_staffs + 1)}
+    orders = []
+    for order_id in range(n_orders):
+        start = rng.randrange(8 * 60, 19 * 60, 15)
+        end = start + rng.choice([30, 60, 90, 120])
+        orders.append({
+            "id": order_id,
+            "staff_id": rng.choice(list(staffs)),
+            "room_id": rng.choice(list(rooms)),
+            "start_time": f"{start // 60:02d}:{start % 60:02d}:00",
+            "end_time": f"{end // 60:02d}:{end % 60:02d}:00",
+        })
+    return {"orders": orders, "rooms": rooms, "staffs": staffs}
+
+
+def main(cases: int, seed: int):
+    for case in range(cases):
+        case_seed = seed * 1_000_003 + case
+        day = random_day(random.Random(case_seed))
+        mismatch = find_mismatch(day, random.Random(case_seed))
+        if mismatch:
+            day = shrink(day, case_seed)
+            print(f"FAILED case {case} (seed {case_seed})")
+            print(f"day={day}")
+            print(find_mismatch(day, random.Random(case_seed)))
+            raise SystemExit(1)
+    print(f"{cases} random days: DayAvailability matches free_slots_with_staff / staff_free_in_interval, placement and group solver match brute force")
+
+    rng = random.Random(seed)
+    days = [busy_day(rng) for _ in range(20)]
+    legacy_ms, index_ms = bench(days)
+    print(
+        f"check_available_booking, 8 rooms / 15 staff / 80 appointments: "
+        f"legacy {legacy_ms:.2f} ms | index {index_ms:.2f} ms ({legacy_ms / index_ms:.1f}x)"
+    )
+    solve_us, alternatives_us = bench_group(days)
+    print(f"group of 3 guests: solve_group_booking {solve_us:.0f} µs | find_group_alternatives {alternatives_us:.0f} µs")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cases", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    main(cases=args.cases, seed=args.seed)
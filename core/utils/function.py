@@ -2,12 +2,13 @@ import os
 import json
 import random
 import asyncio
-from typing import Any
+from typing import Any, Awaitable, Callable
 from decimal import Decimal
 from dotenv import load_dotenv
 from datetime import date, time, datetime
 
 from langgraph.graph import StateGraph
+from langchain_core.tools import BaseTool
 from langchain_core.messages import ToolMessage
 from langchain_core.messages import AIMessage, HumanMessage
 
@@ -56,6 +57,31 @@ def build_update(
         ],
         **kwargs
     }
+
+def add_async_variant(
+    sync_tool: BaseTool,
+    coroutine: Callable[..., Awaitable[Any]] | None = None
+) -> BaseTool:
+    """
+    Gắn phiên bản async cho một tool sync để graph chạy được bằng `ainvoke`.
+
+    Args:
+        sync_tool (BaseTool): Tool tạo bởi decorator `@tool`.
+        coroutine (Callable | None): Hàm async có cùng tham số với tool. Nếu None,
+            thân hàm sync được chạy trong thread pool để các lời gọi Supabase/Sheets
+            không chặn event loop.
+
+    Returns:
+        BaseTool: Chính tool đó, đã có `coroutine`.
+    """
+    if coroutine is None:
+        sync_func = sync_tool.func
+
+        async def coroutine(*args, **kwargs):
+            return await asyncio.to_thread(sync_func, *args, **kwargs)
+
+    sync_tool.coroutine = coroutine
+    return sync_tool
         
 async def test_bot(
     graph: StateGraph,
@@ -0,0 +1,167 @@
+import numpy as np
+
+from core.utils.availability import SLOT_STEP_MINUTES, DayAvailability
+
+
+def _room_free_capacity(availability: DayAvailability, rooms: dict, start_min: int, end_min: int) -> dict:
+    """Số chỗ còn trống của mỗi phòng trong suốt [start_min, end_min) (lúc đông nhất)."""
+    return {
+        room_id: room["capacity"] - int(availability.room_occupancy(room_id)[start_min:end_min].max())
+        for room_id, room in rooms.items()
+    }
+
+
+def _allocate_rooms(free_capacity: dict, k: int, allow_split: bool) -> list[int] | None:
+    """
+    Phòng cho từng khách: ưu tiên cả nhóm chung phòng đầu tiên đủ chỗ (thứ tự `rooms`),
+    không có thì chia vào ít phòng nhất (phòng trống nhiều chỗ trước).
+    """
+    for room_id, free in free_capacity.items():
+        if free >= k:
+            return [room_id] * k
+    if not allow_split:
+        return None
+
+    seats = []
+    for room_id, free in sorted(free_capacity.items(), key=lambda item: -item[1]):
+        seats += [room_id] * max(0, min(free, k - len(seats)))
+        if len(seats) == k:
+            return seats
+    return None
+
+
+def _match_staff(candidates: list[list[int]]) -> list[int] | None:
+    """
+    Ghép mỗi khách với một nhân viên khác nhau (bipartite matching, augmenting path).
+    `candidates[guest]` là các nhân viên rỗi trong suốt thời gian của khách đó.
+    """
+    staff_of_guest = [-1] * len(candidates)
+    guest_of_staff: dict[int, int] = {}
+
+    def augment(guest: int, visited: set) -> bool:
+        for staff in candidates[guest]:
+            if staff in visited:
+                continue
+            visited.add(staff)
+            if staff not in guest_of_staff or augment(guest_of_staff[staff], visited):
+                guest_of_staff[staff] = guest
+                staff_of_guest[guest] = staff
+                return True
+        return False
+
+    # Khách ít lựa chọn nhất được ghép trước để ít phải đổi lại
+    for guest in sorted(range(len(candidates)), key=lambda guest: len(candidates[guest])):
+        if not augment(guest, set()):
+            return None
+    return staff_of_guest
+
+
+def solve_group_booking(
+    availability: DayAvailability,
+    rooms: dict,
+    start_min: int,
+    durations: list[int],
+    allow_split: bool = True
+) -> dict | None:
+    """
+    Xếp một nhóm `len(durations)` khách bắt đầu cùng lúc `start_min`: mỗi khách một nhân
+    viên riêng rỗi trong suốt thời gian của khách đó, cả nhóm ngồi trong một phòng (hoặc
+    chia nhiều phòng nếu `allow_split`) còn đủ chỗ đến khi khách cuối cùng xong.
+
+    Returns:
+        dict | None: {"start_min", "end_min", "assignments": [{"guest", "room_id", "staff_id",
+            "end_min"}]}, None nếu không xếp được.
+    """
+    if not durations or min(durations) <= 0:
+        return None
+    k = len(durations)
+    end_min = start_min + max(durations)
+    if start_min < availability.open_min or end_min > availability.close_min:
+        return None
+
+    seats = _allocate_rooms(_room_free_capacity(availability, rooms, start_min, end_min), k, allow_split)
+    if seats is None:
+        return None
+
+    distinct = sorted(set(durations))
+    mask = availability.free_staff_mask(
+        np.full(len(distinct), start_min),
+        np.array([start_min + duration for duration in distinct])
+    )
+    free_rows = {duration: np.flatnonzero(mask[:, column]).tolist() for column, duration in enumerate(distinct)}
+    staff_rows = _match_staff([free_rows[duration] for duration in durations])
+    if staff_rows is None:
+        return None
+
+    staff_ids = availability.staff_ids
+    return {
+        "start_min": start_min,
+        "end_min": end_min,
+        "assignments": [
+            {
+                "guest": guest + 1,
+                "room_id": seats[guest],
+                "staff_id": staff_ids[staff_rows[guest]],
+                "end_min": start_min + durations[guest],
+            }
+            for guest in range(k)
+        ],
+    }
+
+
+def group_candidate_mask(
+    availability: DayAvailability,
+    rooms: dict,
+    starts: np.ndarray,
+    durations: list[int],
+    allow_split: bool = True
+) -> np.ndarray:
+    """
+    Lọc nhanh các giờ bắt đầu `starts` bằng mảng, điều kiện cần để `solve_group_booking`
+    xếp được: phòng đủ chỗ cho cả nhóm, đủ `len(durations)` nhân viên rỗi.
+    """
+    k, longest, shortest = len(durations), max(durations), min(durations)
+
+    # Số chỗ trống lúc đông nhất trong [start, start + longest) của mọi phòng, mọi giờ bắt đầu
+    peak = np.stack([availability.room_peak_occupancy(room_id, starts, longest) for room_id in rooms])
+    free = np.array([room["capacity"] for room in rooms.values()])[:, None] - peak
+    room_ok = (free >= k).any(axis=0)
+    if allow_split:
+        room_ok |= np.clip(free, 0, None).sum(axis=0) >= k
+
+    # Điều kiện cần: đủ k nhân viên rỗi trong khoảng ngắn nhất
+    staff_ok = availability.free_staff_mask(starts, starts + shortest).sum(axis=0) >= k
+    return room_ok & staff_ok
+
+
+def find_group_alternatives(
+    availability: DayAvailability,
+    rooms: dict,
+    start_min: int,
+    durations: list[int],
+    allow_split: bool = True,
+    top_n: int = 3,
+    step: int = SLOT_STEP_MINUTES
+) -> list[dict]:
+    """
+    Các giờ bắt đầu khác trong ngày (lưới `step` phút) xếp được cả nhóm, gần `start_min`
+    nhất trước. Lọc nhanh cả lưới bằng mảng (đủ chỗ phòng, đủ nhân viên rỗi) rồi mới
+    chạy `solve_group_booking` cho các giờ còn lại.
+    """
+    if not durations or min(durations) <= 0 or not rooms:
+        return []
+    grid = np.arange(availability.open_min, availability.close_min - max(durations) + 1, step)
+    if not len(grid):
+        return []
+
+    candidates = grid[group_candidate_mask(availability, rooms, grid, durations, allow_split)]
+    alternatives = []
+    for start in candidates[np.argsort(np.abs(candidates - start_min), kind="stable")]:
+        if start == start_min:
+            continue
+        solution = solve_group_booking(availability, rooms, int(start), durations, allow_split)
+        if solution is not None:
+            alternatives.append(solution)
+            if len(alternatives) == top_n:
+                break
+    return alternatives
@@ -0,0 +1,83 @@
+"""
+Báo cáo chi phí import theo module khi khởi động app, dựa trên `python -X importtime`.
+
+Chạy từ thư mục gốc của repo:
+    python -m core.utils.import_profile --module main --top 20
+
+Báo cáo gồm:
+    - Tổng thời gian import `--module`.
+    - Các module của repo tốn thời gian nhất (cumulative: gồm cả module con nó kéo theo).
+    - Các package bên ngoài tốn thời gian nhất (tổng self time của mọi module trong package).
+"""
+import os
+import sys
+import argparse
+import subprocess
+from collections import defaultdict
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _first_party_packages() -> set[str]:
+    names = set()
+    for entry in os.listdir(REPO_ROOT):
+        path = os.path.join(REPO_ROOT, entry)
+        if os.path.isdir(path) and not entry.startswith("."):
+            names.add(entry)
+        elif entry.endswith(".py"):
+            names.add(entry[:-3])
+    return names
+
+
+def profile_imports(module: str) -> list[tuple[str, int, int]]:
+    """
+    Import `module` trong một process mới và trả về (tên module, self_us, cumulative_us).
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=REPO_ROOT,
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Import {module} failed:\n{result.stderr[-2000:]}")
+
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def main(module: str, top: int):
+    rows = profile_imports(module)
+    first_party = _first_party_packages()
+
+    total_us = next(cumulative for name, _, cumulative in rows if name == module)
+    print(f"import {module}: {total_us / 1000:.0f} ms ({len(rows)} modules)\n")
+
+    repo_rows = [row for row in rows if row[0].split(".")[0] in first_party]
+    print(f"Top {top} repo modules (cumulative ms):")
+    for name, self_us, cumulative_us in sorted(repo_rows, key=lambda row: -row[2])[:top]:
+        print(f"  {cumulative_us / 1000:8.1f}  {name}")
+
+    by_package: dict[str, int] = defaultdict(int)
+    for name, self_us, _ in rows:
+        package = name.split(".")[0]
+        if package not in first_party:
+            by_package[package] += self_us
+
+    print(f"\nTop {top} third-party packages (self ms):")
+    for package, self_us in sorted(by_package.items(), key=lambda item: -item[1])[:top]:
+        print(f"  {self_us / 1000:8.1f}  {package}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args()
+
+    main(module=args.module, top=args.top)
@@ -0,0 +1,200 @@
+import os
+import random
+
+import numpy as np
+from dotenv import load_dotenv
+
+from core.utils.availability import SLOT_STEP_MINUTES, DayAvailability
+from core.utils.group_booking import group_candidate_mask, solve_group_booking
+
+load_dotenv()
+
+PLACEMENT_POLICY = os.getenv("PLACEMENT_POLICY", "min_fragments")
+# Khoảng trống ngắn hơn mức này không còn xếp được dịch vụ nào -> bị coi là phân mảnh
+PLACEMENT_MIN_GAP_MINUTES = int(os.getenv("PLACEMENT_MIN_GAP_MINUTES", "30"))
+
+
+class PlacementPolicy:
+    """
+    Cách chọn phòng và nhân viên cho một lịch hẹn [start_min, end_min) khi có nhiều lựa
+    chọn hợp lệ. `rooms_ok` / `staff_rows` đã được lọc sẵn (phòng còn >= k chỗ, nhân viên
+    rỗi trong suốt khoảng đó), giữ thứ tự của `rooms` / `staffs`.
+
+    Mặc định: phòng đầu tiên, nhân viên đầu tiên (first fit).
+    """
+    name = "first_fit"
+
+    def choose_room(
+        self,
+        availability: DayAvailability,
+        rooms: dict,
+        rooms_ok: list[int],
+        start_min: int,
+        end_min: int,
+        k: int
+    ) -> int:
+        return rooms_ok[0]
+
+    def choose_staff(self, availability: DayAvailability, staff_rows: list[int], start_min: int, end_min: int) -> int:
+        return staff_rows[0]
+
+
+class RandomStaffPolicy(PlacementPolicy):
+    """Như `choose_room_and_staff` trước đây: phòng đầu tiên, nhân viên ngẫu nhiên."""
+    name = "random"
+
+    def choose_staff(self, availability, staff_rows, start_min, end_min):
+        return random.choice(staff_rows)
+
+
+class BestFitPolicy(PlacementPolicy):
+    """Đặt vào khoảng trống vừa khít nhất (ngắn nhất) của phòng và của nhân viên."""
+    name = "best_fit"
+
+    def choose_room(self, availability, rooms, rooms_ok, start_min, end_min, k):
+        return min(rooms_ok, key=lambda room_id: _run_length(
+            availability.room_free_run(room_id, rooms[room_id]["capacity"], k, start_min, end_min)
+        ))
+
+    def choose_staff(self, availability, staff_rows, start_min, end_min):
+        return min(staff_rows, key=lambda row: _run_length(availability.staff_free_run(row, start_min, end_min)))
+
+
+class BalancedStaffPolicy(PlacementPolicy):
+    """Chia đều việc: nhân viên có ít phút đã đặt nhất trong ngày, phòng đầu tiên."""
+    name = "balanced_staff"
+
+    def choose_staff(self, availability, staff_rows, start_min, end_min):
+        busy_minutes = availability.staff_busy_minutes()
+        return min(staff_rows, key=lambda row: busy_minutes[row])
+
+
+class MinFragmentsPolicy(PlacementPolicy):
+    """
+    Chọn nơi để lại ít phút trống "vụn" nhất: phần trống trước/sau lịch hẹn trong khoảng
+    rỗi của phòng/nhân viên mà ngắn hơn `min_gap` thì không bán được nữa. Hoà thì ưu
+    tiên khoảng vừa khít hơn (best fit).
+    """
+    name = "min_fragments"
+
+    def __init__(self, min_gap: int = PLACEMENT_MIN_GAP_MINUTES):
+        self.min_gap = min_gap
+
+    def choose_room(self, availability, rooms, rooms_ok, start_min, end_min, k):
+        return min(rooms_ok, key=lambda room_id: self._score(
+            availability.room_free_run(room_id, rooms[room_id]["capacity"], k, start_min, end_min),
+            start_min,
+            end_min
+        ))
+
+    def choose_staff(self, availability, staff_rows, start_min, end_min):
+        return min(staff_rows, key=lambda row: self._score(
+            availability.staff_free_run(row, start_min, end_min), start_min, end_min
+        ))
+
+    def _score(self, run: tuple[int, int], start_min: int, end_min: int) -> tuple[int, int]:
+        leftovers = (start_min - run[0], run[1] - end_min)
+        wasted = sum(piece for piece in leftovers if 0 < piece < self.min_gap)
+        return wasted, _run_length(run)
+
+
+def _run_length(run: tuple[int, int]) -> int:
+    return run[1] - run[0]
+
+
+PLACEMENT_POLICIES: dict[str, PlacementPolicy] = {
+    policy.name: policy
+    for policy in (PlacementPolicy(), RandomStaffPolicy(), BestFitPolicy(), BalancedStaffPolicy(), MinFragmentsPolicy())
+}
+
+
+def get_placement_policy(name: str) -> PlacementPolicy:
+    if name not in PLACEMENT_POLICIES:
+        raise ValueError(f"Invalid placement policy: {name}. Must be one of {list(PLACEMENT_POLICIES)}")
+    return PLACEMENT_POLICIES[name]
+
+
+placement_policy = get_placement_policy(PLACEMENT_POLICY)
+
+
+def place_booking(
+    availability: DayAvailability,
+    rooms: dict,
+    start_min: int,
+    end_min: int,
+    k: int = 1,
+    policy: PlacementPolicy | None = None
+) -> dict | None:
+    """
+    Chọn phòng còn >= k chỗ trong suốt [start_min, end_min) và một nhân viên rỗi trong
+    khoảng đó theo `policy` (mặc định PLACEMENT_POLICY).
+
+    Returns:
+        dict | None: {"room_id", "staff_id"}, None nếu không còn phòng hoặc nhân viên.
+    """
+    if not rooms or end_min <= start_min or start_min < availability.open_min or end_min > availability.close_min:
+        return None
+
+    starts = np.array([start_min])
+    rooms_ok = [
+        room_id for room_id, room in rooms.items()
+        if room["capacity"] - availability.room_peak_occupancy(room_id, starts, end_min - start_min)[0] >= k
+    ]
+    staff_rows = np.flatnonzero(availability.free_staff_mask(starts, np.array([end_min]))[:, 0]).tolist()
+    if not rooms_ok or not staff_rows:
+        return None
+
+    policy = policy or placement_policy
+    return {
+        "room_id": policy.choose_room(availability, rooms, rooms_ok, start_min, end_min, k),
+        "staff_id": availability.staff_ids[policy.choose_staff(availability, staff_rows, start_min, end_min)],
+    }
+
+
+def bookable_starts(
+    availability: DayAvailability,
+    rooms: dict,
+    duration: int,
+    k: int,
+    step: int = SLOT_STEP_MINUTES,
+    not_before: int | None = None,
+    policy: PlacementPolicy | None = None
+) -> list[dict]:
+    """
+    Các giờ bắt đầu (lưới `step` phút từ giờ mở cửa) đặt được `duration` phút, cùng điều
+    kiện với `check_available_booking_tool`: lọc cả lưới bằng mảng rồi mới xếp từng giờ.
+
+    - k = 1: phòng còn chỗ và một nhân viên rỗi, chọn bằng `place_booking`.
+    - k > 1: mỗi khách một nhân viên riêng, phòng đủ chỗ cho cả nhóm (có thể chia phòng),
+      xếp bằng `solve_group_booking`.
+
+    Returns:
+        list[dict]: {"start_min", "end_min", "room_id", "staff_id"} (k > 1: của khách đầu
+            tiên, thêm "assignments" của cả nhóm), tăng dần theo giờ bắt đầu.
+    """
+    open_min = availability.open_min
+    first = open_min if not_before is None else max(open_min, not_before)
+    first = open_min + -(-(first - open_min) // step) * step
+    grid = np.arange(first, availability.close_min - duration + 1, step)
+    if duration <= 0 or not len(grid) or not rooms:
+        return []
+
+    if k > 1:
+        options = []
+        for start in grid[group_candidate_mask(availability, rooms, grid, [duration] * k)]:
+            group = solve_group_booking(availability, rooms, int(start), [duration] * k)
+            if group is not None:
+                first = group["assignments"][0]
+                options.append({**group, "room_id": first["room_id"], "staff_id": first["staff_id"]})
+        return options
+
+    room_ok = np.zeros(len(grid), dtype=bool)
+    for room_id, room in rooms.items():
+        room_ok |= room["capacity"] - availability.room_peak_occupancy(room_id, grid, duration) >= k
+    staff_ok = availability.free_staff_mask(grid, grid + duration).any(axis=0)
+
+    options = []
+    for start in grid[room_ok & staff_ok]:
+        placed = place_booking(availability, rooms, int(start), int(start) + duration, k=k, policy=policy)
+        options.append({"start_min": int(start), "end_min": int(start) + duration, **placed})
+    return options
@@ -0,0 +1,181 @@
+"""
+Mô phỏng: phát lại một chuỗi yêu cầu đặt lịch (sinh ngẫu nhiên có seed, hoặc lịch sử
+thật) với từng `PLACEMENT_POLICIES`, đo số lịch nhận được mỗi ngày và độ phân mảnh.
+
+Mỗi yêu cầu (theo thứ tự tạo) thử giờ khách muốn bằng `place_booking`; không được thì
+lùi/tiến tối đa `--flex` phút trên lưới SLOT_STEP_MINUTES (như agent gợi ý giờ khác),
+vẫn không được thì coi như mất khách. Phân mảnh = phút trống nằm trong khoảng rỗi ngắn
+hơn PLACEMENT_MIN_GAP_MINUTES (không bán được) / tổng phút trống, của nhân viên và phòng.
+
+Chạy từ thư mục gốc của repo:
+    python -m core.utils.simulate_placement --days 30 --requests 70 --seed 0
+    python -m core.utils.simulate_placement --history appointments.json
+
+File lịch sử là list JSON các lịch hẹn {"booking_date", "start_time", "end_time"} theo
+thứ tự tạo (vd. export bảng appointments, order by id); phòng/nhân viên được xếp lại.
+"""
+import json
+import random
+import argparse
+from collections import defaultdict
+
+import numpy as np
+
+from core.utils.availability import OPEN_TIME_STR, CLOSE_TIME_STR, SLOT_STEP_MINUTES, DayAvailability
+from core.utils.placement import PLACEMENT_MIN_GAP_MINUTES, PLACEMENT_POLICIES, PlacementPolicy, place_booking
+
+
+def _to_minutes(time_str: str) -> int:
+    hour, minute, *_ = time_str.split(":")
+    return int(hour) * 60 + int(minute)
+
+
+def _to_time_str(minutes: int) -> str:
+    return f"{minutes // 60:02d}:{minutes % 60:02d}:00"
+
+
+OPEN_MIN, CLOSE_MIN = _to_minutes(OPEN_TIME_STR), _to_minutes(CLOSE_TIME_STR)
+
+
+def synthetic_stream(rng: random.Random, days: int, requests_per_day: int) -> dict[str, list[dict]]:
+    """Yêu cầu mỗi ngày theo thứ tự tạo: giờ muốn dồn vào giờ cao điểm, dịch vụ 30-120 phút."""
+    starts = list(range(OPEN_MIN, CLOSE_MIN - 30 + 1, SLOT_STEP_MINUTES))
+    weights = [3 if 10 * 60 <= start < 12 * 60 or 17 * 60 <= start < 20 * 60 else 1 for start in starts]
+
+    stream = {}
+    for day in range(days):
+        requests = []
+        for _ in range(requests_per_day):
+            duration = rng.choices([30, 60, 90, 120], weights=[2, 4, 3, 1])[0]
+            start = min(rng.choices(starts, weights=weights)[0], CLOSE_MIN - duration)
+            requests.append({"start_min": start, "duration": duration})
+        stream[f"day-{day + 1:03d}"] = requests
+    return stream
+
+
+def history_stream(path: str) -> dict[str, list[dict]]:
+    with open(path, encoding="utf-8") as file:
+        rows = json.load(file)
+
+    stream = defaultdict(list)
+    for row in rows:
+        start, end = _to_minutes(row["start_time"]), _to_minutes(row["end_time"])
+        if OPEN_MIN <= start < end <= CLOSE_MIN:
+            stream[str(row["booking_date"])].append({"start_min": start, "duration": end - start})
+    return dict(stream)
+
+
+def _candidate_starts(start: int, duration: int, flex: int) -> list[int]:
+    """Giờ khách muốn, rồi các giờ lệch dần ±SLOT_STEP_MINUTES trong khoảng `flex`."""
+    candidates = [start]
+    for shift in range(SLOT_STEP_MINUTES, flex + 1, SLOT_STEP_MINUTES):
+        candidates += [start - shift, start + shift]
+    return [c for c in candidates if OPEN_MIN <= c and c + duration <= CLOSE_MIN]
+
+
+def _short_idle_minutes(free: np.ndarray, min_gap: int) -> tuple[int, int]:
+    """(phút trống trong các khoảng rỗi < min_gap, tổng phút trống) của một dãy bool theo phút."""
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], free.astype(np.int8), [0]))))
+    runs = edges[1::2] - edges[::2]
+    return int(runs[runs < min_gap].sum()), int(runs.sum())
+
+
+def fragmentation(availability: DayAvailability, rooms: dict, min_gap: int) -> tuple[int, int, int, int]:
+    """(phút trống vụn, phút trống) của mọi nhân viên, rồi của mọi phòng, trong giờ mở cửa."""
+    minutes = np.arange(OPEN_MIN, CLOSE_MIN)
+    staff_short = staff_idle = room_short = room_idle = 0
+    for free in availability.free_staff_mask(minutes, minutes + 1):
+        short, idle = _short_idle_minutes(free, min_gap)
+        staff_short, staff_idle = staff_short + short, staff_idle + idle
+    for room_id, room in rooms.items():
+        free = availability.room_free_capacity(room_id, room["capacity"])[OPEN_MIN:CLOSE_MIN] >= 1
+        short, idle = _short_idle_minutes(free, min_gap)
+        room_short, room_idle = room_short + short, room_idle + idle
+    return staff_short, staff_idle, room_short, room_idle
+
+
+def replay(
+    stream: dict[str, list[dict]],
+    rooms: dict,
+    staffs: dict,
+    policy: PlacementPolicy,
+    flex: int,
+    min_gap: int
+) -> dict:
+    accepted = moved = requested = 0
+    staff_short = staff_idle = room_short = room_idle = 0
+    for requests in stream.values():
+        orders = []
+        availability = DayAvailability(orders=orders, staffs=staffs)
+        for request in requests:
+            requested += 1
+            for start in _candidate_starts(request["start_min"], request["duration"], flex):
+                placed = place_booking(availability, rooms, start, start + request["duration"], policy=policy)
+                if placed is None:
+                    continue
+                accepted += 1
+                moved += start != request["start_min"]
+                orders.append({
+                    "id": len(orders) + 1,
+                    "start_time": _to_time_str(start),
+                    "end_time": _to_time_str(start + request["duration"]),
+                    **placed
+                })
+                availability = DayAvailability(orders=orders, staffs=staffs)
+                break
+
+        counts = fragmentation(availability, rooms, min_gap)
+        staff_short, staff_idle = staff_short + counts[0], staff_idle + counts[1]
+        room_short, room_idle = room_short + counts[2], room_idle + counts[3]
+
+    return {
+        "accepted_per_day": accepted / len(stream),
+        "acceptance": accepted / requested,
+        "moved": moved / max(accepted, 1),
+        "staff_fragmentation": staff_short / max(staff_idle, 1),
+        "room_fragmentation": room_short / max(room_idle, 1),
+    }
+
+
+def main(days: int, requests_per_day: int, n_rooms: int, room_capacity: int, n_staffs: int, flex: int, seed: int, history: str | None):
+    rng = random.Random(seed)
+    stream = history_stream(history) if history else synthetic_stream(rng, days, requests_per_day)
+    rooms = {room_id: {"name": f"Phòng {room_id}", "capacity": room_capacity} for room_id in range(1, n_rooms + 1)}
+    staffs = {staff_id: f"Nhân viên {staff_id}" for staff_id in range(1, n_staffs + 1)}
+
+    print(
+        f"{len(stream)} days, {sum(map(len, stream.values()))} requests, {n_rooms} rooms x {room_capacity} seats, "
+        f"{n_staffs} staff, ±{flex} min flexibility, fragments < {PLACEMENT_MIN_GAP_MINUTES} min"
+    )
+    print(f"{'policy':<15} | {'accepted/day':>12} | {'acceptance':>10} | {'moved':>6} | {'staff frag':>10} | {'room frag':>9}")
+    for name, policy in PLACEMENT_POLICIES.items():
+        random.seed(seed)  # "random" chọn nhân viên bằng module random
+        result = replay(stream, rooms, staffs, policy, flex, PLACEMENT_MIN_GAP_MINUTES)
+        print(
+            f"{name:<15} | {result['accepted_per_day']:>12.1f} | {result['acceptance']:>10.1%} | "
+            f"{result['moved']:>6.1%} | {result['staff_fragmentation']:>10.1%} | {result['room_fragmentation']:>9.1%}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--requests", type=int, default=70, help="số yêu cầu mỗi ngày (dữ liệu sinh ngẫu nhiên)")
+    parser.add_argument("--rooms", type=int, default=4)
+    parser.add_argument("--room-capacity", type=int, default=2)
+    parser.add_argument("--staffs", type=int, default=8)
+    parser.add_argument("--flex", type=int, default=60, help="số phút tối đa được lệch khỏi giờ khách muốn")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--history", help="file JSON lịch hẹn thật thay cho dữ liệu sinh ngẫu nhiên")
+    args = parser.parse_args()
+
+    main(
+        days=args.days,
+        requests_per_day=args.requests,
+        n_rooms=args.rooms,
+        room_capacity=args.room_capacity,
+        n_staffs=args.staffs,
+        flex=args.flex,
+        seed=args.seed,
+        history=args.history
+    )
@@ -0,0 +1,73 @@
+import time
+import threading
+from typing import Any, Callable, Generic, TypeVar
+
+from log.logger_config import setup_logging
+
+logger = setup_logging(__name__)
+
+T = TypeVar("T")
+
+
+class ClientProvider(Generic[T]):
+    """
+    Tạo client bên ngoài (Supabase, OpenAI, Google Sheets, Telegram, ...) ở lần dùng
+    đầu tiên thay vì lúc import module, rồi dùng lại cho các lần sau.
+
+    An toàn khi gọi từ nhiều thread (tool sync chạy trong thread pool): chỉ một
+    thread gọi `factory`, các thread khác chờ và nhận cùng một instance.
+    Nếu `factory` lỗi thì lần gọi sau sẽ thử kết nối lại.
+    """
+    def __init__(self, factory: Callable[[], T], name: str):
+        self.factory = factory
+        self.name = name
+        self.init_ms: float | None = None
+        self._client: T | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def initialized(self) -> bool:
+        return self._client is not None
+
+    def get(self) -> T:
+        client = self._client
+        if client is not None:
+            return client
+
+        with self._lock:
+            if self._client is None:
+                started = time.perf_counter()
+                self._client = self.factory()
+                self.init_ms = round((time.perf_counter() - started) * 1000, 2)
+                logger.info(f"Initialized client {self.name} in {self.init_ms} ms")
+            return self._client
+
+    def override(self, client: T):
+        """Thay client (dùng cho benchmark/test, hoặc inject client đã tạo sẵn)."""
+        with self._lock:
+            self._client = client
+
+    def reset(self):
+        with self._lock:
+            self._client = None
+            self.init_ms = None
+
+
+class LazyClientProxy:
+    """
+    Proxy chuyển mọi thuộc tính sang client thật của `provider`, để các module đang
+    import trực tiếp `supabase_client`, `embeddings_model`, ... giữ nguyên cách dùng
+    mà client chỉ được tạo khi thực sự gọi tới.
+    """
+    def __init__(self, provider: ClientProvider):
+        object.__setattr__(self, "_provider", provider)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._provider.get(), name)
+
+    def __setattr__(self, name: str, value: Any):
+        setattr(self._provider.get(), name, value)
+
+    def __repr__(self) -> str:
+        state = "initialized" if self._provider.initialized else "not initialized"
+        return f"<LazyClientProxy {self._provider.name} ({state})>"
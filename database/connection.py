@@ -1,9 +1,14 @@
-from langchain_openai import ChatOpenAI
-from langchain_openai import OpenAIEmbeddings
-
 import os
+import asyncio
+from typing import TYPE_CHECKING
 from dotenv import load_dotenv
-from supabase import Client, AsyncClient, create_client, acreate_client
+
+from database.client_provider import ClientProvider, LazyClientProxy
+
+# SDK nặng (openai, supabase) chỉ được import khi client được tạo lần đầu
+if TYPE_CHECKING:
+    from supabase import Client, AsyncClient
+    from langchain_openai import ChatOpenAI, OpenAIEmbeddings
 
 load_dotenv()
 
@@ -12,51 +17,105 @@ MODEL_ORCHESTRATOR = os.getenv("MODEL_ORCHESTRATOR")
 MODEL_SPECIALIST = os.getenv("MODEL_SPECIALIST")
 SUPABASE_URL=os.getenv("SUPABASE_URL")
 SUPABASE_KEY=os.getenv("SUPABASE_KEY")
+# Pool HTTP của AsyncClient dùng chung cho các repository async
+SUPABASE_MAX_CONNECTIONS = int(os.getenv("SUPABASE_MAX_CONNECTIONS", "50"))
+SUPABASE_KEEPALIVE_EXPIRY_SECONDS = float(os.getenv("SUPABASE_KEEPALIVE_EXPIRY_SECONDS", "60"))
+SUPABASE_TIMEOUT_SECONDS = float(os.getenv("SUPABASE_TIMEOUT_SECONDS", "10"))
 
-def get_supabase_client() -> Client:
+def get_supabase_client() -> "Client":
     """
     Initializes and returns the Supabase client.
     """
+    from supabase import create_client
+    from repository.instrumentation import REPO_INSTRUMENTATION, record_response_bytes
+
     if not SUPABASE_URL or not SUPABASE_KEY:
         raise ValueError("Supabase URL and Key must be set in the .env file.")
-        
-    return create_client(SUPABASE_URL, SUPABASE_KEY)
 
-async def get_async_supabase_client() -> AsyncClient:
+    client = create_client(SUPABASE_URL, SUPABASE_KEY)
+    if REPO_INSTRUMENTATION:
+        client.postgrest.session.event_hooks["response"].append(record_response_bytes)
+    return client
+
+def create_async_supabase_client() -> "AsyncClient":
     """
-    Initializes and returns the Supabase client.
+    Initializes and returns the async Supabase client.
+
+    PostgREST dùng một `httpx.AsyncClient` (HTTP/2, keep-alive) với pool giới hạn bởi
+    SUPABASE_MAX_CONNECTIONS, để các lượt chat đồng thời dùng lại kết nối thay vì
+    bắt tay TCP+TLS cho mỗi request. Hook "response" đo kích thước body cho
+    `repo_metrics`.
     """
+    import httpx
+    from supabase import AsyncClient, AsyncClientOptions
+    from repository.instrumentation import REPO_INSTRUMENTATION, arecord_response_bytes
+
     if not SUPABASE_URL or not SUPABASE_KEY:
         raise ValueError("Supabase URL and Key must be set in the .env file.")
-        
-    return await acreate_client(SUPABASE_URL, SUPABASE_KEY)
 
-def get_openai_embeddings() -> OpenAIEmbeddings:
+    http_client = httpx.AsyncClient(
+        http2=True,
+        follow_redirects=True,
+        timeout=httpx.Timeout(SUPABASE_TIMEOUT_SECONDS),
+        limits=httpx.Limits(
+            max_connections=SUPABASE_MAX_CONNECTIONS,
+            max_keepalive_connections=SUPABASE_MAX_CONNECTIONS,
+            keepalive_expiry=SUPABASE_KEEPALIVE_EXPIRY_SECONDS
+        ),
+        event_hooks={"response": [arecord_response_bytes]} if REPO_INSTRUMENTATION else None
+    )
+    return AsyncClient(SUPABASE_URL, SUPABASE_KEY, AsyncClientOptions(httpx_client=http_client))
+
+async def start_async_supabase_client():
+    """
+    Tạo AsyncClient dùng chung từ lifespan của app. Import SDK supabase chạy ở thread
+    nền để không làm chậm startup.
+    """
+    await asyncio.to_thread(async_supabase_provider.get)
+
+async def close_async_supabase_client():
+    """Đóng pool HTTP của AsyncClient khi app tắt."""
+    if async_supabase_provider.initialized:
+        await async_supabase_provider.get().postgrest.aclose()
+        async_supabase_provider.reset()
+
+def get_openai_embeddings() -> "OpenAIEmbeddings":
     """
     Initializes and returns the OpenAI Embeddings model.
-    """ 
+    """
+    from langchain_openai import OpenAIEmbeddings
+
     return OpenAIEmbeddings(model=MODEL_EMBEDDING)
 
-def get_orchestrator_llm() -> ChatOpenAI:
+def get_orchestrator_llm() -> "ChatOpenAI":
     """
     Initializes and returns the Gemini LLM for orchestration (fast and cheap).
     """
+    from langchain_openai import ChatOpenAI
+
     return ChatOpenAI(model=MODEL_ORCHESTRATOR)
 
 
-def get_specialist_llm() -> ChatOpenAI:
+def get_specialist_llm() -> "ChatOpenAI":
     """
     Initializes and returns the Gemini LLM for specialist tasks (powerful).
     """
+    from langchain_openai import ChatOpenAI
+
     return ChatOpenAI(
         model=MODEL_SPECIALIST,
         temperature=0,
         # max_retries=2
     )
 
-# Initialize clients
-supabase_client = get_supabase_client()
-embeddings_model = get_openai_embeddings()
-orchestrator_llm = get_orchestrator_llm()
-specialist_llm = get_specialist_llm()
+# Client providers: kết nối ở lần dùng đầu tiên, không phải lúc import
+supabase_provider = ClientProvider(get_supabase_client, name="supabase")
+async_supabase_provider = ClientProvider(create_async_supabase_client, name="async_supabase")
+embeddings_provider = ClientProvider(get_openai_embeddings, name="openai_embeddings")
+orchestrator_llm_provider = ClientProvider(get_orchestrator_llm, name="orchestrator_llm")
+specialist_llm_provider = ClientProvider(get_specialist_llm, name="specialist_llm")
 
+# Giữ tên cũ cho các module đang import trực tiếp
+supabase_client = LazyClientProxy(supabase_provider)
+async_supabase_client = LazyClientProxy(async_supabase_provider)
+embeddings_model = LazyClientProxy(embeddings_provider)
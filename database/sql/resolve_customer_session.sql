@@ -0,0 +1,106 @@
+-- Một lần gọi RPC thay cho chuỗi find_customer -> create_customer -> create_session
+-- -> create_event -> find_customer (hoặc update_last_active_session / đổi session khi khách
+-- quay lại sau p_n_days ngày). Chạy trong một transaction:
+--   1. Lấy hoặc tạo customer theo chat_id (khoá dòng customer để các request cùng chat_id chạy tuần tự).
+--   2. Không có session active -> tạo session mới (p_thread_id) + event 'new_customer'.
+--      Session quá p_n_days ngày -> đóng session cũ, tạo session mới + event 'returning_customer'.
+--      Ngược lại -> cập nhật last_active_at.
+--   3. Trả về customer + session active + state (snapshot và các delta chưa gộp).
+--
+-- Nếu p_cached_session_id/p_cached_seq khớp session và seq hiện tại thì không gửi lại state
+-- (session có "state_cached": true), app dùng state đang có trong cache.
+--
+-- Cần chạy session_state_deltas.sql trước (cột sessions.state_seq, bảng session_state_deltas).
+create or replace function resolve_customer_session(
+    p_chat_id text,
+    p_thread_id text,
+    p_n_days integer,
+    p_cached_session_id bigint default null,
+    p_cached_seq integer default null
+) returns jsonb
+language plpgsql
+as $$
+declare
+    v_customer customers;
+    v_session sessions;
+    v_now timestamptz := now();
+    v_new_customer boolean := false;
+    v_ended_thread_id text;
+    v_event_type text;
+    v_seq integer;
+    v_session_json jsonb;
+begin
+    insert into customers (chat_id)
+    values (p_chat_id)
+    on conflict (chat_id) do nothing
+    returning * into v_customer;
+
+    if found then
+        v_new_customer := true;
+    else
+        select * into v_customer
+        from customers
+        where chat_id = p_chat_id
+        for update;
+    end if;
+
+    select * into v_session
+    from sessions
+    where customer_id = v_customer.id and status = 'active'
+    order by id desc
+    limit 1
+    for update;
+
+    if not found then
+        v_event_type := 'new_customer';
+    elsif v_session.last_active_at < v_now - make_interval(days => p_n_days) then
+        update sessions
+        set status = 'inactive', ended_at = v_now
+        where id = v_session.id;
+
+        v_ended_thread_id := v_session.thread_id;
+        v_event_type := 'returning_customer';
+    else
+        update sessions
+        set last_active_at = v_now
+        where id = v_session.id
+        returning * into v_session;
+    end if;
+
+    if v_event_type is not null then
+        insert into sessions (customer_id, thread_id, started_at, last_active_at, status)
+        values (v_customer.id, p_thread_id, v_now, v_now, 'active')
+        returning * into v_session;
+
+        insert into events (customer_id, session_id, event_type, "timestamp")
+        values (v_customer.id, v_session.id, v_event_type, v_now);
+    end if;
+
+    select coalesce(max(seq), v_session.state_seq) into v_seq
+    from session_state_deltas
+    where session_id = v_session.id and seq > v_session.state_seq;
+
+    v_session_json := to_jsonb(v_session);
+    if v_session.id = p_cached_session_id and v_seq = p_cached_seq then
+        v_session_json := (v_session_json - 'state_base64') || jsonb_build_object('state_cached', true);
+    else
+        v_session_json := v_session_json || jsonb_build_object(
+            'session_state_deltas',
+            coalesce(
+                (
+                    select jsonb_agg(jsonb_build_object('seq', d.seq, 'payload', d.payload) order by d.seq)
+                    from session_state_deltas d
+                    where d.session_id = v_session.id and d.seq > v_session.state_seq
+                ),
+                '[]'::jsonb
+            )
+        );
+    end if;
+
+    return jsonb_build_object(
+        'customer', to_jsonb(v_customer) || jsonb_build_object('sessions', jsonb_build_array(v_session_json)),
+        'new_customer', v_new_customer,
+        'ended_thread_id', v_ended_thread_id
+    );
+end;
+$$;
@@ -0,0 +1,13 @@
+-- Lưu state theo delta: sessions.state_base64 là snapshot đã gộp tới sessions.state_seq,
+-- mỗi lượt chat sau đó chỉ thêm một dòng delta (message mới + field đổi giá trị).
+alter table public.sessions
+    add column if not exists state_seq integer not null default 0;
+
+create table if not exists public.session_state_deltas (
+    id bigint generated always as identity primary key,
+    session_id bigint not null references public.sessions (id) on delete cascade,
+    seq integer not null,
+    payload text not null,
+    created_at timestamptz not null default now(),
+    unique (session_id, seq)
+);
@@ -1,15 +1,13 @@
 import os
 import time
 import json
-import gspread
 from typing import Literal
 from datetime import datetime
 from zoneinfo import ZoneInfo
 from dotenv import load_dotenv
-from googleapiclient.discovery import build
-from google.oauth2.service_account import Credentials
 
 from core.utils.function import convert_date_str
+from database.client_provider import ClientProvider
 from log.logger_config import setup_logging
 
 logger = setup_logging(__name__)
@@ -32,6 +30,10 @@ class SheetLogger:
         self._connect()
 
     def _connect(self):
+        # Import khi kết nối: gspread/google SDK khá nặng và chỉ cần khi ghi sheet
+        import gspread
+        from google.oauth2.service_account import Credentials
+
         scopes = [
             'https://www.googleapis.com/auth/spreadsheets',
             'https://www.googleapis.com/auth/drive'
@@ -106,6 +108,10 @@ class DemoLogger:
         self._connect()
 
     def _connect(self):
+        import gspread
+        from googleapiclient.discovery import build
+        from google.oauth2.service_account import Credentials
+
         scopes = [
             'https://www.googleapis.com/auth/spreadsheets',
             'https://www.googleapis.com/auth/drive'
@@ -262,4 +268,8 @@ class DemoLogger:
                 self._merge_main_info_cells(start_row, len(rows_to_append))
                 
             except Exception as e2:
-                logger.error(f"Second fallback failed: {e2}")
\ No newline at end of file
+                logger.error(f"Second fallback failed: {e2}")
+
+# Kết nối Google Sheets ở lần ghi đầu tiên: app khởi động được cả khi Sheets không truy cập được
+sheet_logger_provider = ClientProvider(SheetLogger, name="sheet_logger")
+demo_logger_provider = ClientProvider(DemoLogger, name="demo_logger")
\ No newline at end of file
@@ -1,33 +1,37 @@
+import asyncio
 import uvicorn
 from fastapi import FastAPI
 from contextlib import asynccontextmanager
 from fastapi.middleware.cors import CORSMiddleware
 
-from core.graph.build_graph import create_main_graph
+from core.graph.graph_dependencies import start_graph_build
+from database.connection import start_async_supabase_client, close_async_supabase_client
 
 from api.chatbot.v4.routes import router as api_router_v4
 from api.chatbot.v5.routes import router as api_chatbot_router_v5
 
 from api.admin.v1.routes import router as api_admin_router_v1
 
-# @asynccontextmanager
-# async def lifespan(app: FastAPI):
-#     # Startup
-#     graph = create_main_graph()
-#     app.state.graph = graph
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Startup: một graph dùng chung cho mọi router, lấy qua graph_dependencies.get_graph
+    start_graph_build(app)
+    # AsyncClient + pool HTTP dùng chung cho các repository async, tạo nền như graph
+    app.state.supabase_task = asyncio.create_task(start_async_supabase_client())
     
-#     # Start cleanup task
-#     graph.cleanup_manager.start_cleanup_task()
+    # Start cleanup task
+    # graph.cleanup_manager.start_cleanup_task()
     
-#     yield
+    yield
     
-#     # Shutdown
-#     graph.cleanup_manager.stop_cleanup_task()
+    # Shutdown
+    # graph.cleanup_manager.stop_cleanup_task()
+    await close_async_supabase_client()
 
 # Create a FastAPI app instance
 app = FastAPI(
     title="Chatbot customer service project", 
-    # lifespan=lifespan
+    lifespan=lifespan
 )
 
 # Add CORS middleware to allow cross-origin requests
@@ -1,11 +1,10 @@
-import pickle
-import base64
 from zoneinfo import ZoneInfo
 from datetime import datetime, timezone
-from supabase import AsyncClient, Client
-from database.connection import supabase_client
-
-from database.connection import get_async_supabase_client
+from database.connection import async_supabase_client
+from core.graph.state_codec import LazyState, encode_state, decode_state
+from repository.customer_cache import customer_cache
+from repository.span_index import last_outbound_span_index
+from repository.instrumentation import instrument_repo, mark_cached
 
 VALID_EVENT_TYPES = {
     "new_customer", 
@@ -14,9 +13,6 @@ VALID_EVENT_TYPES = {
     "bot_response_failure",
 }
 
-async def _create_async_supabase_client() -> AsyncClient:
-    return await get_async_supabase_client()
-
 def _get_time_vn() -> str:
     tz_vn = ZoneInfo("Asia/Ho_Chi_Minh")
     now_vn = datetime.now(tz_vn)
@@ -41,27 +37,37 @@ def _to_vn(dt_str_or_dt) -> str:
     
     return dt_vn
 
-def _encode_state(state: dict) -> str:
-    dumps = pickle.dumps(state)
-    encoded = base64.b64encode(dumps).decode("utf-8")
+def _normalize_session(session: dict) -> dict:
+    session["started_at"] = _to_vn(session["started_at"]) 
+    session["last_active_at"] = _to_vn(session["last_active_at"]) 
+    # State = snapshot + các delta chưa gộp, chỉ replay khi được dùng tới
+    session["state_base64"] = LazyState(
+        session.get("state_base64"),
+        snapshot_seq=session.get("state_seq"),
+        deltas=session.pop("session_state_deltas", None)
+    )
     
-    return encoded
+    return session
 
-def _decode_state(data: str) -> dict:
-    if not data:
-        return {}
-    
-    dumps = base64.b64decode(data.encode("utf-8"))
-    state = pickle.loads(dumps)
-    
-    return state
+def event_row(customer_id: int, session_id: int, event_type: str) -> dict:
+    """Dòng `events` với thời điểm hiện tại (giờ VN), dùng cho insert trực tiếp hoặc theo lô."""
+    if event_type not in VALID_EVENT_TYPES:
+        raise ValueError(f"Invalid event_type: {event_type}. Must be one of {VALID_EVENT_TYPES}")
+
+    return {
+        "customer_id": customer_id,
+        "session_id": session_id,
+        "event_type": event_type,
+        "timestamp": _get_time_vn()
+    }
 
+@instrument_repo
 class AsyncCustomerRepo:
     def __init__(self):
-        self.supabase_client = supabase_client
+        self.supabase_client = async_supabase_client
         
     async def get_uuid(self, chat_id: str) -> str | None:
-        response = (
+        response = await (
             self.supabase_client.table("customers")
             .select("uuid")
             .eq("chat_id", chat_id).execute()
@@ -70,7 +76,7 @@ class AsyncCustomerRepo:
         return response.data[0]["uuid"] if response.data else None
     
     async def get_or_create_customer(self, chat_id: str) -> dict | None:
-        response = (
+        response = await (
             self.supabase_client.table("customers")
             .upsert(
                 {"chat_id": chat_id},
@@ -82,16 +88,19 @@ class AsyncCustomerRepo:
         return response.data[0] if response.data else None
 
     async def delete_customer(self, customer_id: int) -> bool:
-        response = (
+        response = await (
             self.supabase_client.table("customers")
             .delete()
             .eq("id", customer_id)
             .execute()
         )
+        customer_cache.invalidate_customer(customer_id)
+        last_outbound_span_index.forget(customer_id)
+        
         return bool(response.data)
     
     async def update_uuid(self, chat_id: str, new_uuid: str) -> str | None:
-        response = (
+        response = await (
             self.supabase_client.table("customers")
             .update({"uuid": new_uuid})
             .eq("chat_id", chat_id)
@@ -101,9 +110,14 @@ class AsyncCustomerRepo:
         return response.data[0]["uuid"] if response.data else None
     
     async def find_customer(self, chat_id: str) -> dict | None:
-        response = (
+        cached = customer_cache.get(chat_id)
+        if cached is not None:
+            mark_cached()
+            return cached
+        
+        response = await (
             self.supabase_client.table("customers")
-            .select("*, sessions(*)")
+            .select("*, sessions(*, session_state_deltas(seq, payload))")
             .eq("chat_id", chat_id)
             .eq("sessions.status", "active")
             .execute()
@@ -112,16 +126,61 @@ class AsyncCustomerRepo:
         if not response.data:
             return None
         
-        if response.data[0]["sessions"]:
-            session = response.data[0]["sessions"][0]
-            session["started_at"] = _to_vn(session["started_at"]) 
-            session["last_active_at"] = _to_vn(session["last_active_at"]) 
-            session["state_base64"] = _decode_state(session["state_base64"])
+        customer = response.data[0]
+        for session in customer["sessions"]:
+            _normalize_session(session)
+        customer_cache.put(chat_id, customer)
         
-        return response.data[0]
+        return customer
     
+    async def resolve_customer_session(
+        self,
+        chat_id: str,
+        thread_id: str,
+        n_days: int
+    ) -> tuple[dict, bool, str | None] | None:
+        """
+        Gọi RPC `resolve_customer_session` (database/sql/resolve_customer_session.sql):
+        lấy/tạo customer, đổi hoặc cập nhật session active, ghi event trong một round trip.
+
+        Args:
+            thread_id (str): thread_id dùng khi phải tạo session mới.
+            n_days (int): Session không hoạt động quá số ngày này thì được thay bằng session mới.
+
+        Returns:
+            (customer, new_customer, ended_thread_id) với customer có đúng một session active.
+        """
+        cached = customer_cache.get(chat_id)
+        cached_session = cached["sessions"][0] if cached and cached["sessions"] else None
+        cached_state = cached_session["state_base64"] if cached_session else None
+
+        response = await self.supabase_client.rpc(
+            "resolve_customer_session",
+            {
+                "p_chat_id": chat_id,
+                "p_thread_id": thread_id,
+                "p_n_days": n_days,
+                "p_cached_session_id": cached_session["id"] if cached_session else None,
+                "p_cached_seq": cached_state.seq if isinstance(cached_state, LazyState) else None,
+            }
+        ).execute()
+
+        if not response.data:
+            return None
+
+        customer = response.data["customer"]
+        session = customer["sessions"][0]
+        # DB xác nhận state trong cache vẫn mới nhất -> không gửi lại state
+        state_cached = session.pop("state_cached", False)
+        _normalize_session(session)
+        if state_cached:
+            session["state_base64"] = cached_state
+        customer_cache.put(chat_id, customer)
+
+        return customer, response.data["new_customer"], response.data["ended_thread_id"]
+
     async def create_customer(self, chat_id: str) -> dict | None:
-        response = (
+        response = await (
             self.supabase_client.table("customers")
             .insert({"chat_id": chat_id})
             .execute()
@@ -130,20 +189,24 @@ class AsyncCustomerRepo:
         return response.data[0] if response.data else None
     
     async def update_customer(self, chat_id: str, payload: dict) -> dict | None:
-        response = (
+        response = await (
             self.supabase_client.table("customers")
             .update(payload)
             .eq("chat_id", chat_id)
             .execute()
         )
+        # Admin tiếp quản / bàn giao lại: lượt sau đọc lại control_mode từ DB
+        customer_cache.invalidate(chat_id)
+
+        return response.data[0] if response.data else None
 
-        return response.data[0] if response.data else None        
+@instrument_repo
 class AsyncSessionRepo:
     def __init__(self):
-        self.supabase_client = supabase_client
+        self.supabase_client = async_supabase_client
         
     async def create_session(self, customer_id: int, thread_id: str) -> dict | None:
-        response = (
+        response = await (
             self.supabase_client.table("sessions")
             .insert(
                 {
@@ -156,11 +219,18 @@ class AsyncSessionRepo:
             )
             .execute()
         )
+        if not response.data:
+            return None
+        
+        customer_cache.add_session(
+            customer_id=customer_id,
+            session=_normalize_session(dict(response.data[0]))
+        )
 
-        return response.data[0] if response.data else None
+        return response.data[0]
     
     async def update_end_session(self, session_id: int) -> dict | None:
-        response = (
+        response = await (
             self.supabase_client.table("sessions")
             .update(
                 {
@@ -171,11 +241,12 @@ class AsyncSessionRepo:
             .eq("id", session_id)
             .execute()
         )
+        customer_cache.end_session(session_id)
 
         return response.data[0] if response.data else None
     
     async def update_last_active_session(self, session_id: int) -> dict | None:
-        response = (
+        response = await (
             self.supabase_client.table("sessions")
             .update(
                 {
@@ -185,25 +256,82 @@ class AsyncSessionRepo:
             .eq("id", session_id)
             .execute()
         )
+        if not response.data:
+            return None
+        
+        customer_cache.update_session(
+            session_id=session_id,
+            fields={"last_active_at": _to_vn(response.data[0]["last_active_at"])}
+        )
 
-        return response.data[0] if response.data else None
+        return response.data[0]
     
     async def update_state_session(self, state: dict, session_id: int) -> dict | None:
-        response = (
+        response = await (
             self.supabase_client.table("sessions")
             .update(
                 {
-                    "state_base64": _encode_state(state=state)
+                    "state_base64": encode_state(state=state)
                 }
             )
             .eq("id", session_id)
             .execute()
         )
+        customer_cache.invalidate_session(session_id)
 
         return response.data[0] if response.data else None
     
+    async def append_state_delta(self, session_id: int, seq: int, delta: dict) -> dict | None:
+        """Ghi phần thay đổi của một lượt chat (message mới + field đổi giá trị)."""
+        payload = encode_state(state=delta)
+        response = await (
+            self.supabase_client.table("session_state_deltas")
+            .insert(
+                {
+                    "session_id": session_id,
+                    "seq": seq,
+                    "payload": payload
+                }
+            )
+            .execute()
+        )
+        if not response.data:
+            return None
+        
+        customer_cache.append_state_delta(session_id=session_id, seq=seq, payload=payload, delta=delta)
+
+        return response.data[0]
+    
+    async def compact_state_session(self, state: dict, session_id: int, seq: int) -> dict | None:
+        """Ghi snapshot đầy đủ tới `seq` rồi xoá các delta đã gộp vào snapshot."""
+        data = encode_state(state=state)
+        response = await (
+            self.supabase_client.table("sessions")
+            .update(
+                {
+                    "state_base64": data,
+                    "state_seq": seq
+                }
+            )
+            .eq("id", session_id)
+            .execute()
+        )
+        if not response.data:
+            return None
+        
+        await (
+            self.supabase_client.table("session_state_deltas")
+            .delete()
+            .eq("session_id", session_id)
+            .lte("seq", seq)
+            .execute()
+        )
+        customer_cache.replace_state(session_id=session_id, data=data, seq=seq, state=state)
+
+        return response.data[0]
+    
     async def get_state_session(self, session_id: int) -> dict | None:
-        response = (
+        response = await (
             self.supabase_client.table("sessions")
             .select("state_base64")
             .eq("id", session_id)
@@ -214,34 +342,35 @@ class AsyncSessionRepo:
         if not data:
             return None
 
-        return _decode_state(data=data)
+        return decode_state(data=data)
     
+@instrument_repo
 class AsyncEventRepo:
     def __init__(self):
-        self.supabase_client = supabase_client
+        self.supabase_client = async_supabase_client
         
     async def create_event(self, customer_id: int, session_id: int, event_type: str) -> str | None:
-        if event_type not in VALID_EVENT_TYPES:
-            raise ValueError(f"Invalid event_type: {event_type}. Must be one of {VALID_EVENT_TYPES}")
-
-        response = (
+        response = await (
             self.supabase_client.table("events")
-            .insert(
-                {
-                    "customer_id": customer_id,
-                    "session_id": session_id,
-                    "event_type": event_type,
-                    "timestamp": _get_time_vn()
-                }
-            )
+            .insert(event_row(customer_id=customer_id, session_id=session_id, event_type=event_type))
             .execute()
         )
         
         return response.data[0] if response.data else None
     
+    async def create_event_bulk(self, events: list[dict]) -> list[dict] | None:
+        response = await (
+            self.supabase_client.table("events")
+            .insert(events)
+            .execute()
+        )
+
+        return response.data if response.data else None
+    
+@instrument_repo
 class AsyncMessageSpanRepo:
     def __init__(self):
-        self.supabase_client = supabase_client
+        self.supabase_client = async_supabase_client
         
     async def create_message_span(
         self, 
@@ -249,7 +378,7 @@ class AsyncMessageSpanRepo:
         sender: str, 
         content: str
     ) -> dict | None:
-        response = (
+        response = await (
             self.supabase_client.table("messages")
             .insert(
                 {
@@ -268,7 +397,7 @@ class AsyncMessageSpanRepo:
         self,
         message_spans: list[dict]
     ) -> list[dict] | None:
-        response = (
+        response = await (
             self.supabase_client.table("message_spans")
             .insert(message_spans)
             .execute()
@@ -278,7 +407,7 @@ class AsyncMessageSpanRepo:
     
     async def get_latest_event_and_bot_span(self, customer_id: int) -> dict:
         # 1. Lấy bản ghi event mới nhất cho customer_id
-        r1 = (
+        r1 = await (
             self.supabase_client
             .table("events")
             .select("customer_id, session_id")
@@ -293,7 +422,7 @@ class AsyncMessageSpanRepo:
         session_id = event["session_id"]
 
         # 2. Lấy bot span mới nhất cho session đó và direction = 'outbound'
-        r2 = (
+        r2 = await (
             self.supabase_client
             .table("message_spans")
             .select("id, timestamp_end")
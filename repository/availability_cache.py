@@ -0,0 +1,143 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Callable
+
+from dotenv import load_dotenv
+
+if TYPE_CHECKING:
+    from core.utils.availability import DayAvailability
+
+load_dotenv()
+
+AVAILABILITY_CACHE_TTL_SECONDS = float(os.getenv("AVAILABILITY_CACHE_TTL_SECONDS", "30"))
+AVAILABILITY_CACHE_MAX_DATES = int(os.getenv("AVAILABILITY_CACHE_MAX_DATES", "64"))
+
+
+@dataclass
+class DaySchedule:
+    """Dữ liệu để kiểm tra lịch trống của một ngày: phòng, nhân viên, lịch hẹn và index."""
+    booking_date: str
+    rooms: dict | None
+    staffs: dict | None
+    orders: list[dict] | None
+    availability: "DayAvailability"
+
+
+class AvailabilityCache:
+    """
+    Cache LRU + TTL theo booking_date của `DaySchedule`, để các lần gọi
+    `check_available_booking_tool` liên tiếp (khách đổi giờ nhiều lần trong một lượt)
+    không đọc lại rooms/staffs/appointments và dựng lại index.
+
+    `AppointmentRepo` báo mọi lần ghi lịch hẹn (tạo, đổi giờ, huỷ) qua `invalidate_date` /
+    `invalidate_appointment`: ngày mới trong payload và ngày cũ của lịch hẹn (tra từ các
+    lịch hẹn đang được cache) đều bị bỏ. TTL giới hạn độ cũ khi DB bị sửa từ nơi khác.
+
+    Lần đọc DB đang chạy mà có invalidation xen vào thì kết quả không được lưu, tránh
+    ghi đè entry bằng dữ liệu cũ. `ttl_s <= 0` tắt cache.
+    """
+    def __init__(self, ttl_s: float = AVAILABILITY_CACHE_TTL_SECONDS, max_dates: int = AVAILABILITY_CACHE_MAX_DATES):
+        self.ttl_s = ttl_s
+        self.max_dates = max_dates
+        self._entries: OrderedDict[str, tuple[DaySchedule, float]] = OrderedDict()
+        self._appointment_dates: dict[int, str] = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.discarded_loads = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_s > 0
+
+    def get_or_load(self, booking_date: str, loader: Callable[[], DaySchedule]) -> DaySchedule:
+        booking_date = str(booking_date)
+        if not self.enabled:
+            return loader()
+
+        with self._lock:
+            entry = self._entries.get(booking_date)
+            if entry is not None and time.monotonic() >= entry[1]:
+                self._remove(booking_date)
+                self.expirations += 1
+                entry = None
+
+            if entry is not None:
+                self._entries.move_to_end(booking_date)
+                self.hits += 1
+                return entry[0]
+
+            self.misses += 1
+            generation = self._generation
+
+        schedule = loader()
+
+        with self._lock:
+            if generation != self._generation:
+                self.discarded_loads += 1
+                return schedule
+
+            self._remove(booking_date)
+            self._entries[booking_date] = (schedule, time.monotonic() + self.ttl_s)
+            for order in schedule.orders or []:
+                self._appointment_dates[order["id"]] = booking_date
+            while len(self._entries) > self.max_dates:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+        return schedule
+
+    def invalidate_date(self, booking_date: str | None):
+        with self._lock:
+            self._generation += 1
+            if booking_date is not None and self._remove(str(booking_date)):
+                self.invalidations += 1
+
+    def invalidate_appointment(self, appointment_id: int):
+        """Bỏ ngày đang chứa lịch hẹn này (ngày cũ khi lịch bị đổi/huỷ)."""
+        with self._lock:
+            self._generation += 1
+            booking_date = self._appointment_dates.get(appointment_id)
+            if booking_date is not None and self._remove(booking_date):
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._appointment_dates.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "dates": len(self._entries),
+            "max_dates": self.max_dates,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else None,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "discarded_loads": self.discarded_loads,
+        }
+
+    def _remove(self, booking_date: str) -> bool:
+        entry = self._entries.pop(booking_date, None)
+        if entry is None:
+            return False
+
+        for order in entry[0].orders or []:
+            self._appointment_dates.pop(order["id"], None)
+        return True
+
+
+availability_cache = AvailabilityCache()
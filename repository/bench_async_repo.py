@@ -0,0 +1,214 @@
+"""
+Benchmark: độ trễ event loop và throughput khi nhiều lượt chat cùng gọi repository async,
+giữa client Supabase sync gọi trong `async def` (chặn event loop, như trước đây) và
+AsyncClient dùng chung với pool HTTP (`database.connection.create_async_supabase_client`).
+
+Mỗi lượt chat gọi đúng các request DB của một tin nhắn: find_customer,
+update_last_active_session, append_state_delta, create_message_span_bulk, create_event.
+PostgREST được thay bằng một server HTTP local (process riêng) trả về sau `--db-ms` ms. Cache customer bị
+tắt để mọi lượt đều đi qua DB.
+
+Chạy từ thư mục gốc của repo:
+    python -m repository.bench_async_repo --chats 100 --db-ms 20
+"""
+import os
+import json
+import time
+import socket
+import asyncio
+import argparse
+import multiprocessing
+from statistics import mean, quantiles
+
+import uvicorn
+
+# Client Supabase đọc URL/KEY lúc import database.connection
+PORT = int(os.getenv("BENCH_POSTGREST_PORT", "0"))
+if not PORT:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        PORT = sock.getsockname()[1]
+os.environ["SUPABASE_URL"] = f"http://127.0.0.1:{PORT}"
+os.environ.setdefault("SUPABASE_KEY", "bench")
+
+import database.connection as connection
+from repository.customer_cache import customer_cache
+from repository.async_repo import AsyncCustomerRepo, AsyncEventRepo, AsyncMessageSpanRepo, AsyncSessionRepo
+
+TIMESTAMP = "2025-10-01T03:00:00+00:00"
+
+
+def fake_postgrest(db_ms: float):
+    """ASGI app giả lập PostgREST: trả về dòng dữ liệu hợp lệ sau `db_ms` ms."""
+    async def app(scope, receive, send):
+        if scope["type"] != "http":
+            return
+
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+
+        await asyncio.sleep(db_ms / 1000)
+        table = scope["path"].rsplit("/", 1)[-1]
+        if scope["method"] == "GET":
+            rows = [{
+                "id": 1,
+                "chat_id": "bench",
+                "sessions": [{
+                    "id": 1,
+                    "thread_id": "bench",
+                    "started_at": TIMESTAMP,
+                    "last_active_at": TIMESTAMP,
+                    "status": "active",
+                    "state_base64": None,
+                    "state_seq": 0,
+                    "session_state_deltas": [],
+                }],
+            }]
+        else:
+            payload = json.loads(body or b"{}")
+            rows = payload if isinstance(payload, list) else [payload]
+            rows = [{"id": index + 1, "last_active_at": TIMESTAMP, **row} for index, row in enumerate(rows)]
+            if table == "sessions":
+                rows[0]["id"] = 1
+
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", b"application/json")],
+        })
+        await send({"type": "http.response.body", "body": json.dumps(rows).encode()})
+
+    return app
+
+
+def _serve(db_ms: float):
+    uvicorn.run(fake_postgrest(db_ms), host="127.0.0.1", port=PORT, log_level="error")
+
+
+class _BlockingQuery:
+    """Builder của client sync: `execute()` chạy ngay (chặn event loop) rồi trả về awaitable."""
+    def __init__(self, builder):
+        self._builder = builder
+
+    def __getattr__(self, name):
+        attr = getattr(self._builder, name)
+        if name == "execute":
+            def execute():
+                response = attr()
+                future = asyncio.get_running_loop().create_future()
+                future.set_result(response)
+                return future
+            return execute
+        return lambda *args, **kwargs: _BlockingQuery(attr(*args, **kwargs))
+
+
+class BlockingClient:
+    """Cách các repository async dùng client Supabase sync trước đây."""
+    def __init__(self, client):
+        self._client = client
+
+    def table(self, name: str):
+        return _BlockingQuery(self._client.table(name))
+
+    def rpc(self, fn: str, params: dict):
+        return _BlockingQuery(self._client.rpc(fn, params))
+
+
+async def one_chat(repos: dict, index: int):
+    chat_id = f"bench-{index}"
+    customer = await repos["customer"].find_customer(chat_id=chat_id)
+    session = customer["sessions"][0]
+    await repos["session"].update_last_active_session(session_id=session["id"])
+    await repos["session"].append_state_delta(session_id=session["id"], seq=index + 1, delta={"messages": []})
+    await repos["span"].create_message_span_bulk([
+        {"session_id": session["id"], "direction": direction, "content": "Dạ em chào anh/chị ạ"}
+        for direction in ("inbound", "outbound")
+    ])
+    await repos["event"].create_event(customer_id=customer["id"], session_id=session["id"], event_type="bot_response_success")
+
+
+async def _measure_lag(stop: asyncio.Event, lags: list[float], interval_s: float = 0.005):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval_s)
+        lags.append((time.perf_counter() - started - interval_s) * 1000)
+
+
+async def run(client, chats: int) -> dict:
+    repos = {
+        "customer": AsyncCustomerRepo(),
+        "session": AsyncSessionRepo(),
+        "event": AsyncEventRepo(),
+        "span": AsyncMessageSpanRepo(),
+    }
+    for repo in repos.values():
+        repo.supabase_client = client
+
+    # Làm nóng kết nối
+    await one_chat(repos, 0)
+
+    lags: list[float] = []
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(_measure_lag(stop, lags))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one_chat(repos, index) for index in range(chats)))
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    await lag_task
+    return {
+        "elapsed_s": elapsed,
+        "throughput": chats / elapsed,
+        "lag_mean_ms": mean(lags),
+        "lag_p99_ms": quantiles(lags, n=100)[-1] if len(lags) > 1 else lags[0],
+        "lag_max_ms": max(lags),
+    }
+
+
+async def main(chats: int, db_ms: float):
+    customer_cache.ttl_s = 0
+
+    # Server chạy ở process riêng để không tranh GIL với client đang đo
+    server = multiprocessing.Process(target=_serve, args=(db_ms,), daemon=True)
+    server.start()
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", PORT), timeout=1).close()
+            break
+        except OSError:
+            await asyncio.sleep(0.05)
+
+    try:
+        results = {
+            "sync client": await run(BlockingClient(connection.get_supabase_client()), chats),
+            "shared AsyncClient": await run(connection.async_supabase_client, chats),
+        }
+    finally:
+        await connection.close_async_supabase_client()
+        server.terminate()
+        server.join()
+
+    print(f"{chats} concurrent chats, 5 DB requests per chat, {db_ms} ms per request")
+    print(
+        f"{'client':<20} | {'total':>8} | {'chats/s':>8} | "
+        f"{'loop lag mean':>13} | {'loop lag p99':>12} | {'loop lag max':>12}"
+    )
+    for name, result in results.items():
+        print(
+            f"{name:<20} | {result['elapsed_s']:>7.2f}s | {result['throughput']:>8.1f} | "
+            f"{result['lag_mean_ms']:>11.1f}ms | {result['lag_p99_ms']:>10.1f}ms | {result['lag_max_ms']:>10.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chats", type=int, default=100)
+    parser.add_argument("--db-ms", type=float, default=20)
+    args = parser.parse_args()
+
+    asyncio.run(main(chats=args.chats, db_ms=args.db_ms))
@@ -0,0 +1,181 @@
+"""
+Benchmark: độ trễ một lượt agent đặt lịch khi bật/tắt `availability_cache`.
+
+Mỗi lượt gọi `check_available_booking_tool` `--checks` lần cho cùng một ngày (khách đổi
+giờ liên tục), lượt thứ `--write-every` kết thúc bằng một lịch hẹn mới cho ngày đó
+(`AppointmentRepo.create_appointment` -> invalidate). PostgREST được thay bằng một
+server HTTP local (process riêng) trả về 8 phòng, 15 nhân viên, 80 lịch hẹn sau `--db-ms` ms.
+
+Chạy từ thư mục gốc của repo:
+    python -m repository.bench_availability_cache --turns 50 --db-ms 20
+"""
+import os
+import json
+import time
+import random
+import socket
+import asyncio
+import argparse
+import multiprocessing
+from statistics import mean, quantiles
+
+import uvicorn
+
+# Client Supabase đọc URL/KEY lúc import database.connection
+PORT = int(os.getenv("BENCH_POSTGREST_PORT", "0"))
+if not PORT:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        PORT = sock.getsockname()[1]
+os.environ["SUPABASE_URL"] = f"http://127.0.0.1:{PORT}"
+os.environ.setdefault("SUPABASE_KEY", "bench")
+
+from core.graph.state import init_state
+from core.tools.booking_tool import appointment_repo, check_available_booking_tool
+from repository.availability_cache import availability_cache
+
+BOOKING_DATE = "2025-10-01"
+
+
+def _day_rows(seed: int = 0) -> dict:
+    rng = random.Random(seed)
+    appointments = []
+    # Phòng 1 và nhân viên 13-15 luôn trống để mọi lần kiểm tra đều tìm được chỗ
+    for appointment_id in range(1, 81):
+        start = rng.randrange(8 * 60, 19 * 60, 15)
+        end = start + rng.choice([30, 60, 90, 120])
+        appointments.append({
+            "id": appointment_id,
+            "staff_id": rng.randint(1, 12),
+            "room_id": rng.randint(2, 8),
+            "start_time": f"{start // 60:02d}:{start % 60:02d}:00",
+            "end_time": f"{end // 60:02d}:{end % 60:02d}:00",
+        })
+    return {
+        "staffs": [{"id": staff_id, "name": f"Nhân viên {staff_id}"} for staff_id in range(1, 16)],
+        "rooms": [{"id": room_id, "name": f"Phòng {room_id}", "capacity": 3} for room_id in range(1, 9)],
+        "appointments": sorted(appointments, key=lambda row: row["start_time"]),
+    }
+
+
+def fake_postgrest(db_ms: float):
+    """ASGI app giả lập PostgREST cho các bảng staffs, rooms, appointments."""
+    tables = _day_rows()
+
+    async def app(scope, receive, send):
+        if scope["type"] != "http":
+            return
+
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+
+        await asyncio.sleep(db_ms / 1000)
+        table = scope["path"].rsplit("/", 1)[-1]
+        if scope["method"] == "GET":
+            rows = tables.get(table, [])
+        else:
+            payload = json.loads(body or b"{}")
+            rows = [{"id": 10_000, **payload}]
+
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", b"application/json")],
+        })
+        await send({"type": "http.response.body", "body": json.dumps(rows).encode()})
+
+    return app
+
+
+def _serve(db_ms: float):
+    uvicorn.run(fake_postgrest(db_ms), host="127.0.0.1", port=PORT, log_level="error")
+
+
+def one_turn(turn: int, checks: int, write: bool) -> float:
+    state = {**init_state(), "total_time": 60}
+    started = time.perf_counter()
+    for check in range(checks):
+        start = 9 * 60 + (turn * checks + check) * 15 % (10 * 60)
+        # Hàm gốc của tool: ToolNode cũng truyền state và tool_call_id như vậy
+        check_available_booking_tool.func(
+            booking_date_new=BOOKING_DATE,
+            start_time_new=f"{start // 60:02d}:{start % 60:02d}:00",
+            total_time=60,
+            k=1,
+            state=state,
+            tool_call_id=f"call-{turn}-{check}"
+        )
+    if write:
+        appointment_repo.create_appointment(appointment_payload={
+            "booking_date": BOOKING_DATE,
+            "room_id": 1,
+            "staff_id": 1,
+            "start_time": "20:15:00",
+            "end_time": "20:45:00",
+            "status": "booked",
+        })
+    return (time.perf_counter() - started) * 1000
+
+
+def run(turns: int, checks: int, write_every: int, ttl_s: float) -> dict:
+    availability_cache.ttl_s = ttl_s
+    availability_cache.clear()
+    one_turn(turn=-1, checks=1, write=False)  # làm nóng kết nối
+
+    latencies = [
+        one_turn(turn=turn, checks=checks, write=(turn + 1) % write_every == 0)
+        for turn in range(turns)
+    ]
+    return {
+        "mean_ms": mean(latencies),
+        "p95_ms": quantiles(latencies, n=20)[-1],
+        "cache": availability_cache.stats(),
+    }
+
+
+def main(turns: int, checks: int, write_every: int, db_ms: float):
+    # Server chạy ở process riêng để không tranh GIL với client đang đo
+    server = multiprocessing.Process(target=_serve, args=(db_ms,), daemon=True)
+    server.start()
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", PORT), timeout=1).close()
+            break
+        except OSError:
+            time.sleep(0.05)
+
+    try:
+        results = {
+            "cache off": run(turns, checks, write_every, ttl_s=0),
+            "cache on": run(turns, checks, write_every, ttl_s=30),
+        }
+    finally:
+        server.terminate()
+        server.join()
+
+    print(
+        f"{turns} turns x {checks} availability checks, a booking every {write_every} turns, "
+        f"{db_ms} ms per DB request"
+    )
+    print(f"{'':<10} | {'turn mean':>9} | {'turn p95':>9} | {'hits':>5} | {'misses':>6} | {'invalidations':>13}")
+    for name, result in results.items():
+        cache = result["cache"]
+        print(
+            f"{name:<10} | {result['mean_ms']:>7.1f}ms | {result['p95_ms']:>7.1f}ms | "
+            f"{cache['hits']:>5} | {cache['misses']:>6} | {cache['invalidations']:>13}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=50)
+    parser.add_argument("--checks", type=int, default=3)
+    parser.add_argument("--write-every", type=int, default=4)
+    parser.add_argument("--db-ms", type=float, default=20)
+    args = parser.parse_args()
+
+    main(turns=args.turns, checks=args.checks, write_every=args.write_every, db_ms=args.db_ms)
@@ -0,0 +1,205 @@
+"""
+Benchmark: thời gian DB của mỗi tin nhắn cho bước lấy customer + session, giữa chuỗi
+request tuần tự cũ (find_customer -> create_customer -> create_session -> create_event
+-> find_customer, hoặc `_handle_old_customer`) và một lần gọi `resolve_customer_session`.
+
+Chạy trên một Postgres local (schema riêng, xoá khi xong). Mỗi câu lệnh là một round
+trip; `--rtt-ms` cộng thêm độ trễ mạng/HTTP của PostgREST cho mỗi round trip. Không
+dùng CustomerSessionCache, nên lượt "active" cũ gồm 3 request (find, update, find).
+
+Chạy từ thư mục gốc của repo:
+    python -m repository.bench_resolve_customer --dsn postgresql://localhost/postgres --chats 200 --rtt-ms 0
+"""
+import os
+import time
+import uuid
+import argparse
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from statistics import mean, quantiles
+
+import psycopg2
+
+SQL_PATH = Path(__file__).resolve().parent.parent / "database" / "sql" / "resolve_customer_session.sql"
+SCHEMA = "bench_resolve_customer"
+N_DAYS = 3
+
+SCHEMA_SQL = f"""
+drop schema if exists {SCHEMA} cascade;
+create schema {SCHEMA};
+set search_path to {SCHEMA};
+
+create table customers (
+    id bigint generated always as identity primary key,
+    chat_id text not null unique,
+    name text,
+    phone text,
+    control_mode text not null default 'bot',
+    created_at timestamptz not null default now()
+);
+create table sessions (
+    id bigint generated always as identity primary key,
+    customer_id bigint not null references customers (id) on delete cascade,
+    thread_id text not null,
+    started_at timestamptz not null,
+    last_active_at timestamptz not null,
+    ended_at timestamptz,
+    status text not null,
+    state_base64 text,
+    state_seq integer not null default 0
+);
+create index on sessions (customer_id, status);
+create table events (
+    id bigint generated always as identity primary key,
+    customer_id bigint not null references customers (id) on delete cascade,
+    session_id bigint references sessions (id) on delete cascade,
+    event_type text not null,
+    "timestamp" timestamptz not null
+);
+create table session_state_deltas (
+    id bigint generated always as identity primary key,
+    session_id bigint not null references sessions (id) on delete cascade,
+    seq integer not null,
+    payload text not null,
+    created_at timestamptz not null default now(),
+    unique (session_id, seq)
+);
+"""
+
+# Tương đương select("*, sessions(*, session_state_deltas(seq, payload))") của find_customer
+FIND_CUSTOMER_SQL = """
+select to_jsonb(c) || jsonb_build_object('sessions', coalesce((
+    select jsonb_agg(to_jsonb(s) || jsonb_build_object('session_state_deltas', coalesce((
+        select jsonb_agg(jsonb_build_object('seq', d.seq, 'payload', d.payload))
+        from session_state_deltas d where d.session_id = s.id
+    ), '[]'::jsonb)))
+    from sessions s where s.customer_id = c.id and s.status = 'active'
+), '[]'::jsonb))
+from customers c where c.chat_id = %s
+"""
+
+
+class RoundTrips:
+    """Mỗi `execute` là một round trip, cộng thêm `rtt_s` giả lập độ trễ PostgREST."""
+    def __init__(self, conn, rtt_s: float):
+        self.conn = conn
+        self.rtt_s = rtt_s
+        self.count = 0
+
+    def execute(self, sql: str, params: tuple = ()):
+        self.count += 1
+        if self.rtt_s:
+            time.sleep(self.rtt_s)
+        with self.conn.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchone() if cursor.description else None
+
+
+def _create_session_and_event(db: RoundTrips, customer_id: int, event_type: str):
+    (session_id,) = db.execute(
+        "insert into sessions (customer_id, thread_id, started_at, last_active_at, status) "
+        "values (%s, %s, now(), now(), 'active') returning id",
+        (customer_id, str(uuid.uuid4()))
+    )
+    db.execute(
+        'insert into events (customer_id, session_id, event_type, "timestamp") values (%s, %s, %s, now())',
+        (customer_id, session_id, event_type)
+    )
+
+
+def sequential(db: RoundTrips, chat_id: str):
+    """Chuỗi request của `_handle_customer` trước khi có RPC."""
+    row = db.execute(FIND_CUSTOMER_SQL, (chat_id,))
+    if row is None:
+        (customer_id,) = db.execute("insert into customers (chat_id) values (%s) returning id", (chat_id,))
+        _create_session_and_event(db, customer_id, "new_customer")
+    else:
+        customer = row[0]
+        session = customer["sessions"][0]
+        # Giống _is_expired_over_n_days_vn: quyết định ở app, không tốn round trip
+        last_active_at = datetime.fromisoformat(session["last_active_at"])
+        if datetime.now(timezone.utc) - last_active_at > timedelta(days=N_DAYS):
+            _create_session_and_event(db, customer["id"], "returning_customer")
+            db.execute(
+                "update sessions set status = 'inactive', ended_at = now() where id = %s", (session["id"],)
+            )
+        else:
+            db.execute("update sessions set last_active_at = now() where id = %s", (session["id"],))
+    return db.execute(FIND_CUSTOMER_SQL, (chat_id,))
+
+
+def rpc(db: RoundTrips, chat_id: str):
+    return db.execute(
+        "select resolve_customer_session(%s, %s, %s)", (chat_id, str(uuid.uuid4()), N_DAYS)
+    )
+
+
+def _expire_sessions(conn, chat_ids: list[str]):
+    """Đẩy last_active_at của session active về quá N_DAYS ngày -> lượt sau là 'returning_customer'."""
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "update sessions s set last_active_at = now() - make_interval(days => %s) "
+            "from customers c where s.customer_id = c.id and c.chat_id = any(%s) and s.status = 'active'",
+            (N_DAYS + 1, chat_ids)
+        )
+
+
+def _run(conn, rtt_s: float, handler, chat_ids: list[str]) -> dict:
+    results = {}
+    for scenario in ("new_customer", "active_session", "returning_customer"):
+        if scenario == "returning_customer":
+            _expire_sessions(conn, chat_ids)
+
+        db = RoundTrips(conn, rtt_s)
+        timings = []
+        for chat_id in chat_ids:
+            started = time.perf_counter()
+            handler(db, chat_id)
+            timings.append((time.perf_counter() - started) * 1000)
+
+        results[scenario] = {
+            "round_trips": db.count / len(chat_ids),
+            "mean_ms": mean(timings),
+            "p95_ms": quantiles(timings, n=20)[-1],
+        }
+    return results
+
+
+def main(dsn: str, chats: int, rtt_ms: float):
+    conn = psycopg2.connect(dsn)
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(SCHEMA_SQL)
+            cursor.execute(SQL_PATH.read_text(encoding="utf-8"))
+
+        rtt_s = rtt_ms / 1000
+        before = _run(conn, rtt_s, sequential, [f"seq-{index}" for index in range(chats)])
+        after = _run(conn, rtt_s, rpc, [f"rpc-{index}" for index in range(chats)])
+
+        print(f"{chats} chats per scenario, simulated RTT {rtt_ms} ms per round trip")
+        print(
+            f"{'scenario':<20} | {'trips before':>12} | {'trips after':>11} | "
+            f"{'mean before':>11} | {'mean after':>10} | {'p95 before':>10} | {'p95 after':>9}"
+        )
+        for scenario in before:
+            b, a = before[scenario], after[scenario]
+            print(
+                f"{scenario:<20} | {b['round_trips']:>12.1f} | {a['round_trips']:>11.1f} | "
+                f"{b['mean_ms']:>9.2f}ms | {a['mean_ms']:>8.2f}ms | "
+                f"{b['p95_ms']:>8.2f}ms | {a['p95_ms']:>7.2f}ms"
+            )
+    finally:
+        with conn.cursor() as cursor:
+            cursor.execute(f"drop schema if exists {SCHEMA} cascade")
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dsn", default=os.getenv("CHECKPOINTER_POSTGRES_DSN"))
+    parser.add_argument("--chats", type=int, default=200)
+    parser.add_argument("--rtt-ms", type=float, default=0)
+    args = parser.parse_args()
+
+    main(dsn=args.dsn, chats=args.chats, rtt_ms=args.rtt_ms)
@@ -0,0 +1,257 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+
+import orjson
+from dotenv import load_dotenv
+
+from core.graph.state_codec import LazyState
+
+load_dotenv()
+
+CUSTOMER_CACHE_TTL_SECONDS = float(os.getenv("CUSTOMER_CACHE_TTL_SECONDS", "60"))
+CUSTOMER_CACHE_MAX_BYTES = int(os.getenv("CUSTOMER_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+
+def _estimate_bytes(customer: dict) -> int:
+    """Ước lượng bộ nhớ của một entry: dòng customer/session dạng JSON + state của session."""
+    size = 0
+    for session in customer.get("sessions") or []:
+        state = session.get("state_base64")
+        if isinstance(state, LazyState):
+            size += state.estimated_bytes()
+        size += len(orjson.dumps(
+            {key: value for key, value in session.items() if key != "state_base64"},
+            default=str
+        ))
+    size += len(orjson.dumps(
+        {key: value for key, value in customer.items() if key != "sessions"},
+        default=str
+    ))
+    return size
+
+
+def _copy_customer(customer: dict) -> dict:
+    """
+    Bản sao của dòng customer và các session (dict/list), để caller và cache không sửa
+    chung một object. `state_base64` (LazyState) vẫn dùng chung để chỉ giải mã một lần.
+    """
+    copied = dict(customer)
+    if copied.get("sessions") is not None:
+        copied["sessions"] = [dict(session) for session in copied["sessions"]]
+    return copied
+
+
+class CustomerSessionCache:
+    """
+    Cache LRU + TTL theo chat_id của kết quả `find_customer`: dòng customer, session đang
+    active và state (LazyState, giải mã một lần rồi giữ lại).
+
+    Mailbox đảm bảo mỗi chat_id chỉ có một lượt chạy tại một thời điểm, nên các repo ghi
+    thẳng thay đổi vào entry (write-through) thay vì đọc lại DB. TTL giới hạn độ cũ khi
+    DB bị sửa từ nơi khác (worker khác, Supabase dashboard, ...).
+
+    Tổng dung lượng (ước lượng) bị giới hạn bởi `max_bytes`, vượt quá thì bỏ entry dùng
+    lâu nhất. `ttl_s <= 0` tắt cache.
+
+    `get` / `put` trả về / lưu bản sao: sửa customer đã lấy ra không làm đổi cache, thay
+    đổi chỉ vào cache qua các method write-through.
+    """
+    def __init__(self, ttl_s: float = CUSTOMER_CACHE_TTL_SECONDS, max_bytes: int = CUSTOMER_CACHE_MAX_BYTES):
+        self.ttl_s = ttl_s
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[str, tuple[dict, float, int]] = OrderedDict()
+        self._session_index: dict[int, str] = {}
+        self._customer_index: dict[int, str] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_s > 0
+
+    # -----------------------------------------------------------------------------
+    # Đọc / ghi entry
+    # -----------------------------------------------------------------------------
+
+    def get(self, chat_id: str) -> dict | None:
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(chat_id)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            customer, expires_at, _ = entry
+            if time.monotonic() >= expires_at:
+                self._remove(chat_id)
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(chat_id)
+            self.hits += 1
+            return _copy_customer(customer)
+
+    def put(self, chat_id: str, customer: dict):
+        if not self.enabled:
+            return
+
+        with self._lock:
+            self._remove(chat_id)
+            self._store(chat_id, _copy_customer(customer), expires_at=time.monotonic() + self.ttl_s)
+            self._evict()
+
+    def invalidate(self, chat_id: str):
+        with self._lock:
+            if self._remove(chat_id):
+                self.invalidations += 1
+
+    def invalidate_customer(self, customer_id: int):
+        with self._lock:
+            chat_id = self._customer_index.get(customer_id)
+            if chat_id is not None and self._remove(chat_id):
+                self.invalidations += 1
+
+    def invalidate_session(self, session_id: int):
+        with self._lock:
+            chat_id = self._session_index.get(session_id)
+            if chat_id is not None and self._remove(chat_id):
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._session_index.clear()
+            self._customer_index.clear()
+            self._bytes = 0
+
+    # -----------------------------------------------------------------------------
+    # Write-through
+    # -----------------------------------------------------------------------------
+
+    def update_customer(self, row: dict):
+        """Ghi các cột vừa cập nhật của customer vào entry (giữ nguyên sessions)."""
+        with self._lock:
+            chat_id = row.get("chat_id") or self._customer_index.get(row.get("id"))
+            self._mutate(chat_id, lambda customer: customer.update(
+                {key: value for key, value in row.items() if key != "sessions"}
+            ))
+
+    def add_session(self, customer_id: int, session: dict):
+        """Session mới được tạo ở trạng thái active: thêm vào cuối danh sách của customer."""
+        with self._lock:
+            chat_id = self._customer_index.get(customer_id)
+            if self._mutate(chat_id, lambda customer: customer["sessions"].append(dict(session))):
+                self._session_index[session["id"]] = chat_id
+
+    def end_session(self, session_id: int):
+        """Session bị đóng không còn nằm trong danh sách session active."""
+        with self._lock:
+            chat_id = self._session_index.pop(session_id, None)
+            self._mutate(chat_id, lambda customer: customer.__setitem__(
+                "sessions", [session for session in customer["sessions"] if session["id"] != session_id]
+            ))
+
+    def update_session(self, session_id: int, fields: dict):
+        with self._lock:
+            self._mutate(
+                self._session_index.get(session_id),
+                lambda customer: self._find_session(customer, session_id).update(fields)
+            )
+
+    def append_state_delta(self, session_id: int, seq: int, payload: str, delta: dict):
+        with self._lock:
+            self._mutate(
+                self._session_index.get(session_id),
+                lambda customer: self._find_session(customer, session_id)["state_base64"]
+                    .append_delta(seq=seq, payload=payload, delta=delta)
+            )
+
+    def replace_state(self, session_id: int, data: str, seq: int, state: dict):
+        with self._lock:
+            self._mutate(
+                self._session_index.get(session_id),
+                lambda customer: self._find_session(customer, session_id)["state_base64"]
+                    .replace_snapshot(data=data, seq=seq, state=state)
+            )
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else None,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
+
+    # -----------------------------------------------------------------------------
+    # Nội bộ (gọi khi đang giữ lock)
+    # -----------------------------------------------------------------------------
+
+    @staticmethod
+    def _find_session(customer: dict, session_id: int) -> dict:
+        return next(session for session in customer["sessions"] if session["id"] == session_id)
+
+    def _store(self, chat_id: str, customer: dict, expires_at: float):
+        size = _estimate_bytes(customer)
+        self._entries[chat_id] = (customer, expires_at, size)
+        self._bytes += size
+        self._customer_index[customer["id"]] = chat_id
+        for session in customer.get("sessions") or []:
+            self._session_index[session["id"]] = chat_id
+
+    def _remove(self, chat_id: str) -> bool:
+        entry = self._entries.pop(chat_id, None)
+        if entry is None:
+            return False
+
+        customer, _, size = entry
+        self._bytes -= size
+        if self._customer_index.get(customer["id"]) == chat_id:
+            del self._customer_index[customer["id"]]
+        for session in customer.get("sessions") or []:
+            self._session_index.pop(session["id"], None)
+        return True
+
+    def _mutate(self, chat_id: str | None, apply) -> bool:
+        """Sửa entry tại chỗ rồi tính lại dung lượng; lỗi thì bỏ entry để lần sau đọc lại DB."""
+        if chat_id is None or chat_id not in self._entries:
+            return False
+
+        customer, expires_at, _ = self._entries[chat_id]
+        try:
+            apply(customer)
+        except Exception:
+            self._remove(chat_id)
+            self.invalidations += 1
+            return False
+
+        self._remove(chat_id)
+        self._store(chat_id, customer, expires_at=expires_at)
+        self._evict()
+        return True
+
+    def _evict(self):
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            chat_id = next(iter(self._entries))
+            self._remove(chat_id)
+            self.evictions += 1
+
+
+customer_cache = CustomerSessionCache()
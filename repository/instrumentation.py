@@ -0,0 +1,332 @@
+import os
+import time
+import uuid
+import inspect
+import functools
+import threading
+from collections import Counter, deque
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Awaitable, TypeVar
+
+from dotenv import load_dotenv
+
+from services.metrics import LatencyHistogram
+from log.logger_config import setup_logging
+
+if TYPE_CHECKING:
+    import httpx
+
+load_dotenv()
+logger = setup_logging(__name__)
+
+REPO_INSTRUMENTATION = os.getenv("REPO_INSTRUMENTATION", "true").lower() == "true"
+# Số lần gọi repository tối đa của một lượt chat trước khi bị đánh dấu vượt ngân sách
+REPO_QUERY_BUDGET = int(os.getenv("REPO_QUERY_BUDGET", "15"))
+# Một method được gọi từng này lần với tham số khác nhau trong một lượt -> nghi N+1
+REPO_N_PLUS_ONE_THRESHOLD = int(os.getenv("REPO_N_PLUS_ONE_THRESHOLD", "4"))
+
+T = TypeVar("T")
+
+
+@dataclass
+class QueryCall:
+    method: str
+    fingerprint: int
+    duration_ms: float
+    rows: int
+    payload_bytes: int
+    error: bool
+
+
+@dataclass
+class RequestQueries:
+    """Các lần gọi repository của một lượt chat (request)."""
+    request_id: str
+    chat_id: str
+    kind: str
+    started_at: float = field(default_factory=time.perf_counter)
+    calls: list[QueryCall] = field(default_factory=list)
+    cache_hits: int = 0
+
+    def report(self, budget: int = REPO_QUERY_BUDGET, n_plus_one_threshold: int = REPO_N_PLUS_ONE_THRESHOLD) -> dict:
+        by_method: dict[str, dict] = {}
+        for call in self.calls:
+            method_stats = by_method.setdefault(call.method, {"calls": 0, "db_ms": 0.0, "rows": 0, "payload_bytes": 0})
+            method_stats["calls"] += 1
+            method_stats["db_ms"] += call.duration_ms
+            method_stats["rows"] += call.rows
+            method_stats["payload_bytes"] += call.payload_bytes
+
+        same_query = Counter((call.method, call.fingerprint) for call in self.calls)
+        duplicates = [
+            {"method": method, "count": count}
+            for (method, _), count in same_query.items() if count > 1
+        ]
+        n_plus_one = []
+        for method, method_stats in by_method.items():
+            distinct_args = sum(1 for (name, _) in same_query if name == method)
+            if distinct_args >= n_plus_one_threshold:
+                n_plus_one.append({"method": method, "calls": method_stats["calls"], "distinct_args": distinct_args})
+
+        db_ms = sum(call.duration_ms for call in self.calls)
+        return {
+            "request_id": self.request_id,
+            "chat_id": self.chat_id,
+            "kind": self.kind,
+            "calls": len(self.calls),
+            "cache_hits": self.cache_hits,
+            "budget": budget,
+            "over_budget": len(self.calls) > budget,
+            "db_ms": round(db_ms, 2),
+            "wall_ms": round((time.perf_counter() - self.started_at) * 1000, 2),
+            "by_method": {
+                method: {**method_stats, "db_ms": round(method_stats["db_ms"], 2)}
+                for method, method_stats in sorted(by_method.items(), key=lambda item: -item[1]["db_ms"])
+            },
+            "duplicates": duplicates,
+            "n_plus_one": n_plus_one,
+        }
+
+
+@dataclass
+class CallIO:
+    """Dữ liệu của lần gọi method repository đang chạy, do hook httpx và `mark_cached` điền vào."""
+    payload_bytes: int = 0
+    cached: bool = False
+
+
+_current_request: ContextVar[RequestQueries | None] = ContextVar("repo_current_request", default=None)
+_current_call: ContextVar[CallIO | None] = ContextVar("repo_current_call", default=None)
+
+
+def mark_cached():
+    """Method repository gọi khi trả kết quả từ cache trong bộ nhớ, không query DB."""
+    call = _current_call.get()
+    if call is not None:
+        call.cached = True
+
+
+def record_response_bytes(response: "httpx.Response"):
+    """Event hook "response" của `httpx.Client`: cộng kích thước body vào lần gọi repository hiện tại."""
+    call = _current_call.get()
+    if call is not None:
+        call.payload_bytes += len(response.read())
+
+
+async def arecord_response_bytes(response: "httpx.Response"):
+    """Như `record_response_bytes`, cho `httpx.AsyncClient`."""
+    call = _current_call.get()
+    if call is not None:
+        call.payload_bytes += len(await response.aread())
+
+
+class MethodStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.cache_hits = 0
+        self.rows = 0
+        self.payload_bytes = 0
+        self.latency = LatencyHistogram()
+
+    def snapshot(self) -> dict:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "cache_hits": self.cache_hits,
+            "rows": self.rows,
+            "payload_bytes": self.payload_bytes,
+            "avg_payload_bytes": round(self.payload_bytes / self.calls) if self.calls else None,
+            "latency": self.latency.snapshot(),
+        }
+
+
+class RepoMetrics:
+    """
+    Thống kê mọi lần gọi method của repository (qua `instrument_repo`): số lần gọi,
+    histogram độ trễ, số dòng và kích thước body HTTP trả về, cùng báo cáo "ngân sách
+    query" cho từng lượt chat được bọc bởi `track_request`.
+
+    Kích thước body được đo ở tầng client (event hook của httpx, xem
+    `database/connection.py`), không serialize lại kết quả. Lần gọi trả từ cache
+    (`mark_cached`) chỉ được đếm là cache hit, không tính vào ngân sách/duplicate/N+1.
+
+    Lượt chat là một context (contextvars) nên các tool sync chạy trong thread pool
+    (`asyncio.to_thread`, executor của LangChain) vẫn được gắn đúng request.
+    """
+    def __init__(self, recent_reports: int = 50):
+        self._methods: dict[str, MethodStats] = {}
+        self._lock = threading.Lock()
+        self._recent_flagged: deque[dict] = deque(maxlen=recent_reports)
+
+        self.requests = 0
+        self.flagged_requests = 0
+
+    def record(self, method: str, fingerprint: int, duration_ms: float, result, error: bool, call: CallIO):
+        request = _current_request.get()
+        with self._lock:
+            method_stats = self._methods.get(method)
+            if method_stats is None:
+                method_stats = self._methods[method] = MethodStats()
+            if call.cached:
+                method_stats.cache_hits += 1
+                if request is not None:
+                    request.cache_hits += 1
+                return
+
+        rows = _count_rows(result)
+        payload_bytes = call.payload_bytes
+        with self._lock:
+            method_stats.calls += 1
+            method_stats.errors += error
+            method_stats.rows += rows
+            method_stats.payload_bytes += payload_bytes
+            method_stats.latency.add(duration_ms)
+
+        if request is not None:
+            request.calls.append(QueryCall(
+                method=method,
+                fingerprint=fingerprint,
+                duration_ms=duration_ms,
+                rows=rows,
+                payload_bytes=payload_bytes,
+                error=error
+            ))
+
+    async def track_request(self, chat_id: str, kind: str, coro: Awaitable[T]) -> T:
+        """Chạy một lượt chat và ghi log báo cáo query của lượt đó khi xong."""
+        request = RequestQueries(request_id=uuid.uuid4().hex[:12], chat_id=chat_id, kind=kind)
+        token = _current_request.set(request)
+        try:
+            return await coro
+        finally:
+            _current_request.reset(token)
+            self._finish(request)
+
+    def _finish(self, request: RequestQueries):
+        report = request.report()
+        flagged = report["over_budget"] or report["duplicates"] or report["n_plus_one"]
+
+        summary = (
+            f"Query budget {report['kind']} chat_id: {report['chat_id']} | "
+            f"calls: {report['calls']}/{report['budget']} | db: {report['db_ms']} ms of {report['wall_ms']} ms"
+        )
+        with self._lock:
+            self.requests += 1
+            if flagged:
+                self.flagged_requests += 1
+                self._recent_flagged.append(report)
+
+        if flagged:
+            logger.warning(
+                f"{summary} | duplicates: {report['duplicates']} | n+1: {report['n_plus_one']}"
+            )
+        else:
+            logger.info(summary)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "flagged_requests": self.flagged_requests,
+                "methods": {
+                    method: method_stats.snapshot()
+                    for method, method_stats in sorted(self._methods.items())
+                },
+                "recent_flagged": list(self._recent_flagged),
+            }
+
+
+repo_metrics = RepoMetrics()
+
+
+def _count_rows(result) -> int:
+    if result is None or result is False:
+        return 0
+    if isinstance(result, (list, tuple)):
+        return len(result)
+    return 1
+
+
+def _freeze(value):
+    """Chuyển tham số về dạng hashable để nhận ra các lần gọi giống hệt nhau."""
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple, set)):
+        return tuple(_freeze(item) for item in value)
+    try:
+        hash(value)
+        return value
+    except TypeError:
+        return repr(value)
+
+
+def _fingerprint(args: tuple, kwargs: dict) -> int:
+    return hash((_freeze(args), _freeze(kwargs)))
+
+
+def instrument_repo(cls: type[T]) -> type[T]:
+    """
+    Class decorator: bọc mọi method public (sync và async) của repository để ghi vào
+    `repo_metrics`. Tắt bằng REPO_INSTRUMENTATION=false.
+    """
+    if not REPO_INSTRUMENTATION:
+        return cls
+
+    for name, attr in list(vars(cls).items()):
+        if name.startswith("_") or not inspect.isfunction(attr):
+            continue
+        setattr(cls, name, _wrap(attr, f"{cls.__name__}.{name}"))
+    return cls
+
+
+def _wrap(func, method: str):
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(self, *args, **kwargs):
+            call = CallIO()
+            token = _current_call.set(call)
+            started = time.perf_counter()
+            result, error = None, False
+            try:
+                result = await func(self, *args, **kwargs)
+                return result
+            except BaseException:
+                error = True
+                raise
+            finally:
+                _current_call.reset(token)
+                repo_metrics.record(
+                    method=method,
+                    fingerprint=_fingerprint(args, kwargs),
+                    duration_ms=(time.perf_counter() - started) * 1000,
+                    result=result,
+                    error=error,
+                    call=call
+                )
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        call = CallIO()
+        token = _current_call.set(call)
+        started = time.perf_counter()
+        result, error = None, False
+        try:
+            result = func(self, *args, **kwargs)
+            return result
+        except BaseException:
+            error = True
+            raise
+        finally:
+            _current_call.reset(token)
+            repo_metrics.record(
+                method=method,
+                fingerprint=_fingerprint(args, kwargs),
+                duration_ms=(time.perf_counter() - started) * 1000,
+                result=result,
+                error=error,
+                call=call
+            )
+    return wrapper
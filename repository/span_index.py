@@ -0,0 +1,94 @@
+import os
+import threading
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+SPAN_INDEX_MAX_ENTRIES = int(os.getenv("SPAN_INDEX_MAX_ENTRIES", "100000"))
+
+
+class LastOutboundSpanIndex:
+    """
+    Outbound span mới nhất của mỗi customer (id, session, timestamp_end), thay cho hai
+    query `get_latest_event_and_bot_span` ở mỗi tin nhắn.
+
+    Service tự tạo các span này trong `_handle_message_spans`, nên index được cập nhật
+    ngay khi span được tạo (kể cả khi span còn nằm trong telemetry sink). Customer chưa
+    có trong index (sau restart, bị đẩy ra khỏi LRU) thì caller đọc DB một lần rồi `put`.
+
+    Span thuộc session cũ không được dùng cho session mới, giống query gốc chỉ tìm span
+    trong session của event mới nhất.
+    """
+    def __init__(self, max_entries: int = SPAN_INDEX_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[int, dict] = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, customer_id: int, session_id: int) -> dict | None:
+        """
+        Returns:
+            dict | None: {"customer_id", "event_session_id", "span_id", "span_end_ts"} như
+                `get_latest_event_and_bot_span`, None nếu customer chưa có trong index.
+        """
+        with self._lock:
+            entry = self._entries.get(customer_id)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(customer_id)
+            self.hits += 1
+
+        if entry["event_session_id"] != session_id:
+            # Session đã được thay mới, chưa có outbound span nào trong session này
+            return {"customer_id": customer_id, "event_session_id": session_id, "span_id": None, "span_end_ts": None}
+        return dict(entry)
+
+    def put(self, customer_id: int, session_id: int, span_id: str | None, span_end_ts: str | None):
+        with self._lock:
+            self._entries[customer_id] = {
+                "customer_id": customer_id,
+                "event_session_id": session_id,
+                "span_id": span_id,
+                "span_end_ts": span_end_ts,
+            }
+            self._entries.move_to_end(customer_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def record_spans(self, customer_id: int, message_spans: list[dict]):
+        """Cập nhật từ các span vừa tạo: giữ outbound span cuối cùng (nếu có)."""
+        outbound = [span for span in message_spans if span.get("direction") == "outbound"]
+        if outbound:
+            span = outbound[-1]
+            self.put(
+                customer_id=customer_id,
+                session_id=span["session_id"],
+                span_id=span["id"],
+                span_end_ts=span["timestamp_end"]
+            )
+
+    def forget(self, customer_id: int):
+        with self._lock:
+            self._entries.pop(customer_id, None)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else None,
+            "evictions": self.evictions,
+        }
+
+
+last_outbound_span_index = LastOutboundSpanIndex()
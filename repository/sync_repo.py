@@ -1,9 +1,18 @@
 import json
-from supabase import Client
+from typing import TYPE_CHECKING
+
+from repository.customer_cache import customer_cache
+from repository.availability_cache import availability_cache
+from repository.span_index import last_outbound_span_index
+from repository.instrumentation import instrument_repo
 from datetime import date, time, timedelta, datetime
 
+if TYPE_CHECKING:
+    from supabase import Client
+
+@instrument_repo
 class CustomerRepo:
-    def __init__(self, supabase_client: Client):
+    def __init__(self, supabase_client: "Client"):
         self.supabase_client = supabase_client
         
     def create_customer(self, chat_id: str) -> dict | None:
@@ -61,8 +70,13 @@ class CustomerRepo:
             .eq('id', customer_id)
             .execute()
         )
+        if not response.data:
+            return None
         
-        return response.data[0] if response.data else None
+        # Tool cập nhật tên/SĐT/email: ghi thẳng vào cache của v5
+        customer_cache.update_customer(response.data[0])
+        
+        return response.data[0]
     
     def update_customer_by_chat_id(
         self, 
@@ -75,8 +89,12 @@ class CustomerRepo:
             .eq('chat_id', chat_id)
             .execute()
         )
+        if not response.data:
+            return None
         
-        return response.data[0] if response.data else None
+        customer_cache.update_customer(response.data[0])
+        
+        return response.data[0]
     
     def get_uuid(self, chat_id: str) -> str | None:
         res = (
@@ -95,6 +113,9 @@ class CustomerRepo:
             .eq('chat_id', chat_id)
             .execute()
         )
+        customer_cache.invalidate(chat_id)
+        for customer in response.data or []:
+            last_outbound_span_index.forget(customer["id"])
         
         return bool(response.data)
     
@@ -118,8 +139,9 @@ class CustomerRepo:
         return False if response.data else True
     
     
+@instrument_repo
 class ServiceRepo:
-    def __init__(self, supabase_client: Client):
+    def __init__(self, supabase_client: "Client"):
         self.supabase_client = supabase_client
         
     def get_service_by_keyword(self, keyword: str) -> list[dict] | None:
@@ -229,8 +251,9 @@ class ServiceRepo:
         return response.data if response.data else None
     
     
+@instrument_repo
 class RoomRepo:
-    def __init__(self, supabase_client: Client):
+    def __init__(self, supabase_client: "Client"):
         self.supabase_client = supabase_client
         
     def get_all_rooms(self) -> list[dict] | None:
@@ -262,8 +285,9 @@ class RoomRepo:
         return rooms_dict
     
     
+@instrument_repo
 class AppointmentRepo:
-    def __init__(self, supabase_client: Client):
+    def __init__(self, supabase_client: "Client"):
         self.supabase_client = supabase_client
         
     def get_appointment_by_booking_date(
@@ -281,6 +305,25 @@ class AppointmentRepo:
         )
         
         return response.data if response.data else None
+    
+    def get_appointments_by_date_range(
+        self, 
+        date_from: str, 
+        date_to: str
+    ) -> list[dict] | None:
+        response = (
+            self.supabase_client
+            .table("appointments")
+            .select("id, staff_id, room_id, booking_date, start_time, end_time")
+            .gte("booking_date", date_from)
+            .lte("booking_date", date_to)
+            .eq("status", "booked")
+            .order("booking_date", desc=False)
+            .order("start_time", desc=False)
+            .execute()
+        )
+        
+        return response.data if response.data else None
         
     def get_overlap_appointments(
         self, 
@@ -322,6 +365,7 @@ class AppointmentRepo:
             .insert(appointment_payload)
             .execute()
         )
+        availability_cache.invalidate_date(appointment_payload.get("booking_date"))
         
         return response.data[0] if response.data else None
     
@@ -384,6 +428,9 @@ class AppointmentRepo:
             .eq("id", appointment_id)
             .execute()
         )
+        # Ngày cũ (nếu đang cache) và ngày mới của lịch hẹn đều không còn đúng
+        availability_cache.invalidate_appointment(appointment_id)
+        availability_cache.invalidate_date(update_payload.get("booking_date"))
         
         return bool(response.data)
     
@@ -481,8 +528,9 @@ class AppointmentRepo:
         return response.data if response.data else None
     
 
+@instrument_repo
 class StaffRepo:
-    def __init__(self, supabase_client: Client):
+    def __init__(self, supabase_client: "Client"):
         self.supabase_client = supabase_client
         
     def get_all_staff_return_dict(self) -> dict | None:
@@ -0,0 +1,62 @@
+import math
+from collections import deque
+
+
+class LatencyStats:
+    """
+    Thống kê độ trễ (ms) dùng chung cho các thành phần của service.
+
+    Giữ `window` mẫu gần nhất để tính percentile, còn count/avg/max tính trên toàn bộ.
+    """
+    def __init__(self, window: int = 1024):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self._samples: deque[float] = deque(maxlen=window)
+
+    def add(self, duration_ms: float):
+        self.count += 1
+        self.total_ms += duration_ms
+        self.max_ms = max(self.max_ms, duration_ms)
+        self._samples.append(duration_ms)
+
+    def percentile(self, p: float) -> float | None:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        index = max(0, math.ceil(p / 100 * len(ordered)) - 1)
+        return round(ordered[index], 2)
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total_ms / self.count, 2) if self.count else None,
+            "p50_ms": self.percentile(50),
+            "p95_ms": self.percentile(95),
+            "max_ms": round(self.max_ms, 2),
+        }
+
+
+class LatencyHistogram:
+    """Đếm số mẫu độ trễ (ms) theo các mốc cố định, kèm LatencyStats để có percentile."""
+    BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+    def __init__(self, buckets_ms: tuple[float, ...] = BUCKETS_MS):
+        self.buckets_ms = buckets_ms
+        self.counts = [0] * (len(buckets_ms) + 1)
+        self.latency = LatencyStats()
+
+    def add(self, duration_ms: float):
+        self.latency.add(duration_ms)
+        for index, bound in enumerate(self.buckets_ms):
+            if duration_ms <= bound:
+                self.counts[index] += 1
+                return
+        self.counts[-1] += 1
+
+    def snapshot(self) -> dict:
+        labels = [f"<={bound}ms" for bound in self.buckets_ms] + [f">{self.buckets_ms[-1]}ms"]
+        return {
+            **self.latency.snapshot(),
+            "buckets": {label: count for label, count in zip(labels, self.counts) if count},
+        }
@@ -0,0 +1,95 @@
+import asyncio
+from typing import Any, Callable
+
+from log.logger_config import setup_logging
+
+logger = setup_logging(__name__)
+
+
+class Burst:
+    """
+    Các tin nhắn liên tiếp của một khách được gom lại thành một lượt chat. Nội dung
+    tin nhắn nằm trong job queue, burst chỉ giữ id các job.
+    """
+    def __init__(self, graph: Any):
+        self.job_ids: list[int] = []
+        self.graph = graph
+        self.first_at: float = 0.0
+        self.timer: asyncio.TimerHandle | None = None
+
+
+class BurstCoalescer:
+    """
+    Debounce theo `chat_id`: tin nhắn đến trong `window_ms` kể từ tin trước được nối vào
+    cùng một `Burst`. Burst được đẩy đi khi hết cửa sổ, hoặc khi đã chờ quá `max_wait_ms`
+    kể từ tin đầu tiên để khách gõ liên tục không bị treo mãi.
+
+    `window_ms <= 0` tắt tính năng: mỗi tin nhắn là một burst riêng.
+    """
+    def __init__(
+        self,
+        on_flush: Callable[[str, Burst], None],
+        window_ms: int = 0,
+        max_wait_ms: int = 5000
+    ):
+        self.on_flush = on_flush
+        self.window_s = window_ms / 1000
+        self.max_wait_s = max(max_wait_ms, window_ms) / 1000
+        self._bursts: dict[str, Burst] = {}
+
+        self.flushed = 0
+        self.messages = 0
+
+    def add(self, chat_id: str, job_id: int, graph: Any):
+        loop = asyncio.get_running_loop()
+        burst = self._bursts.get(chat_id)
+        if burst is None:
+            burst = Burst(graph=graph)
+            burst.first_at = loop.time()
+            self._bursts[chat_id] = burst
+        elif burst.timer:
+            burst.timer.cancel()
+
+        burst.job_ids.append(job_id)
+        burst.graph = graph
+        self.messages += 1
+
+        if self.window_s <= 0:
+            self.flush(chat_id)
+            return
+
+        remaining = burst.first_at + self.max_wait_s - loop.time()
+        delay = max(0.0, min(self.window_s, remaining))
+        burst.timer = loop.call_later(delay, self.flush, chat_id)
+
+    def has_pending(self, chat_id: str) -> bool:
+        return chat_id in self._bursts
+
+    def flush(self, chat_id: str):
+        """Đẩy burst đang chờ của `chat_id` (nếu có) đi xử lý ngay."""
+        burst = self._bursts.pop(chat_id, None)
+        if burst is None:
+            return
+
+        if burst.timer:
+            burst.timer.cancel()
+
+        self.flushed += 1
+        if len(burst.job_ids) > 1:
+            logger.info(f"Coalesced {len(burst.job_ids)} messages of chat_id: {chat_id}")
+
+        self.on_flush(chat_id, burst)
+
+    def flush_all(self):
+        """Đẩy mọi burst đang chờ đi ngay (khi app tắt)."""
+        for chat_id in list(self._bursts):
+            self.flush(chat_id)
+
+    def stats(self) -> dict:
+        return {
+            "window_ms": int(self.window_s * 1000),
+            "pending_bursts": len(self._bursts),
+            "messages": self.messages,
+            "turns": self.flushed,
+            "avg_messages_per_turn": round(self.messages / self.flushed, 2) if self.flushed else None,
+        }
@@ -0,0 +1,147 @@
+import time
+import random
+import asyncio
+from dataclasses import dataclass
+
+import httpx
+
+from services.metrics import LatencyStats
+from log.logger_config import setup_logging
+
+logger = setup_logging(__name__)
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+@dataclass
+class DeliveryResult:
+    response: httpx.Response | None
+    attempts: int
+    duration_ms: int
+    error: str | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.response is not None and self.response.status_code == 200
+
+
+class CallbackClient:
+    """
+    Client gửi phản hồi về CALLBACK_URL, dùng chung cho cả process.
+
+    - Một `httpx.AsyncClient` sống lâu (HTTP/2, keep-alive) được tạo trong lifespan
+      của app, tránh bắt tay TCP+TLS cho mỗi tin nhắn.
+    - Retry có giới hạn với backoff + jitter cho lỗi mạng và các mã 429/5xx,
+      timeout áp dụng cho từng lần thử.
+    - Giới hạn số request đồng thời tới mỗi host đích.
+    """
+    def __init__(
+        self,
+        timeout_s: float = 10.0,
+        max_attempts: int = 3,
+        backoff_base_s: float = 0.5,
+        backoff_max_s: float = 5.0,
+        max_per_host: int = 16,
+        max_connections: int = 64
+    ):
+        self.timeout_s = timeout_s
+        self.max_attempts = max_attempts
+        self.backoff_base_s = backoff_base_s
+        self.backoff_max_s = backoff_max_s
+        self.max_per_host = max_per_host
+        self.max_connections = max_connections
+
+        self._client: httpx.AsyncClient | None = None
+        self._host_limits: dict[str, asyncio.Semaphore] = {}
+
+        self.latency = LatencyStats()
+        self.delivered = 0
+        self.failed = 0
+        self.retries = 0
+
+    async def start(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                http2=True,
+                timeout=httpx.Timeout(self.timeout_s),
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                    keepalive_expiry=60.0
+                )
+            )
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _host_limit(self, url: str) -> asyncio.Semaphore:
+        host = httpx.URL(url).netloc.decode()
+        limit = self._host_limits.get(host)
+        if limit is None:
+            limit = asyncio.Semaphore(self.max_per_host)
+            self._host_limits[host] = limit
+        return limit
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter: tránh các request lỗi cùng lúc retry dồn cùng một thời điểm
+        return random.uniform(0, min(self.backoff_max_s, self.backoff_base_s * 2 ** (attempt - 1)))
+
+    async def post_json(self, url: str, payload: dict) -> DeliveryResult:
+        """
+        Gửi `payload` tới `url`, retry khi lỗi mạng hoặc server đích tạm thời lỗi.
+
+        Returns:
+            DeliveryResult: Response cuối cùng (None nếu mọi lần thử đều lỗi mạng),
+                số lần thử và tổng thời gian gửi.
+        """
+        # Script chạy ngoài FastAPI (không có lifespan) vẫn dùng được
+        await self.start()
+
+        started_at = time.perf_counter()
+        response = None
+        error = None
+        attempt = 0
+
+        for attempt in range(1, self.max_attempts + 1):
+            if attempt > 1:
+                self.retries += 1
+                await asyncio.sleep(self._backoff(attempt - 1))
+
+            try:
+                async with self._host_limit(url):
+                    response = await self._client.post(url, json=payload)
+                error = None
+                if response.status_code not in RETRY_STATUS_CODES:
+                    break
+                error = f"HTTP {response.status_code}"
+            except httpx.TransportError as exc:
+                response = None
+                error = f"{type(exc).__name__}: {exc}"
+
+            logger.warning(f"Callback attempt {attempt}/{self.max_attempts} to {url} failed: {error}")
+
+        duration_ms = int((time.perf_counter() - started_at) * 1000)
+        self.latency.add(duration_ms)
+
+        result = DeliveryResult(
+            response=response,
+            attempts=attempt,
+            duration_ms=duration_ms,
+            error=error
+        )
+        if result.ok:
+            self.delivered += 1
+        else:
+            self.failed += 1
+
+        return result
+
+    def stats(self) -> dict:
+        return {
+            "delivered": self.delivered,
+            "failed": self.failed,
+            "retries": self.retries,
+            "latency": self.latency.snapshot(),
+        }
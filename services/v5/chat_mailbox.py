@@ -0,0 +1,132 @@
+import time
+import asyncio
+import traceback
+from typing import Any, Awaitable, Callable
+
+from services.metrics import LatencyStats
+from log.logger_config import setup_logging
+
+logger = setup_logging(__name__)
+
+Job = Callable[[], Awaitable[Any]]
+
+
+class ChatMailbox:
+    """
+    Hộp thư theo `chat_id`: tin nhắn của cùng một khách được xử lý tuần tự đúng thứ tự
+    nhận, các khách khác nhau vẫn chạy song song.
+
+    Mỗi `chat_id` có một queue và một worker task riêng. Worker tự kết thúc và hộp thư
+    được thu hồi khi không có tin nhắn mới trong `idle_timeout_s` giây.
+    """
+    def __init__(self, idle_timeout_s: float = 60.0):
+        self.idle_timeout_s = idle_timeout_s
+        self._queues: dict[str, asyncio.Queue] = {}
+        self._workers: dict[str, asyncio.Task] = {}
+        # Kết quả của các job đã nhận mà chưa xong, để `drain` chờ khi app tắt
+        self._pending: set[asyncio.Future] = set()
+
+        self.wait_time = LatencyStats()
+        self.processed = 0
+        self.failed = 0
+        self.reclaimed = 0
+
+    def submit(self, chat_id: str, job: Job) -> asyncio.Future:
+        """
+        Đưa một job vào hộp thư của `chat_id`.
+
+        Args:
+            chat_id (str): Định danh cuộc hội thoại.
+            job (Job): Hàm không tham số trả về coroutine cần chạy.
+
+        Returns:
+            asyncio.Future: Kết quả của job, chỉ cần await khi caller cần phản hồi.
+        """
+        queue = self._queues.get(chat_id)
+        if queue is None:
+            queue = asyncio.Queue()
+            self._queues[chat_id] = queue
+            self._workers[chat_id] = asyncio.create_task(self._run(chat_id, queue))
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending.add(future)
+        future.add_done_callback(self._pending.discard)
+        queue.put_nowait((time.perf_counter(), job, future))
+
+        return future
+
+    async def drain(self, timeout_s: float) -> bool:
+        """
+        Chờ mọi job đã nhận (kể cả job được thêm trong lúc chờ) chạy xong, tối đa `timeout_s`
+        giây. Hết giờ thì huỷ các job còn lại.
+
+        Returns:
+            bool: True nếu mọi job đã xong trước khi hết giờ.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout_s
+        while self._pending and loop.time() < deadline:
+            await asyncio.wait(list(self._pending), timeout=deadline - loop.time())
+        if not self._pending:
+            return True
+
+        logger.warning(f"Cancelling {len(self._pending)} unfinished mailbox jobs after {timeout_s}s")
+        workers = list(self._workers.values())
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        for future in list(self._pending):
+            future.cancel()
+        return False
+
+    def depth(self, chat_id: str) -> int:
+        queue = self._queues.get(chat_id)
+        return queue.qsize() if queue else 0
+
+    async def _run(self, chat_id: str, queue: asyncio.Queue):
+        try:
+            while True:
+                try:
+                    enqueued_at, job, future = await asyncio.wait_for(
+                        queue.get(),
+                        timeout=self.idle_timeout_s
+                    )
+                except asyncio.TimeoutError:
+                    if queue.empty():
+                        break
+                    continue
+
+                self.wait_time.add((time.perf_counter() - enqueued_at) * 1000)
+                try:
+                    result = await job()
+                    if not future.done():
+                        future.set_result(result)
+                    self.processed += 1
+                except Exception as e:
+                    self.failed += 1
+                    error_details = traceback.format_exc()
+                    logger.error(f"Exception in mailbox of chat_id {chat_id}: {e}")
+                    logger.error(f"Chi tiết lỗi: \n{error_details}")
+                    if not future.done():
+                        future.set_exception(e)
+                        # Tránh cảnh báo "exception was never retrieved" khi caller không await
+                        future.exception()
+                finally:
+                    queue.task_done()
+        finally:
+            self._queues.pop(chat_id, None)
+            self._workers.pop(chat_id, None)
+            self.reclaimed += 1
+            logger.info(f"Reclaimed idle mailbox of chat_id: {chat_id}")
+
+    def stats(self) -> dict:
+        depths = [queue.qsize() for queue in self._queues.values()]
+        return {
+            "active_mailboxes": len(self._queues),
+            "queued_total": sum(depths),
+            "max_queue_depth": max(depths, default=0),
+            "processed": self.processed,
+            "failed": self.failed,
+            "reclaimed": self.reclaimed,
+            "wait_time": self.wait_time.snapshot(),
+        }
@@ -0,0 +1,314 @@
+import os
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import threading
+from dataclasses import dataclass
+
+from log.logger_config import setup_logging
+
+logger = setup_logging(__name__)
+
+# Tiến độ của lượt chat, ghi trước/sau phần có side effect (graph, tool đặt lịch, lưu state)
+JOB_STAGE_STARTED = "graph_started"
+JOB_STAGE_DONE = "graph_done"
+_JOB_COLUMNS = "id, chat_id, payload, attempts, next_attempt_at, stage, result"
+
+
+class NonRetryableJobError(Exception):
+    """Lỗi mà chạy lại job không giúp được hoặc sẽ lặp lại side effect: chuyển thẳng sang dead letter."""
+
+
+@dataclass
+class Job:
+    id: int
+    chat_id: str
+    payload: dict
+    attempts: int
+    next_attempt_at: float
+    stage: str | None = None
+    result: dict | None = None
+
+
+class DurableJobQueue:
+    """
+    Hàng đợi job webhook lưu trên SQLite (WAL) để không mất tin nhắn đã trả "OK"
+    khi process bị restart/crash.
+
+    Vòng đời một job:
+        - `enqueue`: ghi lại ngay khi nhận request (trước khi trả "OK").
+        - `ack`: xử lý xong -> xoá khỏi hàng đợi.
+        - `nack`: lỗi -> tăng `attempts`, hẹn lần thử lại theo exponential backoff.
+          Hết `max_attempts` lần thì chuyển sang bảng `dead_letters`.
+        - `claim_pending`: nhận các job chưa ack mà không worker nào giữ (hoặc lease đã hết)
+          để replay, lúc khởi động và định kỳ sau đó.
+        - `mark_started` / `mark_completed`: ghi lại graph đã bắt đầu / đã chạy xong (kèm câu
+          trả lời), để lần retry không chạy lại tool có side effect mà chỉ gửi lại câu trả lời.
+
+    Nhiều process có thể mở chung một file: job thuộc về worker `claimed_by` cho tới
+    `lease_until`. `enqueue` nhận job cho worker hiện tại, `renew_leases` gia hạn định kỳ
+    mọi job worker còn giữ, `claim` chỉ thành công khi job chưa bị worker khác giữ hoặc
+    lease của worker đó đã hết (worker chết). Nhờ vậy job đang chạy ở worker khác không
+    bị replay. Khi tắt bình thường, `release` trả lại các job chưa xong để process sau
+    nhận ngay. `worker_id` cố định (vd. theo slot deploy) thì process khởi động lại nhận
+    lại ngay job của lần chạy trước mà không chờ lease hết.
+
+    Đảm bảo at-least-once: job chỉ bị xoá sau khi xử lý xong, nên một job có thể
+    được xử lý lại nếu process chết giữa chừng.
+
+    Các method đều là I/O đồng bộ: trên event loop thì gọi qua executor (process_chat dùng
+    một thread riêng cho mọi thao tác).
+    """
+    def __init__(
+        self,
+        path: str,
+        max_attempts: int = 5,
+        retry_base_s: float = 2.0,
+        retry_max_s: float = 300.0,
+        lease_s: float = 300.0,
+        worker_id: str | None = None
+    ):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.retry_base_s = retry_base_s
+        self.retry_max_s = retry_max_s
+        self.lease_s = lease_s
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.started_at = time.time()
+
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # NORMAL + WAL: commit không fsync mỗi lần nhưng vẫn an toàn khi process crash
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        # Một connection dùng chung cho nhiều thread: mỗi thao tác/transaction giữ lock
+        self._lock = threading.Lock()
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                chat_id TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL,
+                last_error TEXT,
+                created_at REAL NOT NULL,
+                claimed_by TEXT,
+                lease_until REAL,
+                stage TEXT,
+                result TEXT
+            );
+            CREATE TABLE IF NOT EXISTS dead_letters (
+                id INTEGER PRIMARY KEY,
+                chat_id TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                attempts INTEGER NOT NULL,
+                last_error TEXT,
+                created_at REAL NOT NULL,
+                failed_at REAL NOT NULL
+            );
+        """)
+        # File tạo từ phiên bản trước chưa có cột lease
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        for column, kind in (("claimed_by", "TEXT"), ("lease_until", "REAL"), ("stage", "TEXT"), ("result", "TEXT")):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+
+        self.enqueued = 0
+        self.acked = 0
+        self.discarded = 0
+        self.retried = 0
+        self.dead_lettered = 0
+
+    def enqueue(self, chat_id: str, payload: dict) -> int:
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO jobs (chat_id, payload, next_attempt_at, created_at, claimed_by, lease_until) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (chat_id, json.dumps(payload, ensure_ascii=False), now, now, self.worker_id, now + self.lease_s)
+            )
+        self.enqueued += 1
+        return cursor.lastrowid
+
+    def get(self, job_ids: list[int]) -> list[Job]:
+        if not job_ids:
+            return []
+        placeholders = ",".join("?" * len(job_ids))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {_JOB_COLUMNS} FROM jobs WHERE id IN ({placeholders}) ORDER BY id",
+                job_ids
+            ).fetchall()
+        return [self._to_job(row) for row in rows]
+
+    def claim(self, job_ids: list[int]) -> list[Job]:
+        """
+        Nhận (hoặc gia hạn lease của) các job cho worker hiện tại.
+
+        Returns:
+            list[Job]: Các job đã nhận được, bỏ qua job đã ack hoặc đang được worker khác giữ.
+        """
+        if not job_ids:
+            return []
+        now = time.time()
+        placeholders = ",".join("?" * len(job_ids))
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._conn.execute(
+                f"UPDATE jobs SET claimed_by = ?, lease_until = ? WHERE id IN ({placeholders}) "
+                f"AND (claimed_by IS NULL OR claimed_by = ? OR lease_until < ?)",
+                [self.worker_id, now + self.lease_s, *job_ids, self.worker_id, now]
+            )
+            rows = self._conn.execute(
+                f"SELECT {_JOB_COLUMNS} FROM jobs WHERE id IN ({placeholders}) AND claimed_by = ? ORDER BY id",
+                [*job_ids, self.worker_id]
+            ).fetchall()
+        return [self._to_job(row) for row in rows]
+
+    def claim_pending(self, reclaim_own: bool = False) -> list[Job]:
+        """
+        Nhận các job chưa ack mà không worker nào giữ, hoặc worker khác giữ nhưng lease đã
+        hết, theo thứ tự id. Job worker hiện tại đang giữ (đang chạy/chờ trong process này)
+        không bị trả về lần nữa.
+
+        Args:
+            reclaim_own (bool): Lúc khởi động: nhận cả job mang `worker_id` này được tạo trước
+                khi queue mở, tức job của lần chạy trước cùng `worker_id`.
+        """
+        now = time.time()
+        condition = "claimed_by IS NULL OR lease_until IS NULL OR (claimed_by != ? AND lease_until < ?)"
+        params: list = [self.worker_id, now]
+        if reclaim_own:
+            condition += " OR (claimed_by = ? AND created_at < ?)"
+            params += [self.worker_id, self.started_at]
+
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            rows = self._conn.execute(
+                f"SELECT {_JOB_COLUMNS} FROM jobs WHERE {condition} ORDER BY id", params
+            ).fetchall()
+            self._conn.executemany(
+                "UPDATE jobs SET claimed_by = ?, lease_until = ? WHERE id = ?",
+                [(self.worker_id, now + self.lease_s, row[0]) for row in rows]
+            )
+        return [self._to_job(row) for row in rows]
+
+    def renew_leases(self) -> int:
+        """Heartbeat: gia hạn lease của mọi job worker hiện tại đang giữ."""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET lease_until = MAX(COALESCE(lease_until, 0), ?) WHERE claimed_by = ?",
+                (now + self.lease_s, self.worker_id)
+            )
+        return cursor.rowcount
+
+    def release(self) -> int:
+        """Trả lại mọi job worker hiện tại còn giữ (khi tắt) để worker khác nhận ngay."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET claimed_by = NULL, lease_until = NULL WHERE claimed_by = ?",
+                (self.worker_id,)
+            )
+        if cursor.rowcount:
+            logger.info(f"Released {cursor.rowcount} unfinished jobs of worker {self.worker_id}")
+        return cursor.rowcount
+
+    def mark_started(self, job_ids: list[int]):
+        self._set_stage(job_ids, JOB_STAGE_STARTED, None)
+
+    def mark_completed(self, job_ids: list[int], result: dict):
+        self._set_stage(job_ids, JOB_STAGE_DONE, json.dumps(result, ensure_ascii=False))
+
+    def _set_stage(self, job_ids: list[int], stage: str, result: str | None):
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE jobs SET stage = ?, result = ? WHERE id = ?",
+                [(stage, result, job_id) for job_id in job_ids]
+            )
+
+    def ack(self, job_ids: list[int]):
+        with self._lock:
+            self._conn.executemany("DELETE FROM jobs WHERE id = ?", [(job_id,) for job_id in job_ids])
+        self.acked += len(job_ids)
+
+    def discard(self, job_ids: list[int]):
+        """Bỏ job đã ghi nhưng không được nhận xử lý (webhook bị shed)."""
+        with self._lock:
+            self._conn.executemany("DELETE FROM jobs WHERE id = ?", [(job_id,) for job_id in job_ids])
+        self.discarded += len(job_ids)
+
+    def nack(self, job_ids: list[int], error: str, retry: bool = True) -> float | None:
+        """
+        Ghi nhận một lần xử lý lỗi của nhóm job (các tin đã được gộp thành một lượt chat).
+        `retry=False` chuyển thẳng sang dead letter.
+
+        Returns:
+            float | None: Số giây cần chờ trước lần thử lại, None nếu đã chuyển sang dead letter.
+        """
+        jobs = self.get(job_ids)
+        if not jobs:
+            return None
+
+        attempts = max(job.attempts for job in jobs) + 1
+        now = time.time()
+
+        if attempts >= self.max_attempts or not retry:
+            with self._lock, self._conn:
+                self._conn.execute("BEGIN")
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO dead_letters "
+                    "(id, chat_id, payload, attempts, last_error, created_at, failed_at) "
+                    "SELECT id, chat_id, payload, ?, ?, created_at, ? FROM jobs WHERE id = ?",
+                    [(attempts, error, now, job.id) for job in jobs]
+                )
+                self._conn.executemany("DELETE FROM jobs WHERE id = ?", [(job.id,) for job in jobs])
+            self.dead_lettered += len(jobs)
+            logger.error(f"Moved jobs {job_ids} to dead letters after {attempts} attempts: {error}")
+            return None
+
+        delay = min(self.retry_max_s, self.retry_base_s * 2 ** (attempts - 1))
+        # Worker hiện tại vẫn giữ job trong lúc chờ thử lại
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE jobs SET attempts = ?, next_attempt_at = ?, last_error = ?, lease_until = ? WHERE id = ?",
+                [(attempts, now + delay, error, now + delay + self.lease_s, job.id) for job in jobs]
+            )
+        self.retried += 1
+        return delay
+
+    def is_final_attempt(self, jobs: list[Job]) -> bool:
+        return max(job.attempts for job in jobs) + 1 >= self.max_attempts
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    @staticmethod
+    def _to_job(row: tuple) -> Job:
+        return Job(
+            id=row[0],
+            chat_id=row[1],
+            payload=json.loads(row[2]),
+            attempts=row[3],
+            next_attempt_at=row[4],
+            stage=row[5],
+            result=json.loads(row[6]) if row[6] else None
+        )
+
+    def stats(self) -> dict:
+        with self._lock:
+            pending, dead = self._conn.execute(
+                "SELECT (SELECT COUNT(*) FROM jobs), (SELECT COUNT(*) FROM dead_letters)"
+            ).fetchone()
+        return {
+            "worker_id": self.worker_id,
+            "pending": pending,
+            "dead_letters": dead,
+            "enqueued": self.enqueued,
+            "acked": self.acked,
+            "discarded": self.discarded,
+            "retried": self.retried,
+            "dead_lettered": self.dead_lettered,
+        }
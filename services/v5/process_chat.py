@@ -1,22 +1,40 @@
 import os
+import json
+import time
 import uuid
-import httpx
 import asyncio
 import traceback
+from typing import Callable
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
 from zoneinfo import ZoneInfo
 from langgraph.graph import StateGraph
 from schemas.response import ChatResponse
-from fastapi.responses import PlainTextResponse
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from datetime import timedelta, datetime, timezone
 
 from schemas.response import ResponseModel
 from core.graph.state import AgentState, init_state
-from repository.async_repo import AsyncCustomerRepo, AsyncEventRepo, AsyncMessageSpanRepo, AsyncSessionRepo
+from core.graph.checkpointer import is_persistent
+from core.graph.state_codec import LazyState, diff_state
+from core.graph.summarizer import summary_stats
+from core.graph.context_view import context_view_stats
+from repository.async_repo import AsyncCustomerRepo, AsyncEventRepo, AsyncMessageSpanRepo, AsyncSessionRepo, event_row
+from repository.customer_cache import customer_cache
+from repository.span_index import last_outbound_span_index
+from repository.availability_cache import availability_cache
+from repository.instrumentation import repo_metrics
 
 from log.logger_config import setup_logging
 from dotenv import load_dotenv
 
 from services.utils import cal_duration_ms, now_vietnam_time
+from services.v5.job_queue import JOB_STAGE_DONE, JOB_STAGE_STARTED, DurableJobQueue, Job, NonRetryableJobError
+from services.v5.callback_client import CallbackClient
+from services.v5.telemetry_sink import TelemetrySink
+from services.v5.worker_pool import WorkerPool
+from services.v5.chat_mailbox import ChatMailbox
+from services.v5.burst_coalescer import Burst, BurstCoalescer
 
 load_dotenv()
 logger = setup_logging(__name__)
@@ -27,19 +45,109 @@ async_message_repo = AsyncMessageSpanRepo()
 
 CALLBACK_URL = os.getenv("CALLBACK_URL")
 N_DAYS = int(os.getenv("N_DAYS"))
+MAILBOX_IDLE_SECONDS = float(os.getenv("MAILBOX_IDLE_SECONDS", "60"))
+COALESCE_WINDOW_MS = int(os.getenv("COALESCE_WINDOW_MS", "0"))
+COALESCE_MAX_WAIT_MS = int(os.getenv("COALESCE_MAX_WAIT_MS", "5000"))
+COMMANDS = ["/start", "/restart", "/delete_me"]
+# Chỉ stream token của các agent trả lời khách, bỏ qua supervisor và tool
+STREAM_NODES = ("service_agent", "booking_agent", "modify_booking_agent", "fallback_agent")
+WORKER_MAX_CONCURRENCY = int(os.getenv("WORKER_MAX_CONCURRENCY", "16"))
+WORKER_MAX_QUEUE = int(os.getenv("WORKER_MAX_QUEUE", "200"))
+WEBHOOK_SHED_POLICY = os.getenv("WEBHOOK_SHED_POLICY", "503")
+SHED_RETRY_AFTER_SECONDS = int(os.getenv("SHED_RETRY_AFTER_SECONDS", "5"))
+BUSY_MESSAGE = (
+    "Dạ hiện tại hệ thống đang quá tải, "
+    "khách vui lòng gửi lại tin nhắn sau ít phút giúp em ạ."
+)
+JOB_QUEUE_PATH = os.getenv("JOB_QUEUE_PATH", "webhook_jobs.db")
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETRY_BASE_SECONDS = float(os.getenv("JOB_RETRY_BASE_SECONDS", "2"))
+JOB_RETRY_MAX_SECONDS = float(os.getenv("JOB_RETRY_MAX_SECONDS", "300"))
+# Job thuộc về worker đã nhận nó trong bấy nhiêu giây (được gia hạn khi đang chạy)
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "300"))
+# Định danh cố định của worker (vd. theo slot deploy), trống thì sinh ngẫu nhiên mỗi process
+JOB_WORKER_ID = os.getenv("JOB_WORKER_ID") or None
+# Chu kỳ gia hạn lease và nhận lại job của worker đã chết
+JOB_SWEEP_SECONDS = float(os.getenv("JOB_SWEEP_SECONDS", "30"))
+# Khi app tắt: chờ các lượt chat đang chạy tối đa bấy nhiêu giây
+SHUTDOWN_DRAIN_SECONDS = float(os.getenv("SHUTDOWN_DRAIN_SECONDS", "25"))
+CALLBACK_TIMEOUT_SECONDS = float(os.getenv("CALLBACK_TIMEOUT_SECONDS", "10"))
+CALLBACK_MAX_ATTEMPTS = int(os.getenv("CALLBACK_MAX_ATTEMPTS", "3"))
+CALLBACK_MAX_PER_HOST = int(os.getenv("CALLBACK_MAX_PER_HOST", "16"))
+# Sau bấy nhiêu delta thì gộp state thành snapshot mới trong sessions.state_base64
+STATE_SNAPSHOT_EVERY = int(os.getenv("STATE_SNAPSHOT_EVERY", "20"))
+# Gộp chuỗi find/create customer + session + event thành một lần gọi RPC
+RESOLVE_CUSTOMER_RPC = os.getenv("RESOLVE_CUSTOMER_RPC", "true").lower() == "true"
+TELEMETRY_FLUSH_SIZE = int(os.getenv("TELEMETRY_FLUSH_SIZE", "200"))
+TELEMETRY_FLUSH_INTERVAL_MS = int(os.getenv("TELEMETRY_FLUSH_INTERVAL_MS", "1000"))
+TELEMETRY_MAX_BUFFERED = int(os.getenv("TELEMETRY_MAX_BUFFERED", "10000"))
+TELEMETRY_OVERFLOW_POLICY = os.getenv("TELEMETRY_OVERFLOW_POLICY", "spill")
+TELEMETRY_SPILL_PATH = os.getenv("TELEMETRY_SPILL_PATH", "telemetry_spill.db")
+TELEMETRY_MAX_ATTEMPTS = int(os.getenv("TELEMETRY_MAX_ATTEMPTS", "5"))
+
+# Tin nhắn của cùng một chat_id được xử lý tuần tự để không ghi đè state của nhau
+chat_mailbox = ChatMailbox(idle_timeout_s=MAILBOX_IDLE_SECONDS)
+# Giới hạn số lượt chat chạy đồng thời / đang chờ trên mỗi worker
+worker_pool = WorkerPool(
+    max_concurrency=WORKER_MAX_CONCURRENCY,
+    max_queue=WORKER_MAX_QUEUE
+)
+# Tin nhắn webhook đã nhận được lưu xuống đĩa cho tới khi xử lý xong
+job_queue = DurableJobQueue(
+    path=JOB_QUEUE_PATH,
+    max_attempts=JOB_MAX_ATTEMPTS,
+    retry_base_s=JOB_RETRY_BASE_SECONDS,
+    retry_max_s=JOB_RETRY_MAX_SECONDS,
+    lease_s=JOB_LEASE_SECONDS,
+    worker_id=JOB_WORKER_ID
+)
+# Một thread duy nhất cho mọi thao tác SQLite của job queue: enqueue xong theo đúng thứ
+# tự webhook đến (giữ thứ tự tin nhắn), không chặn event loop, và khi tắt thì mọi thao
+# tác đã gửi chạy xong trước khi connection bị đóng
+job_queue_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="job-queue")
+# Được set khi app bắt đầu tắt: không nhận lượt chat mới, không chờ retry nữa
+_shutdown = asyncio.Event()
+# Events và message spans được ghi nền theo lô, không nằm trên đường trả lời khách
+telemetry_sink = TelemetrySink(
+    writers={
+        "events": async_event_repo.create_event_bulk,
+        "message_spans": async_message_repo.create_message_span_bulk
+    },
+    flush_size=TELEMETRY_FLUSH_SIZE,
+    flush_interval_s=TELEMETRY_FLUSH_INTERVAL_MS / 1000,
+    max_buffered=TELEMETRY_MAX_BUFFERED,
+    overflow_policy=TELEMETRY_OVERFLOW_POLICY,
+    spill_path=TELEMETRY_SPILL_PATH,
+    max_attempts=TELEMETRY_MAX_ATTEMPTS
+)
+# Client gửi phản hồi dùng chung, được mở/đóng trong lifespan của app
+callback_client = CallbackClient(
+    timeout_s=CALLBACK_TIMEOUT_SECONDS,
+    max_attempts=CALLBACK_MAX_ATTEMPTS,
+    max_per_host=CALLBACK_MAX_PER_HOST
+)
 
 async def _handle_message_spans(
     session_id: int,
     customer_id: int,
     message_spans: list[dict]
-) -> bool:
+):
+    """Gắn id/quan hệ cho các span của lượt chat rồi đưa vào telemetry sink (không chờ insert)."""
     main_span_id = str(uuid.uuid4())
     
-    # Get the last outbound span_id from DB
-    logger.info("Get the latest event and bot span from DB")
-    latest_span = await async_message_repo.get_latest_event_and_bot_span(
-        customer_id=customer_id
-    )
+    # Outbound span trước đó: lấy từ index trong bộ nhớ, chỉ đọc DB khi chưa có
+    latest_span = last_outbound_span_index.get(customer_id=customer_id, session_id=session_id)
+    if latest_span is None:
+        logger.info("Get the latest event and bot span from DB")
+        latest_span = await async_message_repo.get_latest_event_and_bot_span(
+            customer_id=customer_id
+        ) or {"customer_id": customer_id, "event_session_id": session_id, "span_id": None, "span_end_ts": None}
+        last_outbound_span_index.put(
+            customer_id=customer_id,
+            session_id=latest_span["event_session_id"],
+            span_id=latest_span["span_id"],
+            span_end_ts=latest_span["span_end_ts"]
+        )
     
     response_duration_ms = None
     if latest_span["span_end_ts"] is not None:
@@ -68,11 +176,57 @@ async def _handle_message_spans(
             "customer_id": customer_id
         })
         
-    created_spans = await async_message_repo.create_message_span_bulk(
-        message_spans=message_spans
-    )
+        # Các tin nhắn gộp trong cùng burst đều trả lời cho cùng outbound span trước đó
+        if span.get("direction") == "inbound":
+            span["response_to_span_id"] = latest_span["span_id"]
+            if latest_span["span_end_ts"] is not None:
+                span["response_duration_ms"] = cal_duration_ms(
+                    timestamp_start=datetime.fromisoformat(latest_span["span_end_ts"]),
+                    timestamp_end=datetime.fromisoformat(span["timestamp_start"])
+                )
+        
+    telemetry_sink.add("message_spans", message_spans)
+    last_outbound_span_index.record_spans(customer_id=customer_id, message_spans=message_spans)
+
+def _record_event(customer_id: int, session_id: int, event_type: str):
+    """Ghi event qua telemetry sink (không chờ insert)."""
+    telemetry_sink.add("events", [
+        event_row(customer_id=customer_id, session_id=session_id, event_type=event_type)
+    ])
+
+async def _build_turn_state(
+    user_input: str,
+    chat_id: str,
+    customer: dict,
+    config: dict,
+    graph: StateGraph
+) -> AgentState:
+    """
+    Input cho một lượt chat. Nếu checkpointer đã có state của thread thì chỉ truyền
+    các trường của lượt này, graph tự nối vào checkpoint. Nếu chưa có (checkpointer
+    trong RAM, hoặc session cũ chỉ lưu state_base64) thì khởi tạo từ state_base64,
+    checkpointer lưu bền sẽ giữ state này từ lượt sau.
+    """
+    state: AgentState | None = None
+    if is_persistent(graph.checkpointer):
+        snapshot = await graph.aget_state(config)
+        if snapshot.values:
+            state = {}
     
-    return True if created_spans else False
+    if state is None:
+        stored = customer["sessions"][0]["state_base64"]
+        state = stored.to_dict() if stored else init_state()
+
+    state["user_input"] = user_input
+    state["chat_id"] = chat_id
+    
+    state["customer_id"] = customer["id"]
+    state["name"] = customer["name"]
+    state["phone"] = customer["phone"]
+    state["email"] = customer["email"]
+    state["session_id"] = customer["sessions"][0]["id"]
+    
+    return state
 
 async def handle_normal_chat(
     user_input: str,
@@ -82,20 +236,15 @@ async def handle_normal_chat(
     graph: StateGraph
 ) -> ResponseModel:
     try:
-        state: AgentState = customer["sessions"][0]["state_base64"]
-        if not state:
-            state = init_state()
-
-        state["user_input"] = user_input
-        state["chat_id"] = chat_id
-        
-        state["customer_id"] = customer["id"]
-        state["name"] = customer["name"]
-        state["phone"] = customer["phone"]
-        state["email"] = customer["email"]
-        state["session_id"] = customer["sessions"][0]["id"]
+        state = await _build_turn_state(
+            user_input=user_input,
+            chat_id=chat_id,
+            customer=customer,
+            config=config,
+            graph=graph
+        )
 
-        result = graph.invoke(state, config=config)
+        result = await graph.ainvoke(state, config=config)
         data = result["messages"][-1].content
 
         return ResponseModel(
@@ -115,7 +264,8 @@ async def handle_normal_chat(
         
 async def handle_new_chat(
     customer: dict,
-    new_customer_flag: bool
+    new_customer_flag: bool,
+    graph: StateGraph | None = None
 ) -> ResponseModel:
     try:
         if new_customer_flag is False:
@@ -144,6 +294,7 @@ async def handle_new_chat(
                     error="Lỗi không thể cập nhật thread_id"
                 )
             logger.info(f"Close session successfully id: {end_session["id"]}")
+            await _delete_checkpoint(graph=graph, thread_id=session["thread_id"])
             logger.info(f"Cập nhật thread_id của khách: {customer["id"]} là {thread_id}")
         else:
             logger.info("New customer -> no need to update thread_id")
@@ -172,7 +323,9 @@ async def handle_new_chat(
         )
         
 async def handle_delete_me(
-    customer_id: int
+    customer_id: int,
+    graph: StateGraph | None = None,
+    thread_id: str | None = None
 ) -> ResponseModel:
     try:
         deleted_customer = await async_customer_repo.delete_customer(customer_id=customer_id)
@@ -186,6 +339,7 @@ async def handle_delete_me(
             
         else:
             logger.info(f"Xóa thành công khách với id: {customer_id}")
+            await _delete_checkpoint(graph=graph, thread_id=thread_id)
 
             response = (
                 "Dev only: Đã xóa thành công khách hàng khỏi hệ thống."
@@ -211,7 +365,7 @@ async def send_to_callback(
     chat_id: str,
     status: str = "ok",
     timestamp_start: datetime = None,
-    message_spans: list[dict] = [],
+    message_spans: list[dict] = None,
     session_id: int = None,
     customer_id: int = None,
 ):
@@ -222,6 +376,8 @@ async def send_to_callback(
         chat_id (str): ID của chat
     """
     try:
+        # Không sửa list của caller: job queue có thể retry với cùng dữ liệu
+        message_spans = list(message_spans or [])
         timestamp_end = now_vietnam_time()
         duration_ms = cal_duration_ms(
             timestamp_start=timestamp_start,
@@ -242,37 +398,41 @@ async def send_to_callback(
             "response": text
         }
         
-        timeout = httpx.Timeout(30.0)  # thiết lập timeout 30 giây
-        async with httpx.AsyncClient(timeout=timeout) as client:
+        delivery_start = now_vietnam_time()
+        result = await callback_client.post_json(url=CALLBACK_URL, payload=payload)
+        message_spans += [{
+            "timestamp_start": delivery_start.isoformat(),
+            "timestamp_end": now_vietnam_time().isoformat(),
+            "duration_ms": result.duration_ms,
+            "step_name": "callback_delivery",
+            "service_name": "chatbot_service",
+            "direction": "internal",
+            "status": "ok" if result.ok else "error"
+        }]
+        
+        data = {}
+        if result.response is not None:
             try:
-                response = await client.post(
-                    CALLBACK_URL,
-                    json=payload,
-                    headers={"Content-Type": "application/json"},
-                )
-                
-                data = response.json()
-                if response.status_code == 200:
-                    logger.info(f"Scucessfully sent response to webhook for chat_id: {chat_id}")
-                else:
-                    logger.error(f"Error sending to webhook. Status: {response.status_code}, chat_id: {chat_id}, detail: {data["detail"]}")
-                
-            except httpx.RequestError as exc:
-                logger.error(f"An error occurred: {exc}")
-            except httpx.HTTPStatusError as exc:
-                logger.error(f"Non-success status: {exc.response.status_code}")
+                data = result.response.json()
+            except ValueError:
+                logger.error(f"Webhook returned a non-JSON body for chat_id: {chat_id}")
         
-        message_spans += [data["message_span"]]
-        check_create_spans = await _handle_message_spans(
+        if result.ok:
+            logger.info(f"Scucessfully sent response to webhook for chat_id: {chat_id} ({result.attempts} attempt(s), {result.duration_ms} ms)")
+        elif result.response is not None:
+            logger.error(f"Error sending to webhook. Status: {result.response.status_code}, chat_id: {chat_id}, detail: {data.get("detail")}")
+        else:
+            logger.error(f"Cannot send to webhook for chat_id: {chat_id} after {result.attempts} attempt(s): {result.error}")
+        
+        if data.get("message_span"):
+            message_spans += [data["message_span"]]
+        
+        await _handle_message_spans(
             session_id=session_id,
             customer_id=customer_id,
             message_spans=message_spans
         )
-        
-        if not check_create_spans:
-            logger.error("Error in DB -> Cannot create message spans")
-            raise Exception("Error in DB -> Cannot create message spans")
-        logger.info("Create message spans successfully")
+        logger.info("Queued message spans")
         
     except Exception as e:
         error_details = traceback.format_exc()
@@ -319,7 +479,7 @@ async def _create_session_and_event(customer: dict, thread_id: str, event_type:
     
     return True
 
-async def _handle_old_customer(customer: dict):
+async def _handle_old_customer(customer: dict, graph: StateGraph | None = None):
     if customer["sessions"]:
         session = customer["sessions"][0]
         last_active_at = session["last_active_at"]
@@ -342,6 +502,7 @@ async def _handle_old_customer(customer: dict):
                 logger.error(f"Error in DB -> Cannot close session id: {session["id"]}")
                 return None, None
             logger.info(f"Close session successfully id: {end_session["id"]}")
+            await _delete_checkpoint(graph=graph, thread_id=session["thread_id"])
         else:
             logger.info("Customer last active does not exceed specify day -> update last active session")
             update_session = await async_session_repo.update_last_active_session(session_id=session["id"])
@@ -394,14 +555,55 @@ async def _handle_new_customer(chat_id: str) -> tuple[None, None] | tuple[dict,
     
     return customer, thread_id
 
-async def _handle_customer(chat_id: str) -> tuple[None, None, None] | tuple[dict, str, bool]:
+_resolve_rpc_available = RESOLVE_CUSTOMER_RPC
+
+async def _resolve_customer_rpc(
+    chat_id: str,
+    graph: StateGraph | None = None
+) -> tuple[None, None, None] | tuple[dict, str, bool]:
+    """Lấy/tạo customer và session active bằng một lần gọi RPC `resolve_customer_session`."""
+    result = await async_customer_repo.resolve_customer_session(
+        chat_id=chat_id,
+        thread_id=str(uuid.uuid4()),
+        n_days=N_DAYS
+    )
+    if not result:
+        logger.error("Error in DB -> Cannot resolve customer session")
+        return None, None, None
+
+    customer, new_customer_flag, ended_thread_id = result
+    if ended_thread_id:
+        logger.info(f"Customer last active exceed specify day -> closed thread_id: {ended_thread_id}")
+        await _delete_checkpoint(graph=graph, thread_id=ended_thread_id)
+
+    thread_id = customer["sessions"][0]["thread_id"]
+    logger.info(
+        f"Resolve customer id: {customer["id"]} | thread_id: {thread_id} | new customer: {new_customer_flag}"
+    )
+    return customer, thread_id, new_customer_flag
+
+async def _handle_customer(
+    chat_id: str,
+    graph: StateGraph | None = None
+) -> tuple[None, None, None] | tuple[dict, str, bool]:
+    global _resolve_rpc_available
+    if _resolve_rpc_available:
+        try:
+            return await _resolve_customer_rpc(chat_id=chat_id, graph=graph)
+        except Exception as e:
+            # PGRST202: DB chưa có function -> dùng chuỗi request cũ cho tới khi khởi động lại
+            if getattr(e, "code", None) != "PGRST202":
+                raise
+            logger.warning("RPC resolve_customer_session not found -> fall back to sequential requests")
+            _resolve_rpc_available = False
+
     customer = await async_customer_repo.find_customer(chat_id=chat_id)
     new_customer_flag = False
         
     if customer:
         logger.info(f"Customer exist id: {customer["id"]}")
         
-        customer, thread_id = await _handle_old_customer(customer=customer)
+        customer, thread_id = await _handle_old_customer(customer=customer, graph=graph)
         logger.info(f"Handle old customer id: {customer["id"]} | thread_id: {thread_id}")
     else:
         # Customer is new -> create customer and add event
@@ -416,6 +618,44 @@ async def _handle_customer(chat_id: str) -> tuple[None, None, None] | tuple[dict
     
     return customer, thread_id, new_customer_flag
 
+async def _delete_checkpoint(graph: StateGraph | None, thread_id: str | None):
+    """Xoá checkpoint của thread khi session kết thúc."""
+    if graph is None or not thread_id:
+        return
+    
+    try:
+        await graph.checkpointer.adelete_thread(thread_id)
+        logger.info(f"Delete checkpoint of thread_id: {thread_id}")
+    except Exception as e:
+        logger.error(f"Cannot delete checkpoint of thread_id {thread_id}: {e}")
+
+async def _save_session_state(session: dict, state: dict) -> bool:
+    """
+    Chỉ ghi phần thay đổi so với state đầu lượt (message mới + field đổi giá trị)
+    vào session_state_deltas. Ghi lại snapshot đầy đủ khi đã có STATE_SNAPSHOT_EVERY
+    delta hoặc khi message cũ bị xoá/sửa.
+    """
+    stored: LazyState = session["state_base64"]
+    seq = stored.seq + 1
+    delta = diff_state(stored, state) if stored else None
+
+    if delta is not None and stored.pending_deltas + 1 < STATE_SNAPSHOT_EVERY:
+        if not delta:
+            return True
+        saved = await async_session_repo.append_state_delta(
+            session_id=session["id"],
+            seq=seq,
+            delta=delta
+        )
+    else:
+        saved = await async_session_repo.compact_state_session(
+            state=state,
+            session_id=session["id"],
+            seq=seq
+        )
+    
+    return bool(saved)
+
 async def _handle_final_process(
     customer: dict,
     graph: StateGraph,
@@ -424,37 +664,104 @@ async def _handle_final_process(
     event_type: str = "bot_response_success"
 ):
     # Create event chatbot response successfully
-    event = await async_event_repo.create_event(
+    _record_event(
         customer_id=customer["id"],
         session_id=customer["sessions"][0]["id"],
         event_type=event_type
     )
-    if not event:
-        logger.error("Error in DB -> Cannot add event record")
-    logger.info(f"Add event bot_response_success successfully id: {event["id"]}")
+    logger.info(f"Queue event {event_type} for customer id: {customer["id"]}")
+    
+    # Checkpointer lưu bền đã giữ state của thread, không cần lưu state_base64
+    if is_persistent(graph.checkpointer):
+        return
     
     # Update state to session table
-    session = await async_session_repo.update_state_session(
-        state=graph.get_state(config).values,
-        session_id=customer["sessions"][0]["id"],
-    )
-    if not session:
+    snapshot = await graph.aget_state(config)
+    saved = await _save_session_state(session=customer["sessions"][0], state=snapshot.values)
+    if not saved:
         logger.error("Error in DB -> Cannot update state in session record")
-    logger.info(f"Update state to session record successfully id: {session["id"]}")
+    else:
+        logger.info(f"Update state to session record successfully id: {customer["sessions"][0]["id"]}")
     
     # Delete the state in graph
-    graph.checkpointer.delete_thread(thread_id)
+    await graph.checkpointer.adelete_thread(thread_id)
+    
+async def _run_webhook_turn_graph(
+    chat_id: str,
+    user_input: str,
+    customer: dict,
+    new_customer_flag: bool,
+    thread_id: str,
+    config: dict,
+    graph: StateGraph
+) -> ResponseModel:
+    """Phần có side effect của một lượt webhook: lệnh, hoặc chạy graph và lưu state."""
+    messages = None
+    if any(cmd in user_input for cmd in ["/start", "/restart"]):
+        messages = await handle_new_chat(
+            customer=customer,
+            new_customer_flag=new_customer_flag,
+            graph=graph
+        )
+
+        if not messages["error"]:
+            logger.info("Create new chat session successfully")
+
+    elif user_input == "/delete_me":
+        messages = await handle_delete_me(
+            customer_id=customer["id"],
+            graph=graph,
+            thread_id=thread_id
+        )
+
+        if not messages["error"]:
+            logger.info("Delete new customer in DB successfully")
+    else:
+        messages = await handle_normal_chat(
+            user_input=user_input,
+            chat_id=chat_id,
+            customer=customer,
+            config=config,
+            graph=graph
+        )
+        
+        if messages["error"]:
+            logger.error("Error in processing chat -> add event")
+            event_type = "bot_response_failure"
+        else:
+            logger.info("Chat process successfully -> add event")
+            event_type = "bot_response_success"
+
+        await _handle_final_process(
+            customer=customer,
+            graph=graph,
+            config=config,
+            thread_id=thread_id,
+            event_type=event_type
+        )
     
+    return messages
+
 async def _process_webhook_message(
     chat_id: str, 
     user_input: str, 
     graph: StateGraph,
     timestamp_start: datetime = None,
     message_spans: list[dict] = None,
+    final_attempt: bool = True,
+    jobs: list[Job] | None = None,
 ):
+    """
+    `jobs`: các job của lượt chat. Graph chỉ chạy một lần cho mỗi lượt: lần retry sau khi
+    graph đã xong chỉ gửi lại câu trả lời đã lưu, còn nếu lần trước graph chạy dở (tool
+    đặt/sửa lịch có thể đã ghi DB, HumanMessage có thể đã được lưu) thì không chạy lại
+    mà báo lỗi cho khách.
+    """
     messages = None
+    job_ids = [job.id for job in jobs or []]
+    stage = jobs[0].stage if jobs else None
     try:
-        customer, thread_id, new_customer_flag = await _handle_customer(chat_id=chat_id)
+        customer, thread_id, new_customer_flag = await _handle_customer(chat_id=chat_id, graph=graph)
         if not customer or not thread_id:
             logger.error("Not found customer or thread_id")
             raise Exception("Not found customer or thread_id")
@@ -466,48 +773,31 @@ async def _process_webhook_message(
         config = {"configurable": {"thread_id": thread_id}}
         logger.info(f"Tin nhắn của khách: {user_input}")
 
-        if any(cmd in user_input for cmd in ["/start", "/restart"]):
-            messages = await handle_new_chat(
-                customer=customer,
-                new_customer_flag=new_customer_flag
-            )
-
-            if not messages["error"]:
-                logger.info("Create new chat session successfully")
-
-        elif user_input == "/delete_me":
-            messages = await handle_delete_me(customer_id=customer["id"])
-
-            if not messages["error"]:
-                logger.info("Delete new customer in DB successfully")
+        if stage == JOB_STAGE_DONE:
+            logger.info(f"Graph already completed for jobs {job_ids} -> resend the saved reply")
+            messages = ResponseModel(**jobs[0].result)
+        elif stage == JOB_STAGE_STARTED:
+            raise NonRetryableJobError(f"Turn of jobs {job_ids} was interrupted after the graph started")
         else:
-            messages = await handle_normal_chat(
-                user_input=user_input,
+            if job_ids:
+                await _job_queue_io(job_queue.mark_started, job_ids)
+            messages = await _run_webhook_turn_graph(
                 chat_id=chat_id,
+                user_input=user_input,
                 customer=customer,
+                new_customer_flag=new_customer_flag,
+                thread_id=thread_id,
                 config=config,
                 graph=graph
             )
-            
-            if messages["error"]:
-                logger.error("Error in processing chat -> add event")
-                event_type = "bot_response_failure"
-            else:
-                logger.info("Chat process successfully -> add event")
-                event_type = "bot_response_success"
-
-            await _handle_final_process(
-                customer=customer,
-                graph=graph,
-                config=config,
-                thread_id=thread_id,
-                event_type=event_type
-            )
+            if job_ids and messages:
+                await _job_queue_io(job_queue.mark_completed, job_ids, messages)
         
         if messages:
             if messages["error"]:
                 logger.error(f"Error in processing chat: {messages['error']}")
-                raise Exception(messages["error"])
+                # Graph/lệnh đã chạy (có thể đã ghi DB) nên không retry
+                raise NonRetryableJobError(messages["error"])
             else:
                 await send_to_callback(
                     text=messages["content"], 
@@ -529,6 +819,10 @@ async def _process_webhook_message(
         logger.error(f"Exception: {e}")
         logger.error(f"Chi tiết lỗi: \n{error_details}")
         
+        # Còn lượt thử lại thì để job queue retry, chưa báo lỗi cho khách
+        if not final_attempt and not isinstance(e, NonRetryableJobError):
+            raise
+        
         await send_to_callback(
             text="Lỗi server, xin vui lòng thử lại sau", 
             chat_id=chat_id,
@@ -538,6 +832,7 @@ async def _process_webhook_message(
             session_id=customer["sessions"][0]["id"],
             customer_id=customer["id"]
         )
+        raise
         
 async def _process_invoke_message(
     chat_id: str, 
@@ -547,7 +842,7 @@ async def _process_invoke_message(
 ):
     messages = None
     try:
-        customer, thread_id, new_customer_flag = await _handle_customer(chat_id=chat_id)
+        customer, thread_id, new_customer_flag = await _handle_customer(chat_id=chat_id, graph=graph)
         if not customer or not thread_id:
             logger.error("Not found customer or thread_id")
             raise Exception("Not found customer or thread_id")
@@ -562,14 +857,19 @@ async def _process_invoke_message(
         if any(cmd in user_input for cmd in ["/start", "/restart"]):
             messages = await handle_new_chat(
                 customer=customer,
-                new_customer_flag=new_customer_flag
+                new_customer_flag=new_customer_flag,
+                graph=graph
             )
 
             if not messages["error"]:
                 logger.info("Create new chat session successfully")
 
         elif user_input == "/delete_me":
-            messages = await handle_delete_me(customer_id=customer["id"])
+            messages = await handle_delete_me(
+                customer_id=customer["id"],
+                graph=graph,
+                thread_id=thread_id
+            )
 
             if not messages["error"]:
                 logger.info("Delete new customer in DB successfully")
@@ -608,7 +908,7 @@ async def _process_invoke_message(
                     timestamp_end=timestamp_end
                 )
                 
-                check_create_spans = await _handle_message_spans(
+                await _handle_message_spans(
                     session_id=customer["sessions"][0]["id"],
                     customer_id=customer["id"],
                     message_spans=[
@@ -632,10 +932,7 @@ async def _process_invoke_message(
                         }
                     ]
                 )
-                
-                if not check_create_spans:
-                    logger.error("Error in DB -> Cannot create message spans")
-                logger.info("Create message spans successfully")
+                logger.info("Queued message spans")
                 
                 return 200, messages["content"]
         else:
@@ -653,7 +950,7 @@ async def _process_invoke_message(
             timestamp_end=timestamp_end
         )
         
-        check_create_spans = await _handle_message_spans(
+        await _handle_message_spans(
             session_id=customer["sessions"][0]["id"],
             customer_id=customer["id"],
             message_spans=[
@@ -677,13 +974,222 @@ async def _process_invoke_message(
                 }
             ]
         )
-        
-        if not check_create_spans:
-            logger.error("Error in DB -> Cannot create message spans")
-        logger.info("Create message spans successfully")
+        logger.info("Queued message spans")
         
         return 500, "Lỗi server, xin vui lòng thử lại sau"
 
+# ---------------------------------------------------------------------------------
+# Streaming
+# ---------------------------------------------------------------------------------
+
+def _is_specialist_token(event: dict) -> bool:
+    if event["event"] != "on_chat_model_stream":
+        return False
+    
+    # checkpoint_ns của LLM trong agent ReAct có dạng "booking_agent:<id>|agent:<id>"
+    checkpoint_ns = event.get("metadata", {}).get("checkpoint_ns", "")
+    if not checkpoint_ns.startswith(STREAM_NODES):
+        return False
+    
+    chunk = event["data"]["chunk"]
+    return bool(chunk.content) and not chunk.tool_call_chunks
+
+async def handle_stream_chat(
+    user_input: str,
+    chat_id: str,
+    customer: dict,
+    config: dict,
+    graph: StateGraph,
+    on_token: Callable[[str], None]
+) -> ResponseModel:
+    """
+    Giống `handle_normal_chat` nhưng chạy `graph.astream_events` và gọi `on_token`
+    cho từng token của agent chuyên trách ngay khi LLM sinh ra.
+    """
+    try:
+        state = await _build_turn_state(
+            user_input=user_input,
+            chat_id=chat_id,
+            customer=customer,
+            config=config,
+            graph=graph
+        )
+
+        async for event in graph.astream_events(state, config=config, version="v2"):
+            if _is_specialist_token(event):
+                on_token(event["data"]["chunk"].content)
+        
+        snapshot = await graph.aget_state(config)
+        data = snapshot.values["messages"][-1].content
+
+        return ResponseModel(
+            content=data, 
+            error=None
+        )
+    
+    except Exception as e:
+        error_details = traceback.format_exc()
+        logger.error(f"Exception: {e}")
+        logger.error(f"Chi tiết lỗi: \n{error_details}")
+        
+        return ResponseModel(
+            content=None,
+            error=str(e)
+        )
+
+async def _process_stream_message(
+    chat_id: str, 
+    user_input: str, 
+    graph: StateGraph,
+    output: asyncio.Queue,
+    timestamp_start: datetime = None
+):
+    """
+    Xử lý một lượt chat dạng stream. Token được đẩy vào `output` dưới dạng
+    ("token", text), kết thúc bằng ("done", content) hoặc ("error", message).
+    Việc lưu session/event/span vẫn chạy khi client đã ngắt kết nối.
+    """
+    messages = None
+    customer = None
+    first_token_at: datetime | None = None
+    finished = False
+    
+    def on_token(token: str):
+        nonlocal first_token_at
+        if first_token_at is None:
+            first_token_at = now_vietnam_time()
+        output.put_nowait(("token", token))
+    
+    def finish(content: str):
+        nonlocal finished
+        # Không có token nào được stream (lệnh /start, /delete_me, ...): gửi cả câu trả lời một lần
+        if first_token_at is None and content:
+            on_token(content)
+        output.put_nowait(("done", content))
+        finished = True
+    
+    try:
+        customer, thread_id, new_customer_flag = await _handle_customer(chat_id=chat_id, graph=graph)
+        if not customer or not thread_id:
+            logger.error("Not found customer or thread_id")
+            raise Exception("Not found customer or thread_id")
+        
+        if customer["control_mode"] == "ADMIN":
+            logger.info(f"Customer {chat_id} is under ADMIN control. Skipping bot response.")
+            finish("")
+            return
+
+        config = {"configurable": {"thread_id": thread_id}}
+        logger.info(f"Tin nhắn của khách: {user_input}")
+
+        if any(cmd in user_input for cmd in ["/start", "/restart"]):
+            messages = await handle_new_chat(
+                customer=customer,
+                new_customer_flag=new_customer_flag,
+                graph=graph
+            )
+        elif user_input == "/delete_me":
+            messages = await handle_delete_me(
+                customer_id=customer["id"],
+                graph=graph,
+                thread_id=thread_id
+            )
+        else:
+            messages = await handle_stream_chat(
+                user_input=user_input,
+                chat_id=chat_id,
+                customer=customer,
+                config=config,
+                graph=graph,
+                on_token=on_token
+            )
+            
+            # Khách đã nhận đủ câu trả lời, phần lưu session/event chạy sau khi đóng stream
+            if not messages["error"]:
+                finish(messages["content"])
+            
+            await _handle_final_process(
+                customer=customer,
+                graph=graph,
+                config=config,
+                thread_id=thread_id,
+                event_type="bot_response_failure" if messages["error"] else "bot_response_success"
+            )
+        
+        if messages["error"]:
+            raise Exception(messages["error"])
+        
+        if not finished:
+            finish(messages["content"])
+        status = "ok"
+        
+    except Exception as e:
+        error_details = traceback.format_exc()
+        logger.error(f"Exception: {e}")
+        logger.error(f"Chi tiết lỗi: \n{error_details}")
+        
+        if not finished:
+            output.put_nowait(("error", "Lỗi server, xin vui lòng thử lại sau"))
+        status = "error"
+    
+    if customer is None:
+        return
+    
+    timestamp_end = now_vietnam_time()
+    message_spans = [
+        {
+            "timestamp_start": timestamp_start.isoformat(),
+            "timestamp_end": timestamp_end.isoformat(),
+            "duration_ms": 0,
+            "step_name": "chatbot_process",
+            "service_name": "chatbot_service",
+            "direction": "inbound",
+            "status": "ok"
+        },
+        {
+            "timestamp_start": timestamp_start.isoformat(),
+            "timestamp_end": timestamp_end.isoformat(),
+            "duration_ms": cal_duration_ms(
+                timestamp_start=timestamp_start,
+                timestamp_end=timestamp_end
+            ),
+            "step_name": "chatbot_process",
+            "service_name": "chatbot_service",
+            "direction": "outbound",
+            "status": status
+        }
+    ]
+    if first_token_at is not None:
+        message_spans.append({
+            "timestamp_start": timestamp_start.isoformat(),
+            "timestamp_end": first_token_at.isoformat(),
+            "duration_ms": cal_duration_ms(
+                timestamp_start=timestamp_start,
+                timestamp_end=first_token_at
+            ),
+            "step_name": "time_to_first_token",
+            "service_name": "chatbot_service",
+            "direction": "internal",
+            "status": status
+        })
+    
+    await _handle_message_spans(
+        session_id=customer["sessions"][0]["id"],
+        customer_id=customer["id"],
+        message_spans=message_spans
+    )
+    logger.info("Queued message spans")
+
+def _format_stream_item(kind: str, text: str, chat_id: str, media_type: str) -> str:
+    if media_type == "text/plain":
+        return text if kind != "done" else ""
+    
+    if kind == "done":
+        return "data: [DONE]\n\n"
+    
+    key = "error" if kind == "error" else "content"
+    return f"data: {json.dumps({key: text, "chat_id": chat_id}, ensure_ascii=False)}\n\n"
+
 # ---------------------------------------------------------------------------------
 # Main function
 # ---------------------------------------------------------------------------------
@@ -694,15 +1200,122 @@ async def handle_invoke_request(
     graph: StateGraph,
     timestamp_start: datetime = None
 ) -> ChatResponse:
-    status_code, response = await _process_invoke_message(
-        chat_id=chat_id,
-        user_input=user_input,
-        graph=graph,
-        timestamp_start=timestamp_start
+    if _shutdown.is_set():
+        return _shutting_down_response()
+    if not worker_pool.try_reserve():
+        logger.warning(f"Worker pool is full -> reject invoke of chat_id: {chat_id}")
+        return PlainTextResponse(
+            content=BUSY_MESSAGE,
+            status_code=503,
+            headers={"Retry-After": str(SHED_RETRY_AFTER_SECONDS)}
+        )
+    
+    status_code, response = await chat_mailbox.submit(
+        chat_id,
+        lambda: worker_pool.run(
+            lambda: repo_metrics.track_request(
+                chat_id=chat_id,
+                kind="invoke",
+                coro=_process_invoke_message(
+                    chat_id=chat_id,
+                    user_input=user_input,
+                    graph=graph,
+                    timestamp_start=timestamp_start
+                )
+            )
+        )
     )
     
     return PlainTextResponse(content=response, status_code=status_code)
 
+async def handle_stream_request(
+    chat_id: str, 
+    user_input: str, 
+    graph: StateGraph,
+    timestamp_start: datetime = None,
+    media_type: str = "text/event-stream"
+) -> StreamingResponse | PlainTextResponse:
+    """
+    Trả lời dạng stream: SSE (`text/event-stream`) hoặc chunked HTTP (`text/plain`).
+    Lượt chat vẫn đi qua worker pool và hộp thư theo `chat_id` như `/chat/invoke`.
+    """
+    if _shutdown.is_set():
+        return _shutting_down_response()
+    if not worker_pool.try_reserve():
+        logger.warning(f"Worker pool is full -> reject stream of chat_id: {chat_id}")
+        return PlainTextResponse(
+            content=BUSY_MESSAGE,
+            status_code=503,
+            headers={"Retry-After": str(SHED_RETRY_AFTER_SECONDS)}
+        )
+    
+    output: asyncio.Queue = asyncio.Queue()
+    chat_mailbox.submit(
+        chat_id,
+        lambda: worker_pool.run(
+            lambda: repo_metrics.track_request(
+                chat_id=chat_id,
+                kind="stream",
+                coro=_process_stream_message(
+                    chat_id=chat_id,
+                    user_input=user_input,
+                    graph=graph,
+                    output=output,
+                    timestamp_start=timestamp_start
+                )
+            )
+        )
+    )
+    
+    async def body():
+        while True:
+            kind, text = await output.get()
+            yield _format_stream_item(kind=kind, text=text, chat_id=chat_id, media_type=media_type)
+            if kind == "error":
+                yield _format_stream_item(kind="done", text="", chat_id=chat_id, media_type=media_type)
+            if kind in ("done", "error"):
+                break
+    
+    return StreamingResponse(body(), media_type=media_type)
+
+def _shutting_down_response() -> PlainTextResponse:
+    """App đang tắt: phía gửi thử lại sau (sang instance khác), tin nhắn không được ghi nhận."""
+    return PlainTextResponse(
+        content="Shutting down",
+        status_code=503,
+        headers={"Retry-After": str(SHED_RETRY_AFTER_SECONDS)}
+    )
+
+async def _send_busy_callback(chat_id: str):
+    payload = {
+        "chat_id": chat_id,
+        "response": BUSY_MESSAGE
+    }
+    
+    result = await callback_client.post_json(url=CALLBACK_URL, payload=payload)
+    if result.ok:
+        logger.info(f"Sent busy callback for chat_id: {chat_id}")
+    else:
+        logger.error(f"Cannot send busy callback for chat_id: {chat_id}: {result.error or result.response.status_code}")
+
+async def _shed_webhook_message(chat_id: str) -> PlainTextResponse:
+    """
+    Chính sách giảm tải khi worker pool đầy (WEBHOOK_SHED_POLICY):
+        - "429" / "503": trả mã lỗi kèm Retry-After để phía gửi thử lại.
+        - "callback": nhận tin (200) và báo ngay cho khách là hệ thống đang bận.
+    """
+    logger.warning(f"Worker pool is full -> shed webhook of chat_id: {chat_id} ({WEBHOOK_SHED_POLICY})")
+    
+    if WEBHOOK_SHED_POLICY == "callback":
+        await _send_busy_callback(chat_id=chat_id)
+        return PlainTextResponse(content="OK", status_code=200)
+    
+    return PlainTextResponse(
+        content="Busy",
+        status_code=429 if WEBHOOK_SHED_POLICY == "429" else 503,
+        headers={"Retry-After": str(SHED_RETRY_AFTER_SECONDS)}
+    )
+
 async def handle_webhook_request(
     chat_id: str, 
     user_input: str, 
@@ -710,14 +1323,260 @@ async def handle_webhook_request(
     timestamp_start: datetime = None,
     message_spans: list[dict] = None,
 ):
-    asyncio.create_task(
-        _process_webhook_message(
+    if _shutdown.is_set():
+        return _shutting_down_response()
+    
+    is_command = _is_command(user_input)
+    
+    # Ghi xuống đĩa trước khi trả "OK" để tin nhắn không mất khi restart. INSERT + commit
+    # chạy trên thread ghi riêng, không chặn event loop
+    job_id = await _job_queue_io(
+        job_queue.enqueue,
+        chat_id=chat_id,
+        payload={
+            "user_input": user_input,
+            "timestamp_start": timestamp_start.isoformat() if timestamp_start else None,
+            "message_spans": message_spans or []
+        }
+    )
+    
+    # Từ đây tới lúc vào coalescer/mailbox không còn await nên các tin của cùng chat_id
+    # giữ đúng thứ tự. Mỗi lượt chat mới cần một chỗ trong worker pool, tin gộp vào
+    # burst đang chờ thì không
+    if is_command or not burst_coalescer.has_pending(chat_id):
+        if not worker_pool.try_reserve():
+            job_queue_writer.submit(job_queue.discard, [job_id])
+            return await _shed_webhook_message(chat_id=chat_id)
+    
+    if is_command:
+        # Lệnh không gộp với tin khác: đẩy burst đang chờ trước để giữ thứ tự
+        burst_coalescer.flush(chat_id)
+        _submit_webhook_jobs(chat_id=chat_id, job_ids=[job_id], graph=graph)
+    else:
+        burst_coalescer.add(chat_id=chat_id, job_id=job_id, graph=graph)
+    
+    return PlainTextResponse(content="OK", status_code=200)
+
+async def _job_queue_io(func: Callable, *args, **kwargs):
+    """Chạy một thao tác của job queue trên `job_queue_writer`, theo thứ tự được gọi."""
+    return await asyncio.get_running_loop().run_in_executor(job_queue_writer, partial(func, *args, **kwargs))
+
+def _is_command(user_input: str) -> bool:
+    return any(cmd in user_input for cmd in COMMANDS)
+
+def _submit_webhook_jobs(chat_id: str, job_ids: list[int], graph: StateGraph, reserved: bool = True):
+    """
+    `reserved`: caller đã `worker_pool.try_reserve()` cho lần chạy đầu của lượt chat.
+    Nếu False, lượt chat chờ trong mailbox tới khi worker pool có chỗ.
+    """
+    chat_mailbox.submit(
+        chat_id,
+        lambda: _run_webhook_turn(chat_id=chat_id, job_ids=job_ids, graph=graph, reserved=reserved)
+    )
+
+async def _run_webhook_turn(chat_id: str, job_ids: list[int], graph: StateGraph, reserved: bool = True):
+    """
+    Chạy một lượt chat trong mailbox của `chat_id`, kể cả các lần retry: tin nhắn đến sau
+    của cùng khách chờ tới khi lượt này được ack hoặc vào dead letter nên vẫn đúng thứ tự.
+    Trong lúc chờ backoff không giữ chỗ trong worker pool.
+    """
+    if not reserved:
+        await worker_pool.reserve()
+    while True:
+        delay = await worker_pool.run(
+            lambda: repo_metrics.track_request(
+                chat_id=chat_id,
+                kind="webhook",
+                coro=_run_webhook_jobs(chat_id=chat_id, job_ids=job_ids, graph=graph)
+            )
+        )
+        if delay is None:
+            return
+        
+        logger.warning(f"Retry jobs {job_ids} of chat_id: {chat_id} in {delay}s")
+        if await _wait_unless_shutdown(delay):
+            return
+        await worker_pool.reserve()
+
+async def _wait_unless_shutdown(delay: float) -> bool:
+    """
+    Chờ `delay` giây, dừng sớm nếu app bắt đầu tắt.
+
+    Returns:
+        bool: True nếu app đang tắt: job để lại trong queue, được trả lại cho process sau.
+    """
+    try:
+        await asyncio.wait_for(_shutdown.wait(), timeout=delay)
+        return True
+    except asyncio.TimeoutError:
+        return False
+
+async def _run_webhook_jobs(chat_id: str, job_ids: list[int], graph: StateGraph) -> float | None:
+    """
+    Xử lý một lượt chat từ các job đã lưu (một hoặc nhiều tin nhắn đã được gộp).
+    Thành công thì ack, lỗi thì nack để retry theo backoff hoặc chuyển sang dead letter.
+
+    Returns:
+        float | None: Số giây chờ trước lần thử lại, None nếu không cần thử lại.
+    """
+    # Đọc lại payload từ đĩa: lần retry/replay luôn bắt đầu từ dữ liệu gốc. Job đã ack
+    # hoặc đang do worker khác giữ thì bỏ qua
+    jobs = await _job_queue_io(job_queue.claim, job_ids)
+    if not jobs:
+        return None
+    
+    job_ids = [job.id for job in jobs]
+    timestamp_start = jobs[0].payload["timestamp_start"]
+    
+    try:
+        await _process_webhook_message(
             chat_id=chat_id,
-            user_input=user_input,
+            user_input="\n".join(job.payload["user_input"] for job in jobs),
             graph=graph,
-            timestamp_start=timestamp_start,
-            message_spans=message_spans
+            timestamp_start=datetime.fromisoformat(timestamp_start) if timestamp_start else None,
+            message_spans=[span for job in jobs for span in job.payload["message_spans"]],
+            final_attempt=job_queue.is_final_attempt(jobs),
+            jobs=jobs
+        )
+    except Exception as e:
+        return await _job_queue_io(
+            job_queue.nack,
+            job_ids=job_ids,
+            error=str(e),
+            retry=not isinstance(e, NonRetryableJobError)
         )
-    )
     
-    return PlainTextResponse(content="OK", status_code=200)
+    await _job_queue_io(job_queue.ack, job_ids)
+    return None
+
+def _schedule_webhook_turns(chat_id: str, turns: list[list[int]], graph: StateGraph, delay: float = 0):
+    """Đưa lần lượt các lượt chat (mỗi lượt là một nhóm job) vào mailbox của `chat_id`."""
+    if _shutdown.is_set():
+        return
+    if delay > 0:
+        asyncio.get_running_loop().call_later(
+            delay, _schedule_webhook_turns, chat_id, turns, graph
+        )
+        return
+    
+    for job_ids in turns:
+        # Job retry/replay đã được nhận từ trước nên không bị shed, chỉ chờ worker pool có chỗ
+        _submit_webhook_jobs(chat_id=chat_id, job_ids=job_ids, graph=graph, reserved=False)
+
+def _group_turns(jobs: list[Job]) -> list[list[Job]]:
+    """
+    Gộp các job liên tiếp của một chat thành một lượt như coalescer. Lệnh luôn là lượt
+    riêng, job đã qua graph (stage/result khác nhau) không gộp với job chưa chạy.
+    """
+    turns: list[list[Job]] = []
+    for job in jobs:
+        previous = turns[-1][-1] if turns else None
+        if (
+            previous is None
+            or _is_command(job.payload["user_input"])
+            or _is_command(previous.payload["user_input"])
+            or (job.stage, job.result) != (previous.stage, previous.result)
+        ):
+            turns.append([job])
+        else:
+            turns[-1].append(job)
+    return turns
+
+async def replay_webhook_jobs(graph: StateGraph, reclaim_own: bool = False):
+    """
+    Nhận và xử lý lại các job chưa xong: job không worker nào giữ hoặc worker giữ nó đã
+    chết (lease hết hạn). Job đang chạy ở worker khác hay ở process này không bị đụng tới.
+    Job của cùng một chat_id được gộp lại thành lượt chat theo thứ tự id.
+    """
+    jobs = await _job_queue_io(job_queue.claim_pending, reclaim_own)
+    if jobs:
+        logger.warning(f"Replaying {len(jobs)} pending webhook jobs")
+    
+    jobs_by_chat: dict[str, list[Job]] = {}
+    for job in jobs:
+        jobs_by_chat.setdefault(job.chat_id, []).append(job)
+    
+    now = time.time()
+    for chat_id, chat_jobs in jobs_by_chat.items():
+        _schedule_webhook_turns(
+            chat_id=chat_id,
+            turns=[[job.id for job in turn] for turn in _group_turns(chat_jobs)],
+            graph=graph,
+            delay=max(0.0, max(job.next_attempt_at for job in chat_jobs) - now)
+        )
+
+async def sweep_webhook_jobs(graph: StateGraph):
+    """
+    Chạy nền suốt vòng đời app: replay lúc khởi động (kể cả job của lần chạy trước cùng
+    JOB_WORKER_ID), rồi định kỳ gia hạn lease các job đang giữ và nhận job của worker đã
+    chết (crash/redeploy giữa chừng) thay vì chỉ replay một lần.
+    """
+    await replay_webhook_jobs(graph=graph, reclaim_own=True)
+    # Gia hạn phải nhanh hơn lease hết hạn
+    interval = min(JOB_SWEEP_SECONDS, JOB_LEASE_SECONDS / 3)
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await _job_queue_io(job_queue.renew_leases)
+            await replay_webhook_jobs(graph=graph)
+        except Exception as e:
+            logger.error(f"Job sweep error: {e}")
+
+async def start_callback_client():
+    await callback_client.start()
+
+async def close_callback_client():
+    await callback_client.aclose()
+
+async def start_telemetry_sink():
+    await telemetry_sink.start()
+
+async def close_telemetry_sink():
+    # Flush các event/span còn trong buffer trước khi tắt
+    await telemetry_sink.aclose()
+
+async def drain_chat_turns(timeout_s: float = SHUTDOWN_DRAIN_SECONDS):
+    """
+    Tắt êm: ngừng nhận lượt chat mới, đẩy các burst đang gom đi xử lý ngay, rồi chờ các
+    lượt đang chạy/đang xếp hàng (kể cả retry) xong trong tối đa `timeout_s` giây. Lượt
+    còn dở khi hết giờ bị huỷ, job của nó được `close_job_queue` trả lại cho process sau.
+    Gọi trước `close_job_queue`, `close_callback_client` và `close_telemetry_sink`.
+    """
+    _shutdown.set()
+    burst_coalescer.flush_all()
+    
+    if await chat_mailbox.drain(timeout_s):
+        logger.info("Drained all chat turns before shutdown")
+
+def close_job_queue():
+    # Chạy sau mọi thao tác đã gửi. Process sau (hoặc worker khác) nhận ngay các job chưa
+    # xong, không chờ lease hết
+    job_queue_writer.submit(job_queue.release)
+    job_queue_writer.submit(job_queue.close)
+    job_queue_writer.shutdown(wait=True)
+
+def _flush_burst(chat_id: str, burst: Burst):
+    _submit_webhook_jobs(chat_id=chat_id, job_ids=burst.job_ids, graph=burst.graph)
+
+# Gộp các tin nhắn gửi liên tiếp của một khách thành một lượt chat
+burst_coalescer = BurstCoalescer(
+    on_flush=_flush_burst,
+    window_ms=COALESCE_WINDOW_MS,
+    max_wait_ms=COALESCE_MAX_WAIT_MS
+)
+
+async def get_service_metrics() -> dict:
+    return {
+        "worker_pool": worker_pool.stats(),
+        "job_queue": await _job_queue_io(job_queue.stats),
+        "callback": callback_client.stats(),
+        "mailbox": chat_mailbox.stats(),
+        "coalescer": burst_coalescer.stats(),
+        "summary": summary_stats.stats(),
+        "context_view": context_view_stats.stats(),
+        "customer_cache": customer_cache.stats(),
+        "telemetry": telemetry_sink.stats(),
+        "span_index": last_outbound_span_index.stats(),
+        "availability_cache": availability_cache.stats(),
+        "repository": repo_metrics.stats()
+    }
@@ -0,0 +1,379 @@
+import json
+import time
+import asyncio
+import sqlite3
+from collections import deque
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable
+
+from postgrest.exceptions import APIError
+
+from services.metrics import LatencyStats
+from log.logger_config import setup_logging
+
+logger = setup_logging(__name__)
+
+Writer = Callable[[list[dict]], Awaitable[list[dict] | None]]
+
+# SQLSTATE tạm thời: mất kết nối (08), deadlock/serialization (40), thiếu tài nguyên (53),
+# bị huỷ/timeout (57)
+_TRANSIENT_SQLSTATE_CLASSES = ("08", "40", "53", "57")
+
+
+def _is_transient(error: Exception) -> bool:
+    """Lỗi mạng/timeout/5xx/429 thì thử lại được, lỗi dữ liệu 4xx (vi phạm ràng buộc, ...) thì không."""
+    if not isinstance(error, APIError):
+        return True
+
+    code = str(error.code or "")
+    if len(code) == 3 and code.isdigit():
+        # Response không phải JSON của PostgREST (gateway, proxy): code là HTTP status
+        return int(code) >= 500 or int(code) == 429
+    return code[:2] in _TRANSIENT_SQLSTATE_CLASSES
+
+
+class TelemetrySink:
+    """
+    Ghi dữ liệu thống kê (events, message_spans) theo kiểu write-behind: lượt chat chỉ
+    thêm dòng vào buffer trong bộ nhớ, một task nền gom lại và insert hàng loạt.
+
+    - Flush khi một bảng có đủ `flush_size` dòng hoặc sau mỗi `flush_interval_s`.
+    - Tổng số dòng trong buffer không vượt quá `max_buffered`. Khi đầy (hoặc flush lỗi
+      mà buffer không còn chỗ nhận lại), `overflow_policy` quyết định:
+        - "spill": ghi ra SQLite (`spill_path`), đẩy lại vào DB khi buffer rảnh.
+        - "drop": bỏ dòng và tăng bộ đếm `dropped`.
+    - Flush lỗi tạm thời (mạng, 5xx, ...): batch được giữ lại và thử trước ở lần flush
+      sau. Lỗi quá `max_attempts` lần thì batch được spill/drop, flush tiếp phần còn lại.
+    - Lỗi dữ liệu (4xx, vd. span của khách đã bị /delete_me): không thử lại. Batch được
+      chia đôi dần để tách đúng các dòng lỗi, các dòng đó vào bảng `dead_letters` của
+      file `spill_path`, các dòng còn lại vẫn được insert.
+    - `aclose` flush phần còn lại khi app tắt, không flush được thì spill/drop.
+    - Mọi thao tác với file spill chạy trên một thread riêng theo thứ tự được gọi, không
+      chặn event loop (`add` khi buffer đầy chỉ xếp lệnh ghi).
+
+    Mỗi bảng có một `writer` (vd. `AsyncMessageSpanRepo.create_message_span_bulk`)
+    nhận list dòng và trả về các dòng đã insert (rỗng/None = lỗi).
+    """
+    def __init__(
+        self,
+        writers: dict[str, Writer],
+        flush_size: int = 200,
+        flush_interval_s: float = 1.0,
+        max_buffered: int = 10_000,
+        overflow_policy: str = "spill",
+        spill_path: str = "telemetry_spill.db",
+        max_attempts: int = 5
+    ):
+        if overflow_policy not in ("spill", "drop"):
+            raise ValueError(f"Invalid overflow_policy: {overflow_policy}. Must be 'spill' or 'drop'")
+
+        self.writers = writers
+        self.flush_size = flush_size
+        self.flush_interval_s = flush_interval_s
+        self.max_buffered = max_buffered
+        self.overflow_policy = overflow_policy
+        self.spill_path = spill_path
+        self.max_attempts = max_attempts
+
+        self._buffers: dict[str, deque[dict]] = {table: deque() for table in writers}
+        # Batch lỗi tạm thời của mỗi bảng chờ thử lại: (dòng, số lần đã lỗi)
+        self._retry: dict[str, tuple[list[dict], int]] = {}
+        self._buffered = 0
+        self._spill: sqlite3.Connection | None = None
+        self._spill_executor: ThreadPoolExecutor | None = None
+        self._spill_writes: set[asyncio.Future] = set()
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        self._flush_lock: asyncio.Lock | None = None
+
+        self.added = 0
+        self.flushed = 0
+        self.batches = 0
+        self.failed_batches = 0
+        self.dead_lettered = 0
+        self.dropped = 0
+        self.spilled = 0
+        self.unspilled = 0
+        self.flush_latency = LatencyStats()
+
+    # -----------------------------------------------------------------------------
+    # Ghi (gọi từ lượt chat, không chờ I/O)
+    # -----------------------------------------------------------------------------
+
+    def add(self, table: str, rows: list[dict]):
+        if table not in self._buffers:
+            raise ValueError(f"Unknown telemetry table: {table}")
+        if not rows:
+            return
+
+        self.added += len(rows)
+        room = max(0, self.max_buffered - self._buffered)
+        accepted, overflow = rows[:room], rows[room:]
+
+        self._buffers[table].extend(accepted)
+        self._buffered += len(accepted)
+        if overflow:
+            self._overflow(table, overflow)
+
+        if self._wakeup is not None and len(self._buffers[table]) >= self.flush_size:
+            self._wakeup.set()
+
+    # -----------------------------------------------------------------------------
+    # Vòng đời
+    # -----------------------------------------------------------------------------
+
+    async def start(self):
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._flush_lock = asyncio.Lock()
+            self._task = asyncio.create_task(self._run())
+
+    async def aclose(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        await self.flush()
+        for table, buffer in self._buffers.items():
+            rows = self._retry.pop(table, ([], 0))[0] + list(buffer)
+            if rows:
+                buffer.clear()
+                self._buffered -= len(rows)
+                logger.warning(f"Telemetry sink closing with {len(rows)} unflushed {table} rows")
+                self._overflow(table, rows)
+
+        await self._wait_spill_writes()
+        if self._spill_executor is not None:
+            await self._spill_io(self._close_spill)
+            self._spill_executor.shutdown(wait=True)
+            self._spill_executor = None
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval_s)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+            try:
+                await self.flush()
+                await self._unspill()
+            except Exception as e:
+                logger.error(f"Telemetry flush error: {e}")
+
+    # -----------------------------------------------------------------------------
+    # Flush
+    # -----------------------------------------------------------------------------
+
+    async def flush(self):
+        """Insert toàn bộ buffer hiện tại, mỗi bảng theo lô tối đa `flush_size` dòng."""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+
+        async with self._flush_lock:
+            for table, buffer in self._buffers.items():
+                while table in self._retry or buffer:
+                    if table in self._retry:
+                        batch, attempts = self._retry.pop(table)
+                    else:
+                        batch, attempts = [buffer.popleft() for _ in range(min(self.flush_size, len(buffer)))], 0
+                    self._buffered -= len(batch)
+
+                    remaining = await self._write_isolating(table, batch)
+                    if not remaining:
+                        continue
+
+                    attempts += 1
+                    if attempts >= self.max_attempts:
+                        logger.error(f"Giving up {len(remaining)} {table} rows after {attempts} attempts")
+                        self._overflow(table, remaining)
+                        continue
+
+                    self._hold_for_retry(table, remaining, attempts)
+                    break
+
+            await self._wait_spill_writes()
+
+    async def _write_isolating(self, table: str, batch: list[dict]) -> list[dict]:
+        """
+        Insert batch. Lỗi dữ liệu thì chia đôi để chỉ bỏ các dòng lỗi vào dead letter.
+
+        Returns:
+            list[dict]: Các dòng (đuôi của batch, giữ thứ tự) chưa insert được do lỗi tạm thời.
+        """
+        error = await self._write(table, batch)
+        if error is None:
+            return []
+        if _is_transient(error):
+            return batch
+        if len(batch) == 1:
+            self._dead_letter(table, batch, error)
+            return []
+
+        middle = len(batch) // 2
+        remaining = await self._write_isolating(table, batch[:middle])
+        if remaining:
+            return remaining + batch[middle:]
+        return await self._write_isolating(table, batch[middle:])
+
+    async def _write(self, table: str, batch: list[dict]) -> Exception | None:
+        started = time.perf_counter()
+        try:
+            error = None if await self.writers[table](batch) else RuntimeError("writer returned no rows")
+        except Exception as e:
+            error = e
+
+        self.flush_latency.add((time.perf_counter() - started) * 1000)
+        self.batches += 1
+        if error is not None:
+            self.failed_batches += 1
+            logger.error(f"Cannot write {len(batch)} {table} rows: {error}")
+            return error
+
+        self.flushed += len(batch)
+        return None
+
+    def _hold_for_retry(self, table: str, batch: list[dict], attempts: int):
+        """Giữ batch lỗi để thử lại trước các dòng mới, phần không còn chỗ trong buffer thì spill/drop."""
+        room = max(0, self.max_buffered - self._buffered)
+        keep, overflow = batch[:room], batch[room:]
+
+        if keep:
+            self._retry[table] = (keep, attempts)
+            self._buffered += len(keep)
+        if overflow:
+            self._overflow(table, overflow)
+
+    # -----------------------------------------------------------------------------
+    # Spill ra đĩa
+    # -----------------------------------------------------------------------------
+
+    def _overflow(self, table: str, rows: list[dict]):
+        if self.overflow_policy == "drop":
+            self.dropped += len(rows)
+            logger.warning(f"Telemetry buffer full -> dropped {len(rows)} {table} rows")
+            return
+
+        self._spill_later(self._insert_spilled, table, rows, action="spill", counter="spilled")
+
+    def _dead_letter(self, table: str, rows: list[dict], error: Exception):
+        """Dòng bị DB từ chối vì dữ liệu: lưu lại để xem xét, không thử lại."""
+        logger.error(f"Moved {len(rows)} {table} rows to dead letters: {error}")
+        self._spill_later(
+            self._insert_dead_letters, table, rows, str(error),
+            action="dead-letter", counter="dead_lettered"
+        )
+
+    def _spill_later(self, func: Callable, table: str, rows: list[dict], *args, action: str, counter: str):
+        """Xếp lệnh ghi vào file spill, không chờ. Bộ đếm được cập nhật trên event loop khi ghi xong."""
+        future = asyncio.ensure_future(self._spill_io(func, table, rows, *args))
+        self._spill_writes.add(future)
+
+        def done(future: asyncio.Future):
+            self._spill_writes.discard(future)
+            if future.cancelled():
+                return
+            error = future.exception()
+            if error is None:
+                setattr(self, counter, getattr(self, counter) + len(rows))
+                return
+            self.dropped += len(rows)
+            logger.error(f"Cannot {action} {len(rows)} {table} rows -> dropped: {error}")
+
+        future.add_done_callback(done)
+
+    async def _wait_spill_writes(self):
+        if self._spill_writes:
+            await asyncio.gather(*self._spill_writes, return_exceptions=True)
+
+    async def _spill_io(self, func: Callable, *args) -> Any:
+        if self._spill_executor is None:
+            self._spill_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="telemetry-spill")
+        return await asyncio.get_running_loop().run_in_executor(self._spill_executor, partial(func, *args))
+
+    # Các hàm dưới đây chỉ chạy trên thread của `_spill_executor`
+
+    def _insert_spilled(self, table: str, rows: list[dict]):
+        self._spill_conn().executemany(
+            "INSERT INTO spilled_rows (table_name, payload) VALUES (?, ?)",
+            [(table, json.dumps(row, ensure_ascii=False, default=str)) for row in rows]
+        )
+
+    def _insert_dead_letters(self, table: str, rows: list[dict], error: str):
+        self._spill_conn().executemany(
+            "INSERT INTO dead_letters (table_name, payload, error, failed_at) VALUES (?, ?, ?, ?)",
+            [(table, json.dumps(row, ensure_ascii=False, default=str), error, time.time()) for row in rows]
+        )
+
+    def _read_spilled(self, table: str) -> list[tuple[int, str]]:
+        return self._spill_conn().execute(
+            "SELECT id, payload FROM spilled_rows WHERE table_name = ? ORDER BY id LIMIT ?",
+            (table, self.flush_size)
+        ).fetchall()
+
+    def _delete_spilled(self, row_ids: list[int]):
+        self._spill_conn().executemany("DELETE FROM spilled_rows WHERE id = ?", [(row_id,) for row_id in row_ids])
+
+    def _close_spill(self):
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
+
+    def _spill_conn(self) -> sqlite3.Connection:
+        if self._spill is None:
+            self._spill = sqlite3.connect(self.spill_path, check_same_thread=False, isolation_level=None)
+            self._spill.execute("PRAGMA journal_mode=WAL")
+            self._spill.executescript("""
+                CREATE TABLE IF NOT EXISTS spilled_rows (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    table_name TEXT NOT NULL,
+                    payload TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS dead_letters (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    table_name TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    error TEXT,
+                    failed_at REAL NOT NULL
+                );
+            """)
+        return self._spill
+
+    async def _unspill(self):
+        """Buffer rảnh -> đưa một lô dòng đã spill (kể cả từ lần chạy trước) trở lại DB."""
+        if self.overflow_policy != "spill" or self._buffered:
+            return
+
+        for table in self._buffers:
+            rows = await self._spill_io(self._read_spilled, table)
+            if not rows:
+                continue
+
+            remaining = await self._write_isolating(table, [json.loads(payload) for _, payload in rows])
+            done = rows[:len(rows) - len(remaining)]
+            await self._spill_io(self._delete_spilled, [row_id for row_id, _ in done])
+            self.unspilled += len(done)
+            if remaining:
+                return
+
+    def stats(self) -> dict:
+        return {
+            "buffered": self._buffered,
+            "max_buffered": self.max_buffered,
+            "overflow_policy": self.overflow_policy,
+            "added": self.added,
+            "flushed": self.flushed,
+            "batches": self.batches,
+            "failed_batches": self.failed_batches,
+            "dead_lettered": self.dead_lettered,
+            "dropped": self.dropped,
+            "spilled": self.spilled,
+            "unspilled": self.unspilled,
+            "flush_latency": self.flush_latency.snapshot(),
+        }
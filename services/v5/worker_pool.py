@@ -0,0 +1,94 @@
+import time
+import asyncio
+from typing import Any, Awaitable, Callable
+
+from services.metrics import LatencyStats
+
+
+class WorkerPool:
+    """
+    Giới hạn số lượt chat chạy đồng thời và số lượt được nhận nhưng chưa xong.
+
+    - Tối đa `max_concurrency` job chạy cùng lúc (gọi LLM, DB, ...).
+    - Tối đa `max_concurrency + max_queue` job đã nhận. Vượt ngưỡng thì `try_reserve`
+      trả về False để caller áp dụng chính sách giảm tải.
+
+    Caller phải `try_reserve()` thành công (hoặc `await reserve()`) trước khi gọi `run()`.
+    """
+    def __init__(self, max_concurrency: int = 16, max_queue: int = 200):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+        self.reserved = 0
+        self.running = 0
+        self.admitted = 0
+        self.completed = 0
+        self.rejected = 0
+        self._waiters: list[asyncio.Future] = []
+        self.wait_time = LatencyStats()
+
+    @property
+    def capacity(self) -> int:
+        return self.max_concurrency + self.max_queue
+
+    def try_reserve(self) -> bool:
+        if self.reserved >= self.capacity:
+            self.rejected += 1
+            return False
+
+        self.reserved += 1
+        self.admitted += 1
+        return True
+
+    async def reserve(self):
+        """
+        Chờ tới khi pool có chỗ rồi giữ chỗ. Dành cho job đã nhận từ trước (retry, replay):
+        lúc chờ không tính là bị từ chối.
+        """
+        while self.reserved >= self.capacity:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            finally:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+
+        self.reserved += 1
+        self.admitted += 1
+
+    async def run(self, job: Callable[[], Awaitable[Any]]) -> Any:
+        queued_at = time.perf_counter()
+        try:
+            async with self._semaphore:
+                self.wait_time.add((time.perf_counter() - queued_at) * 1000)
+                self.running += 1
+                try:
+                    return await job()
+                finally:
+                    self.running -= 1
+        finally:
+            self.reserved -= 1
+            self.completed += 1
+            self._wake_waiter()
+
+    def _wake_waiter(self):
+        while self._waiters:
+            waiter = self._waiters.pop(0)
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "running": self.running,
+            "queue_depth": self.reserved - self.running,
+            "admitted": self.admitted,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "waiting": len(self._waiters),
+            "wait_time": self.wait_time.snapshot(),
+        }